@@ -0,0 +1,153 @@
+import math
+import time
+import threading
+from functools import wraps
+
+from flask import jsonify, request
+
+from config import (ADMISSION_CLASS_LIMITS, ADMISSION_LOAD_SHARE,
+                    DEGRADE_ENTER_LOAD, DEGRADE_EXIT_LOAD, DEGRADE_HOLD_SECONDS)
+from inference_pool import get_inference_pool
+
+# Traffic classes in priority order (door decisions first)
+PRIORITIES = ['door', 'enrollment', 'dashboard', 'batch']
+
+# Route -> traffic class, shared by the Flask and async servers
+ROUTE_CLASSES = {
+    '/api/recognize': 'door',
+    '/recognize': 'door',
+    '/api/simple/recognize': 'door',
+    '/api/enrollment/capture': 'enrollment',
+    '/api/simple/enroll': 'enrollment',
+    '/video_feed': 'dashboard',
+    '/api/recognize/batch': 'batch',
+}
+
+
+class AdmissionRejected(Exception):
+    """Request shed by admission control"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Priority-aware admission control in front of the inference pool.
+
+    Each traffic class has an in-flight cap (429 when exceeded) and may only
+    use a share of the pool's capacity (503 when the pool is loaded past that
+    share), so door decisions keep flowing while streams and batch uploads
+    are shed first. Sustained overload switches the recognizer into
+    degraded mode (Haar-only detection, a single embedding model).
+    """
+
+    def __init__(self, pool=None, class_limits=ADMISSION_CLASS_LIMITS, load_share=ADMISSION_LOAD_SHARE):
+        self.pool = pool or get_inference_pool()
+        self.class_limits = class_limits
+        self.load_share = load_share
+        self.in_flight = {name: 0 for name in PRIORITIES}
+        self.rejected = {name: 0 for name in PRIORITIES}
+        self.latency = 1.0  # EWMA seconds per admitted request
+        self.degraded = False
+        self.overload_since = None
+        self.lock = threading.Lock()
+
+    def pool_load(self):
+        """Fraction of inference capacity (running + queued) in use"""
+        stats = self.pool.get_stats()
+        capacity = stats['concurrency'] + self.pool.queue.maxsize
+        return (stats['running'] + stats['queued']) / capacity if capacity else 0.0
+
+    def retry_after(self):
+        stats = self.pool.get_stats()
+        backlog = stats['running'] + stats['queued']
+        return max(1, int(math.ceil(backlog / max(1, stats['concurrency']) * self.latency)))
+
+    def acquire(self, traffic_class):
+        """Admit a request or raise AdmissionRejected"""
+        load = self.pool_load()
+        self._update_degraded(load)
+
+        with self.lock:
+            limit = self.class_limits.get(traffic_class)
+            if limit is not None and self.in_flight[traffic_class] >= limit:
+                self.rejected[traffic_class] += 1
+                raise AdmissionRejected(429, f"Too many concurrent {traffic_class} requests",
+                                        self.retry_after())
+            if load >= self.load_share.get(traffic_class, 1.0):
+                self.rejected[traffic_class] += 1
+                raise AdmissionRejected(503, "Server overloaded, try again shortly", self.retry_after())
+            self.in_flight[traffic_class] += 1
+        return time.monotonic()
+
+    def release(self, traffic_class, started=None, record_latency=True):
+        with self.lock:
+            self.in_flight[traffic_class] = max(0, self.in_flight[traffic_class] - 1)
+            if started is not None and record_latency:
+                self.latency = 0.8 * self.latency + 0.2 * (time.monotonic() - started)
+
+    def _update_degraded(self, load):
+        now = time.monotonic()
+        with self.lock:
+            if load >= DEGRADE_ENTER_LOAD:
+                if self.overload_since is None:
+                    self.overload_since = now
+                if not self.degraded and now - self.overload_since >= DEGRADE_HOLD_SECONDS:
+                    self.degraded = True
+                    print("⚠️ Overload - switching to degraded recognition mode")
+            else:
+                self.overload_since = None
+                if self.degraded and load <= DEGRADE_EXIT_LOAD:
+                    self.degraded = False
+                    print("✅ Load normal - leaving degraded recognition mode")
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'degraded': self.degraded,
+                'in_flight': dict(self.in_flight),
+                'rejected': dict(self.rejected),
+                'latency_ewma': round(self.latency, 3),
+            }
+
+
+# Global admission controller
+admission_controller = None
+
+def get_admission_controller():
+    global admission_controller
+    if admission_controller is None:
+        admission_controller = AdmissionController()
+    return admission_controller
+
+def is_degraded():
+    """True while the system sheds accuracy for throughput"""
+    return admission_controller is not None and admission_controller.degraded
+
+def rejection_response(rejected):
+    response = jsonify({'success': False, 'error': rejected.message})
+    response.headers['Retry-After'] = str(rejected.retry_after)
+    return response, rejected.status
+
+def admission_controlled(traffic_class):
+    """Flask view decorator applying admission control for a traffic class"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.environ.get('face.admitted'):
+                # Already admitted by the async server before dispatch
+                return view(*args, **kwargs)
+            controller = get_admission_controller()
+            try:
+                started = controller.acquire(traffic_class)
+            except AdmissionRejected as rejected:
+                return rejection_response(rejected)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(traffic_class, started)
+        return wrapper
+    return decorator
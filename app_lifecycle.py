@@ -0,0 +1,113 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from status_snapshot import status_snapshot
+
+
+class StartupTask:
+    def __init__(self, name, fn, depends_on=()):
+        self.name = name
+        self.fn = fn
+        self.depends_on = list(depends_on)
+        self.started = None
+        self.duration = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class AppLifecycle:
+    """Explicit application startup.
+
+    Modules are import-side-effect free; everything heavy (model loading,
+    gallery decryption, database setup) is registered here as a named task.
+    Tasks run in parallel, each waiting only for its own dependencies, and a
+    timing report shows where the startup seconds go.
+
+    Failed tasks are not retried: the app stays unready (see
+    failed_tasks(), reported by /readyz) until it is restarted.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.started_at = None
+        self.finished_at = None
+        self.thread = None
+
+    def add_task(self, name, fn, depends_on=()):
+        self.tasks[name] = StartupTask(name, fn, depends_on)
+
+    def run(self):
+        """Run all startup tasks, blocking until they finish"""
+        status_snapshot.update(ready=False)
+        self.started_at = time.perf_counter()
+        print(f"🚀 Starting up ({len(self.tasks)} tasks in parallel)...")
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.tasks)), thread_name_prefix='startup') as executor:
+            # One worker per task, so tasks waiting on dependencies cannot starve the ones they wait for
+            for task in self.tasks.values():
+                executor.submit(self._run_task, task)
+
+        self.finished_at = time.perf_counter()
+        failed = [task.name for task in self.tasks.values() if task.error]
+        status_snapshot.update(ready=not failed)
+        self.print_report()
+        return not failed
+
+    def start_in_background(self):
+        """Run startup on a background thread so the server can bind immediately"""
+        self.thread = threading.Thread(target=self.run, name='app-startup', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def _run_task(self, task):
+        try:
+            for dependency in task.depends_on:
+                self.tasks[dependency].done.wait()
+                if self.tasks[dependency].error:
+                    task.error = f"dependency '{dependency}' failed"
+                    return
+
+            task.started = time.perf_counter() - self.started_at
+            start = time.perf_counter()
+            try:
+                task.fn()
+            except Exception as e:
+                task.error = str(e)
+                print(f"❌ Startup task '{task.name}' failed: {e}")
+            finally:
+                task.duration = time.perf_counter() - start
+        finally:
+            task.done.set()
+
+    def failed_tasks(self):
+        """{task name: error} for startup tasks that failed"""
+        return {task.name: task.error for task in self.tasks.values() if task.error}
+
+    def report(self):
+        """Startup timing report as a dict"""
+        total = (self.finished_at - self.started_at) if self.finished_at and self.started_at else None
+        return {
+            'total_seconds': round(total, 3) if total is not None else None,
+            'tasks': [{
+                'name': task.name,
+                'depends_on': task.depends_on,
+                'started_at': round(task.started, 3) if task.started is not None else None,
+                'seconds': round(task.duration, 3) if task.duration is not None else None,
+                'error': task.error,
+            } for task in self.tasks.values()]
+        }
+
+    def print_report(self):
+        report = self.report()
+        print("⏱️  Startup timing report")
+        for task in sorted(report['tasks'], key=lambda t: -(t['seconds'] or 0)):
+            status = "❌ " + task['error'] if task['error'] else "✅"
+            seconds = f"{task['seconds']:.3f}s" if task['seconds'] is not None else "   -  "
+            offset = f"+{task['started_at']:.3f}s" if task['started_at'] is not None else ""
+            print(f"   {task['name']:<16} {seconds:>9}  {offset:<9} {status}")
+        print(f"   {'total (wall)':<16} {report['total_seconds']:.3f}s")
+
+
+# Global application lifecycle
+lifecycle = AppLifecycle()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) serving mode for the face recognition app.
+
+Recognition routes are dispatched straight onto the bounded inference
+pool and awaited as futures, so a slow recognition holds no OS thread
+while it waits. All other routes (UI, status, SSE, video stream) run the
+regular Flask app on a thread pool, one thread per request, with the
+response streamed chunk by chunk - an open SSE or MJPEG stream occupies
+only its own thread. The response iterable is always closed on its
+thread, so call_on_close handlers run when a client disconnects.
+
+Run with:  python run_production.py --async
+"""
+import io
+import sys
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from web_app import app
+from config import ASGI_WSGI_THREADS
+from inference_pool import get_inference_pool, InferenceQueueFull
+from admission import ROUTE_CLASSES, get_admission_controller, AdmissionRejected
+
+# Routes whose whole request is an inference call
+INFERENCE_ROUTES = {
+    '/api/recognize',
+    '/recognize',
+    '/api/simple/recognize',
+    '/api/recognize/batch',
+    '/api/simple/enroll',
+}
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope plus body into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """Run a WSGI app to completion and return (status code, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+def stream_wsgi(wsgi_app, environ, emit, stop):
+    """Run a WSGI app on this thread, emitting ('start', status, headers), ('body', chunk) and ('end',).
+
+    Stops iterating once `stop` is set (client gone) and always closes the
+    response iterable here - generators must be resumed and closed on the
+    thread that runs them, which also keeps Flask's request context intact.
+    """
+    def start_response(status, headers, exc_info=None):
+        emit(('start', int(status.split(' ', 1)[0]), headers))
+
+    result = None
+    try:
+        result = wsgi_app(environ, start_response)
+        for chunk in result:
+            if stop.is_set():
+                break
+            if chunk:
+                emit(('body', chunk))
+    except Exception as e:
+        print(f"❌ WSGI request failed: {e}")
+    finally:
+        try:
+            if hasattr(result, 'close'):
+                result.close()
+        finally:
+            emit(('end',))
+
+
+async def read_body(receive):
+    """Whole request body, or None if the client disconnected first"""
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode()
+    headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+    await send_response(send, status, headers + list(extra_headers), body)
+
+
+class AsyncInferenceApp:
+    """ASGI app: inference routes awaited on the pool, everything else streamed from WSGI threads"""
+
+    def __init__(self, wsgi_app, pool=None, wsgi_threads=ASGI_WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.pool = pool or get_inference_pool()
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] in INFERENCE_ROUTES:
+            await self.handle_inference(scope, receive, send)
+        elif scope['type'] == 'http':
+            await self.handle_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_wsgi(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        stop = threading.Event()
+        self.executor.submit(stream_wsgi, self.wsgi_app, build_environ(scope, body),
+                             lambda message: loop.call_soon_threadsafe(messages.put_nowait, message), stop)
+
+        # The next receive() only completes when the client goes away
+        disconnect = asyncio.ensure_future(receive())
+        started = False
+        try:
+            while True:
+                message = asyncio.ensure_future(messages.get())
+                done, _ = await asyncio.wait({message, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if message not in done:
+                    message.cancel()
+                    return  # Client gone - the WSGI thread stops at its next chunk
+                kind = message.result()[0]
+                if kind == 'start' and not started:
+                    _, status, headers = message.result()
+                    await send({
+                        'type': 'http.response.start',
+                        'status': status,
+                        'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers],
+                    })
+                    started = True
+                elif kind == 'body' and started:
+                    await send({'type': 'http.response.body', 'body': message.result()[1], 'more_body': True})
+                elif kind == 'end':
+                    if started:
+                        await send({'type': 'http.response.body', 'body': b''})
+                    else:
+                        await send_json(send, 500, {'success': False, 'error': 'Internal server error'})
+                    return
+        finally:
+            stop.set()
+            disconnect.cancel()
+
+    async def handle_inference(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+
+        traffic_class = ROUTE_CLASSES.get(scope['path'])
+        controller = get_admission_controller()
+        started = None
+        if traffic_class:
+            try:
+                started = controller.acquire(traffic_class)
+            except AdmissionRejected as rejected:
+                await send_json(send, rejected.status, {'success': False, 'error': rejected.message},
+                                [('Retry-After', str(rejected.retry_after))])
+                return
+
+        try:
+            await self.dispatch(scope, receive, send, body)
+        finally:
+            if traffic_class:
+                controller.release(traffic_class, started)
+
+    async def dispatch(self, scope, receive, send, body):
+        environ = build_environ(scope, body)
+        environ['face.admitted'] = True
+        try:
+            future = self.pool.submit(call_wsgi, self.wsgi_app, environ)
+        except InferenceQueueFull:
+            await send_json(send, 503, {'success': False, 'error': 'Server busy, try again shortly'},
+                            [('Retry-After', '1')])
+            return
+
+        result = asyncio.wrap_future(future)
+        # The next receive() only completes when the client goes away
+        disconnect = asyncio.ensure_future(receive())
+        done, _ = await asyncio.wait({result, disconnect}, timeout=self.pool.timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+
+        if result not in done:
+            self.pool.cancel(future)
+            result.cancel()
+            if disconnect in done:
+                return  # Client gone - nobody to answer
+            disconnect.cancel()
+            await send_json(send, 504, {'success': False, 'error': 'Recognition timed out'})
+            return
+
+        disconnect.cancel()
+        status, headers, body = result.result()
+        await send_response(send, status, headers, body)
+
+
+asgi_app = AsyncInferenceApp(app)
+
+
+def run(host='0.0.0.0', port=5000):
+    """Serve the app with uvicorn"""
+    import uvicorn
+    uvicorn.run(asgi_app, host=host, port=port, lifespan='on')
+
+
+if __name__ == '__main__':
+    run()
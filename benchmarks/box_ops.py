@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks: boxes.py against the per-box Python loops it replaced.
+
+Usage:
+    python benchmarks/box_ops.py
+    python -m benchmarks.box_ops
+    python -m benchmarks.box_ops --sizes 4 16 64 256 --repeat 200
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Repo modules import as top-level modules, also when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boxes
+
+
+# Reference implementations - the loops previously inlined in the recognizer and detector
+
+def loop_iou(box1, box2):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+    intersection = (x2 - x1) * (y2 - y1)
+    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union = area1 + area2 - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def loop_dedup(faces, threshold=0.5):
+    unique_faces = []
+    for face in faces:
+        if all(loop_iou(face, existing) <= threshold for existing in unique_faces):
+            unique_faces.append(face)
+    return unique_faces
+
+
+def loop_iou_matrix(a, b):
+    return [[loop_iou(x, y) for y in b] for x in a]
+
+
+def loop_pad_clip(faces, w, h, padding=10):
+    return [(max(0, x1 - padding), max(0, y1 - padding), min(w, x2 + padding), min(h, y2 + padding))
+            for x1, y1, x2, y2 in faces]
+
+
+def loop_xywh_to_xyxy(faces):
+    return [(x, y, x + w, y + h) for (x, y, w, h) in faces]
+
+
+def random_boxes(n, rng, width=1920, height=1080):
+    xy = rng.uniform(0, [width - 200, height - 200], size=(n, 2))
+    size = rng.uniform(40, 200, size=(n, 1))
+    return [tuple(int(v) for v in box) for box in np.hstack([xy, xy + size])]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Box geometry microbenchmarks (vectorized vs loops)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[4, 16, 64, 256], help="boxes per call")
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"   {'operation':<18}{'boxes':>7}{'loop us':>12}{'numpy us':>12}{'speedup':>9}")
+    for n in args.sizes:
+        faces = random_boxes(n, rng)
+        # Detectors hand back xywh as an int array (e.g. detectMultiScale)
+        xywh = np.array([(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in faces], dtype=np.int32)
+
+        # Sanity: both versions agree before timing them
+        assert loop_dedup(faces) == [faces[i] for i in boxes.nms(faces, iou_threshold=0.5)]
+
+        cases = [
+            ('dedup / nms', lambda: loop_dedup(faces), lambda: boxes.nms(faces, iou_threshold=0.5)),
+            ('iou matrix', lambda: loop_iou_matrix(faces, faces), lambda: boxes.iou_matrix(faces, faces)),
+            ('pad + clip', lambda: loop_pad_clip(faces, 1920, 1080),
+             lambda: boxes.clip(boxes.pad(faces, pixels=10), 1920, 1080)),
+            ('xywh -> xyxy', lambda: loop_xywh_to_xyxy(xywh), lambda: boxes.xywh_to_xyxy(xywh)),
+        ]
+        for name, loop_fn, numpy_fn in cases:
+            loop_us = timed(loop_fn, args.repeat)
+            numpy_us = timed(numpy_fn, args.repeat)
+            print(f"   {name:<18}{n:>7}{loop_us:>12.1f}{numpy_us:>12.1f}{loop_us / numpy_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
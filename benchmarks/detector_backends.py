@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Detector backend benchmark: latency against recall on a labeled image set.
+
+The dataset is a folder of images plus an annotations.csv with one row per
+face: `filename,x1,y1,x2,y2` (full-resolution pixel boxes). Images with no
+faces can be listed with empty box columns so they count for false
+positives.
+
+Usage:
+    python benchmarks/detector_backends.py path/to/dataset
+    python -m benchmarks.detector_backends path/to/dataset
+    python -m benchmarks.detector_backends path/to/dataset --backends haar yunet --max-side 320 640 0
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+# Repo modules import as top-level modules, also when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boxes import match_greedy
+from detector import DETECTOR_BACKENDS, detect_faces_scored, get_detector
+
+
+def load_annotations(dataset_dir):
+    """{filename: (M, 4) array of ground-truth boxes}"""
+    annotations = {}
+    with open(os.path.join(dataset_dir, 'annotations.csv'), newline='') as f:
+        for row in csv.DictReader(f):
+            boxes = annotations.setdefault(row['filename'], [])
+            if row.get('x1'):
+                boxes.append([float(row[k]) for k in ('x1', 'y1', 'x2', 'y2')])
+    return {name: np.asarray(boxes, dtype=np.float32).reshape(-1, 4) for name, boxes in annotations.items()}
+
+
+def match_detections(predicted, truth, iou_threshold):
+    """Greedy one-to-one matching; returns the number of true positives"""
+    return len(match_greedy(predicted, truth, iou_threshold))
+
+
+def benchmark_backend(backend, images, annotations, max_side, iou_threshold=0.5, warmup=2):
+    """Latency distribution and detection quality of one backend at one detection resolution"""
+    if get_detector(backend).name != backend:
+        return None  # backend unavailable - get_detector fell back to another one
+
+    for image in list(images.values())[:warmup]:
+        detect_faces_scored(image, backend, max_side)
+
+    latencies = []
+    true_positives = predicted_total = truth_total = 0
+    for filename, image in images.items():
+        start = time.perf_counter()
+        boxes, _ = detect_faces_scored(image, backend, max_side)
+        latencies.append((time.perf_counter() - start) * 1000)
+        truth = annotations[filename]
+        true_positives += match_detections(boxes, truth, iou_threshold)
+        predicted_total += len(boxes)
+        truth_total += len(truth)
+
+    latencies = np.asarray(latencies)
+    return {
+        'backend': backend,
+        'max_side': max_side,
+        'images': len(images),
+        'latency_ms_mean': float(latencies.mean()),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'recall': true_positives / truth_total if truth_total else None,
+        'precision': true_positives / predicted_total if predicted_total else None,
+        'false_positives': predicted_total - true_positives,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends on a labeled image set")
+    parser.add_argument('dataset', help="folder with images and annotations.csv (filename,x1,y1,x2,y2)")
+    parser.add_argument('--backends', nargs='+', default=list(DETECTOR_BACKENDS))
+    parser.add_argument('--max-side', nargs='+', type=int, default=[320, 640, 0],
+                        help="detection resolutions to try (0 = full resolution)")
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU needed for a detection to count")
+    args = parser.parse_args()
+
+    annotations = load_annotations(args.dataset)
+    images = {}
+    for filename in annotations:
+        image = cv2.imread(os.path.join(args.dataset, filename))
+        if image is None:
+            print(f"⚠️ Skipping unreadable image {filename}")
+            continue
+        images[filename] = image
+    if not images:
+        print("❌ No images to benchmark")
+        return
+    annotations = {name: annotations[name] for name in images}
+
+    print(f"📏 {len(images)} images, {sum(len(b) for b in annotations.values())} labeled faces")
+    print(f"   {'backend':<12}{'max side':>9}{'mean ms':>10}{'p95 ms':>10}{'recall':>9}{'precision':>11}{'FP':>6}")
+    for backend in args.backends:
+        for max_side in args.max_side:
+            result = benchmark_backend(backend, images, annotations, max_side, args.iou)
+            if result is None:
+                print(f"   {backend:<12} unavailable")
+                break
+            recall = f"{result['recall']:.3f}" if result['recall'] is not None else "-"
+            precision = f"{result['precision']:.3f}" if result['precision'] is not None else "-"
+            side = str(max_side) if max_side else "full"
+            print(f"   {backend:<12}{side:>9}{result['latency_ms_mean']:>10.1f}{result['latency_ms_p95']:>10.1f}"
+                  f"{recall:>9}{precision:>11}{result['false_positives']:>6}")
+
+
+if __name__ == "__main__":
+    main()
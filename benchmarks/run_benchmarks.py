@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: detection, cropping, embedding, matching and storage.
+
+Runs headless on a CPU-only box. Inputs are the bundled known_faces images,
+synthetic frames built from them, and synthetic galleries of random
+embeddings. Storage benchmarks run in a scratch directory so the real
+gallery, key and databases are never touched.
+
+Results are written as JSON. --compare checks a run against an earlier
+one and exits non-zero when any median got slower by more than the
+threshold.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --quick --skip embedding
+    python -m benchmarks.run_benchmarks --output new.json --compare benchmarks/results/baseline.json
+    python -m benchmarks.run_benchmarks --compare old.json new.json   # compare two saved runs
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SUITES = ('detection', 'preprocessing', 'embedding', 'matching', 'storage')
+EMBEDDING_MODELS = ('ArcFace', 'Facenet', 'VGG-Face', 'Dlib')
+
+
+def measure(fn, repeat, warmup=1, items=1):
+    """Per-call latency distribution (ms); `items` per call gives a throughput figure"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.asarray(samples)
+    result = {
+        'unit': 'ms',
+        'iterations': repeat,
+        'median': float(np.median(samples)),
+        'mean': float(samples.mean()),
+        'p95': float(np.percentile(samples, 95)),
+        'min': float(samples.min()),
+    }
+    if items > 1:
+        result['items_per_call'] = items
+        result['throughput_per_s'] = items / (result['median'] / 1000) if result['median'] else None
+    return result
+
+
+# Inputs
+
+def load_known_faces(root=os.path.join(ROOT, 'known_faces')):
+    images = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image = cv2.imread(os.path.join(dirpath, filename))
+                if image is not None:
+                    images.append(image)
+    return images
+
+
+def synthetic_frames(faces, sizes=((1280, 720), (1920, 1080)), seed=0):
+    """Camera-sized frames with a bundled face pasted onto a noisy background"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for w, h in sizes:
+        frame = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+        frame = cv2.GaussianBlur(frame, (0, 0), 5)
+        if faces:
+            face = faces[len(frames) % len(faces)]
+            fh, fw = face.shape[:2]
+            factor = min(h * 0.5 / fh, w * 0.5 / fw, 1.0)
+            face = cv2.resize(face, (int(fw * factor), int(fh * factor)))
+            y, x = (h - face.shape[0]) // 2, (w - face.shape[1]) // 2
+            frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+        frames.append((f"{w}x{h}", frame))
+    return frames
+
+
+def synthetic_templates(identities, dim=512, medoids=1, seed=0):
+    """Identity templates of random unit embeddings, rows stored as views into one array"""
+    rng = np.random.default_rng(seed)
+    reps = rng.standard_normal((identities, medoids + 1, dim), dtype=np.float32)
+    reps /= np.linalg.norm(reps, axis=-1, keepdims=True)
+    return {f"person_{i}": {'count': medoids + 1, 'mean': reps[i, 0], 'medoids': reps[i, 1:]}
+            for i in range(identities)}
+
+
+# Suites
+
+def bench_detection(args, faces):
+    from detector import detect_faces, extract_face_crop
+
+    results = {}
+    inputs = [(f"known_faces", image) for image in faces[:1]] if faces else []
+    inputs += synthetic_frames(faces)
+    for label, frame in inputs:
+        results[f"detect_faces/{label}"] = measure(lambda: detect_faces(frame), args.repeat)
+    if faces:
+        results['detect_faces/known_faces_all'] = measure(
+            lambda: [detect_faces(image) for image in faces], max(1, args.repeat // 5), items=len(faces))
+
+    _, frame = inputs[-1]
+    boxes = detect_faces(frame) or [(frame.shape[1] // 3, frame.shape[0] // 3,
+                                     2 * frame.shape[1] // 3, 2 * frame.shape[0] // 3)]
+    results['extract_face_crop'] = measure(lambda: extract_face_crop(frame, boxes[0]), args.repeat * 10)
+    return results
+
+
+def bench_preprocessing(args, faces):
+    from face_preprocessing import FaceBatchBuffer, align_face, enhance_face_quality
+
+    _, frame = synthetic_frames(faces, sizes=((1280, 720),))[0]
+    bbox = (480, 180, 800, 540)
+    crop = align_face(frame, bbox)
+    out = np.empty_like(crop)
+    buffer = FaceBatchBuffer('ArcFace', 8)
+    requests = [(frame, bbox, None, True)] * 8
+    return {
+        'align_face/112': measure(lambda: align_face(frame, bbox, out=out), args.repeat * 10),
+        'enhance_face_quality/112': measure(lambda: enhance_face_quality(crop, out=out), args.repeat * 10),
+        'face_batch_fill/8': measure(lambda: buffer.fill(requests), args.repeat, items=8),
+    }
+
+
+def bench_embedding(args, faces):
+    try:
+        from embedding_batcher import deepface_embed_batch
+        from face_preprocessing import align_face, model_input_size
+        import deepface  # noqa: F401
+    except ImportError as e:
+        return {'skipped': f"deepface unavailable ({e})"}
+
+    face = faces[0] if faces else np.full((160, 160, 3), 128, dtype=np.uint8)
+    bbox = (0, 0, face.shape[1], face.shape[0])
+    results = {}
+    for model_name in args.models:
+        crop = align_face(face, bbox, size=model_input_size(model_name))
+        try:
+            deepface_embed_batch(model_name, [crop])  # model load is not part of the measurement
+        except Exception as e:
+            results[f"embed/{model_name}"] = {'skipped': str(e)}
+            continue
+        for batch in (1, 8):
+            results[f"embed/{model_name}/batch{batch}"] = measure(
+                lambda: deepface_embed_batch(model_name, [crop] * batch), max(3, args.repeat // 5), items=batch)
+    return results
+
+
+def bench_matching(args, faces):
+    from face_templates import TemplateIndex
+
+    results = {}
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((64, 512), dtype=np.float32)
+    for identities in args.gallery_sizes:
+        index = TemplateIndex(synthetic_templates(identities, medoids=args.medoids), rerank_margin=-1.0)
+        cursor = iter(range(1 << 30))
+        results[f"template_match/{identities}"] = measure(
+            lambda: index.match(queries[next(cursor) % len(queries)]), args.repeat)
+        del index
+    return results
+
+
+def bench_storage(args, faces):
+    results = {}
+    scratch = tempfile.mkdtemp(prefix='face_bench_')
+    cwd = os.getcwd()
+    os.chdir(scratch)  # key.key, authorized_faces.pkl and the databases are cwd-relative
+    try:
+        from utils import decrypt_data, encrypt_data
+        from database import init_attendance_db, log_attendance
+
+        rng = np.random.default_rng(2)
+        for identities in (100, 1000):
+            data = {'encodings': [rng.standard_normal(512).tolist() for _ in range(identities * 3)],
+                    'names': [f"person_{i // 3}" for i in range(identities * 3)]}
+            results[f"encrypt_data/{identities}"] = measure(lambda: encrypt_data(data), max(3, args.repeat // 10))
+            with open('authorized_faces.pkl', 'wb') as f:
+                f.write(encrypt_data(data))
+            results[f"decrypt_data/{identities}"] = measure(decrypt_data, max(3, args.repeat // 10))
+
+        init_attendance_db()
+        rows = 50
+        results['log_attendance'] = measure(
+            lambda: [log_attendance('bench_user', 0.9, 'GRANTED') for _ in range(rows)],
+            max(3, args.repeat // 10), items=rows)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def run(args):
+    faces = load_known_faces()
+    print(f"📏 {len(faces)} bundled face images")
+    benchmarks = {}
+    for suite in SUITES:
+        if suite in args.skip:
+            continue
+        print(f"⏱️ {suite}...")
+        try:
+            suite_results = globals()[f"bench_{suite}"](args, faces)
+        except Exception as e:
+            suite_results = {'error': str(e)}
+            print(f"❌ {suite} failed: {e}")
+        if 'skipped' in suite_results or 'error' in suite_results:
+            benchmarks[suite] = suite_results
+            continue
+        for name, result in suite_results.items():
+            benchmarks[f"{suite}/{name}"] = result
+    return {'environment': environment(), 'benchmarks': benchmarks}
+
+
+# Reporting
+
+def print_results(report):
+    print(f"   {'benchmark':<44}{'median ms':>11}{'p95 ms':>10}{'per s':>11}")
+    for name, result in report['benchmarks'].items():
+        if 'median' not in result:
+            print(f"   {name:<44} {result.get('skipped') or result.get('error')}")
+            continue
+        throughput = result.get('throughput_per_s')
+        per_s = f"{throughput:>11.0f}" if throughput else f"{'':>11}"
+        print(f"   {name:<44}{result['median']:>11.3f}{result['p95']:>10.3f}{per_s}")
+
+
+def compare(baseline, current, threshold):
+    """Print median changes; returns the names that regressed beyond the threshold"""
+    regressions = []
+    print(f"   {'benchmark':<44}{'before ms':>11}{'after ms':>11}{'change':>9}")
+    for name, result in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name, {})
+        if 'median' not in result or 'median' not in before or not before['median']:
+            continue
+        change = result['median'] / before['median'] - 1.0
+        flag = ''
+        if change > threshold:
+            flag = '  ⚠️ REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  ✅ faster'
+        print(f"   {name:<44}{before['median']:>11.3f}{result['median']:>11.3f}{change:>+8.1%}{flag}")
+    missing = sorted(set(baseline['benchmarks']) - set(current['benchmarks']))
+    if missing:
+        print(f"   not in this run: {', '.join(missing)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection, embedding, matching and storage")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', nargs='+', metavar='RUN',
+                        help="baseline JSON to compare this run against, or two saved runs (old new)")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative median slowdown flagged as a regression (default 0.10)")
+    parser.add_argument('--repeat', type=int, default=50, help="iterations for the cheaper benchmarks")
+    parser.add_argument('--gallery-sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--medoids', type=int, default=1, help="medoids per synthetic identity")
+    parser.add_argument('--models', nargs='+', default=list(EMBEDDING_MODELS))
+    parser.add_argument('--skip', nargs='+', default=[], choices=SUITES)
+    parser.add_argument('--quick', action='store_true', help="fewer iterations and small galleries")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    if args.quick:
+        args.repeat = 10
+        args.gallery_sizes = [size for size in args.gallery_sizes if size <= 10000]
+
+    sys.path.insert(0, ROOT)
+    report = run(args)
+    print_results(report)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Vectorized box geometry.
+
+Boxes are (N, 4) float arrays in x1, y1, x2, y2 (corner) format unless a
+function says otherwise. Anything box-like (lists of tuples, a single
+box) is accepted through as_boxes().
+"""
+import numpy as np
+
+
+def as_boxes(boxes):
+    """(N, 4) float32 array from a list/tuple/array of boxes"""
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def to_int_tuples(boxes):
+    """Rounded (x1, y1, x2, y2) int tuples, the format the rest of the app passes around"""
+    return [tuple(int(v) for v in box) for box in np.rint(as_boxes(boxes))]
+
+
+# Format conversions
+
+def xywh_to_xyxy(boxes):
+    boxes = as_boxes(boxes).copy()
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+
+def xyxy_to_xywh(boxes):
+    boxes = as_boxes(boxes).copy()
+    boxes[:, 2:] -= boxes[:, :2]
+    return boxes
+
+
+def cxcywh_to_xyxy(boxes):
+    boxes = as_boxes(boxes)
+    half = boxes[:, 2:] / 2
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+def xyxy_to_cxcywh(boxes):
+    boxes = as_boxes(boxes)
+    size = boxes[:, 2:] - boxes[:, :2]
+    return np.concatenate([boxes[:, :2] + size / 2, size], axis=1)
+
+
+# Geometry
+
+def area(boxes):
+    boxes = as_boxes(boxes)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) boxes as an (N, M) array"""
+    a, b = as_boxes(a), as_boxes(b)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = area(a)[:, None] + area(b)[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def iou(box1, box2):
+    """IoU of two single boxes"""
+    return float(iou_matrix(box1, box2)[0, 0])
+
+
+def largest_index(boxes):
+    """Index of the largest box, or None when there are none"""
+    boxes = as_boxes(boxes)
+    return int(np.argmax(area(boxes))) if len(boxes) else None
+
+
+def largest(boxes):
+    """The largest box in its original form, or None"""
+    index = largest_index(boxes)
+    return boxes[index] if index is not None else None
+
+
+def clip(boxes, width, height):
+    """Clip boxes to the image"""
+    return np.clip(as_boxes(boxes), 0, [width, height, width, height])
+
+
+def pad(boxes, pixels=0, ratio=0.0):
+    """Grow boxes by a fixed number of pixels and/or a fraction of their size on every side"""
+    boxes = as_boxes(boxes)
+    size = boxes[:, 2:] - boxes[:, :2]
+    grow = pixels + ratio * size
+    return np.concatenate([boxes[:, :2] - grow, boxes[:, 2:] + grow], axis=1)
+
+
+def scale(boxes, factor):
+    """Scale coordinates (e.g. map boxes from a downscaled image back to full resolution)"""
+    return as_boxes(boxes) * factor
+
+
+# Suppression
+
+def nms(boxes, scores=None, iou_threshold=0.5):
+    """Indices of boxes kept by greedy non-maximum suppression.
+
+    Without scores, earlier boxes win (input order is the priority).
+    """
+    boxes = as_boxes(boxes)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-np.asarray(scores), kind='stable') if scores is not None else np.arange(len(boxes))
+    ious = iou_matrix(boxes, boxes)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= ious[i] > iou_threshold
+    return np.asarray(keep, dtype=np.int64)
+
+
+def soft_nms(boxes, scores, iou_threshold=0.3, sigma=0.5, score_threshold=0.001, method='gaussian'):
+    """Soft-NMS: decay the scores of overlapping boxes instead of dropping them.
+
+    Returns (kept indices in selection order, their decayed scores).
+    """
+    boxes = as_boxes(boxes)
+    scores = np.asarray(scores, dtype=np.float32).copy()
+    ious = iou_matrix(boxes, boxes)
+    remaining = np.arange(len(boxes))
+    keep, kept_scores = [], []
+    while len(remaining):
+        best = remaining[np.argmax(scores[remaining])]
+        if scores[best] < score_threshold:
+            break
+        keep.append(best)
+        kept_scores.append(scores[best])
+        remaining = remaining[remaining != best]
+        overlap = ious[best, remaining]
+        if method == 'linear':
+            decay = np.where(overlap > iou_threshold, 1.0 - overlap, 1.0)
+        else:
+            decay = np.exp(-(overlap ** 2) / sigma)
+        scores[remaining] *= decay
+    return np.asarray(keep, dtype=np.int64), np.asarray(kept_scores, dtype=np.float32)
+
+
+def match_greedy(a, b, iou_threshold):
+    """One-to-one matching of a to b by descending IoU; returns [(i, j), ...]"""
+    ious = iou_matrix(a, b)
+    pairs = []
+    if ious.size == 0:
+        return pairs
+    while True:
+        i, j = np.unravel_index(np.argmax(ious), ious.shape)
+        if ious[i, j] < iou_threshold:
+            return pairs
+        pairs.append((int(i), int(j)))
+        ious[i, :] = -1
+        ious[:, j] = -1
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Bulk enrollment importer.
+
+Enrolls people from existing photos instead of the interactive camera
+flows. Sources are either a folder tree like known_faces/<name>/<pose>/*.jpg
+(the pose level is optional) or a CSV manifest with `name,path` columns.
+
+Images are detected, cropped and embedded across a process pool, appended
+to the encrypted gallery in batches, and progress is checkpointed so an
+interrupted run picks up where it stopped.
+
+Usage:
+    python bulk_import.py known_faces
+    python bulk_import.py manifest.csv --workers 8 --batch-size 200
+    python bulk_import.py known_faces --retry-failed
+
+Images that failed (no face, unreadable, ...) are recorded in the
+checkpoint and skipped on resume; --retry-failed tries them again.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+DEFAULT_CHECKPOINT = '.bulk_import_checkpoint.json'
+
+
+def collect_from_tree(root):
+    """(name, path) pairs from a <name>/[<pose>/]*.jpg folder tree"""
+    items = []
+    for name in sorted(os.listdir(root)):
+        person_dir = os.path.join(root, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for dirpath, _, filenames in os.walk(person_dir):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((name, os.path.join(dirpath, filename)))
+    return items
+
+
+def collect_from_manifest(manifest_path):
+    """(name, path) pairs from a CSV manifest; relative paths resolve against the CSV's folder"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    items = []
+    with open(manifest_path, newline='') as f:
+        for row in csv.DictReader(f):
+            name = (row.get('name') or '').strip()
+            path = (row.get('path') or '').strip()
+            if not name or not path:
+                continue
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            items.append((name, path))
+    return items
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'done': [], 'failures': {}}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def init_worker():
+    """Keep each worker process to one TensorFlow thread - the pool provides the parallelism"""
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except Exception:
+        pass
+
+
+def embed_image(item, model_name='ArcFace'):
+    """Worker: detect, crop and embed the largest face in one image.
+
+    Returns (name, path, embedding or None, error or None).
+    """
+    name, path = item
+    try:
+        import cv2
+        from detector import detect_faces
+        from boxes import largest
+        from face_preprocessing import PREPROCESSING_VERSION, align_face, enhance_face_quality, model_input_size
+        from embedding_batcher import deepface_embed_batch, deepface_embed_single
+        from embedding_cache import get_embedding_cache, image_hash
+        from config import DETECTOR_BACKEND
+
+        # Re-imported photos are served from the embedding cache
+        cache = get_embedding_cache()
+        cache_key = (image_hash(path), model_name, DETECTOR_BACKEND, f'aligned-v{PREPROCESSING_VERSION}')
+        embedding = cache.get(*cache_key)
+        if embedding is not None:
+            return name, path, embedding.tolist(), None
+
+        frame = cv2.imread(path)
+        if frame is None:
+            return name, path, None, 'unreadable image'
+
+        faces = detect_faces(frame)
+        if not faces:
+            return name, path, None, 'no face detected'
+
+        # Largest face is the subject of an enrollment photo
+        crop = align_face(frame, largest(faces), size=model_input_size(model_name))
+        enhance_face_quality(crop, out=crop)
+
+        try:
+            embedding = deepface_embed_batch(model_name, [crop])[0]
+        except Exception:
+            embedding = deepface_embed_single(model_name, crop)
+        if embedding is None:
+            return name, path, None, 'embedding failed'
+        cache.put(*cache_key, embedding)
+        return name, path, embedding, None
+    except Exception as e:
+        return name, path, None, str(e)
+
+
+class BulkImporter:
+    def __init__(self, source, workers=None, batch_size=100, checkpoint_path=DEFAULT_CHECKPOINT,
+                 model_name='ArcFace', retry_failed=False):
+        self.source = source
+        self.retry_failed = retry_failed
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.model_name = model_name
+
+    def collect(self):
+        if os.path.isdir(self.source):
+            return collect_from_tree(self.source)
+        return collect_from_manifest(self.source)
+
+    def run(self):
+        import numpy as np
+        from gallery import append_to_gallery
+
+        checkpoint = load_checkpoint(self.checkpoint_path)
+        failed = {path for records in checkpoint['failures'].values() for path, _ in records}
+        if self.retry_failed and failed:
+            # Older checkpoints also listed failures as done
+            checkpoint['done'] = [path for path in checkpoint['done'] if path not in failed]
+            checkpoint['failures'] = {}
+            failed = set()
+        done = set(checkpoint['done'])
+        items = [item for item in self.collect() if item[1] not in done and item[1] not in failed]
+
+        print(f"📥 Bulk import from {self.source}")
+        print(f"   {len(done)} images already imported, {len(failed)} failed before "
+              f"(--retry-failed to retry), {len(items)} to go, {self.workers} workers")
+        if not items:
+            return checkpoint
+
+        pending_encodings, pending_names, pending_paths = [], [], []
+        unflushed = 0
+        processed = 0
+        imported = 0
+        start = time.perf_counter()
+
+        def flush():
+            nonlocal imported, unflushed
+            if pending_encodings:
+                append_to_gallery(list(pending_encodings), list(pending_names))
+                imported += len(pending_encodings)
+            # Gallery first, then checkpoint: a crash in between re-imports at most one batch.
+            # Only imported paths are done; failures stay in 'failures' for --retry-failed.
+            checkpoint['done'].extend(pending_paths)
+            save_checkpoint(self.checkpoint_path, checkpoint)
+            pending_encodings.clear()
+            pending_names.clear()
+            pending_paths.clear()
+            unflushed = 0
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            model_names = [self.model_name] * len(items)
+            for name, path, embedding, error in executor.map(embed_image, items, model_names, chunksize=4):
+                processed += 1
+                unflushed += 1
+                if embedding is None:
+                    checkpoint['failures'].setdefault(name, []).append([path, error])
+                else:
+                    pending_encodings.append(np.asarray(embedding, dtype=np.float32))
+                    pending_names.append(name)
+                    pending_paths.append(path)
+
+                if unflushed >= self.batch_size:
+                    flush()
+                    rate = processed / (time.perf_counter() - start)
+                    print(f"   {processed}/{len(items)} images ({rate:.1f} img/s)")
+
+        flush()
+        elapsed = time.perf_counter() - start
+        self.print_report(checkpoint, processed, imported, elapsed)
+        return checkpoint
+
+    def print_report(self, checkpoint, processed, imported, elapsed):
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        print(f"\n📊 Bulk import complete")
+        print(f"   Processed: {processed} images in {elapsed:.1f}s ({rate:.1f} img/s)")
+        print(f"   Imported:  {imported} embeddings")
+        failures = checkpoint['failures']
+        if failures:
+            total_failed = sum(len(v) for v in failures.values())
+            print(f"   Failed:    {total_failed} images across {len(failures)} identities")
+            for name, failed in sorted(failures.items(), key=lambda kv: -len(kv[1])):
+                reasons = {}
+                for _, reason in failed:
+                    reasons[reason] = reasons.get(reason, 0) + 1
+                summary = ', '.join(f"{reason} x{count}" for reason, count in reasons.items())
+                print(f"     {name}: {len(failed)} ({summary})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-enroll people from photo folders or a CSV manifest")
+    parser.add_argument('source', help="known_faces-style folder or CSV manifest (name,path)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=100, help="images per gallery append/checkpoint")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="checkpoint file for resuming")
+    parser.add_argument('--model', default='ArcFace', help="DeepFace embedding model")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="retry images that failed in an earlier run instead of skipping them")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Source not found: {args.source}")
+        sys.exit(1)
+
+    importer = BulkImporter(args.source, workers=args.workers, batch_size=args.batch_size,
+                            checkpoint_path=args.checkpoint, model_name=args.model,
+                            retry_failed=args.retry_failed)
+    importer.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,102 @@ LIVENESS_THRESHOLD = 0.8
 AUTHORIZED_FACES_FILE = 'authorized_faces.pkl'
 ENCRYPTION_KEY_FILE = 'key.key'
 DATABASE_FILE = 'access_logs.db'
+# The encryption key is generated on first use by utils.ensure_encryption_key()
 
-# Generate encryption key if missing
-if not os.path.exists(ENCRYPTION_KEY_FILE):
-    from cryptography.fernet import Fernet
-    key = Fernet.generate_key()
-    with open(ENCRYPTION_KEY_FILE, 'wb') as f:
-        f.write(key)
+# Access-log snapshot store
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_MAX_BYTES = 500 * 1024 * 1024  # Evict oldest snapshots beyond this size
+SNAPSHOT_DEDUP_WINDOW = 60.0  # seconds to treat perceptually similar crops as duplicates
+SNAPSHOT_PHASH_DISTANCE = 6  # max Hamming distance (of 64 bits) for a perceptual duplicate
+SNAPSHOT_JPEG_QUALITY = 85
+
+# Dashboard event stream (Server-Sent Events)
+EVENT_REPLAY_SIZE = 200  # events kept for clients reconnecting with Last-Event-ID
+EVENT_HEARTBEAT_INTERVAL = 15.0  # seconds between keep-alive comments
+
+# Image upload recognition
+UPLOAD_MAX_SIDE = 1280  # uploads larger than this are decoded at reduced resolution
+UPLOAD_MAX_IMAGES = 16  # images accepted per batch request
+
+# Inference concurrency (shared by the Flask and async servers)
+INFERENCE_CONCURRENCY = int(os.environ.get('INFERENCE_CONCURRENCY', 2))  # parallel model calls
+INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', 16))  # calls allowed to wait
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 30.0))  # seconds per request
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 64))  # async mode: threads for non-inference routes (one per open stream)
+
+# Embedding micro-batching across concurrent requests
+EMBEDDING_MAX_BATCH = int(os.environ.get('EMBEDDING_MAX_BATCH', 16))
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get('EMBEDDING_MAX_WAIT_MS', 5.0))
+EMBEDDING_TIMEOUT = 60.0  # seconds a caller waits for its embedding (first call loads the model)
+
+# Admission control (per traffic class: door > enrollment > dashboard > batch)
+ADMISSION_CLASS_LIMITS = {'door': 8, 'enrollment': 4, 'dashboard': 4, 'batch': 2}  # max in flight
+ADMISSION_LOAD_SHARE = {'door': 1.0, 'enrollment': 0.9, 'dashboard': 0.6, 'batch': 0.5}  # max pool load admitted
+DEGRADE_ENTER_LOAD = 0.8  # pool load that triggers degraded mode...
+DEGRADE_HOLD_SECONDS = 5.0  # ...when sustained this long
+DEGRADE_EXIT_LOAD = 0.4
+
+# Enrollment sessions
+ENROLLMENT_SESSION_TTL = 300.0  # seconds of inactivity before a session and its crops are dropped
+
+# Enrollment auto-capture
+AUTO_CAPTURE_WINDOW = 0.8  # seconds to keep looking for a better frame once a pose is acceptable
+AUTO_CAPTURE_MIN_SCORE = 0.35  # minimum quality score (0-1) for a frame to count
+AUTO_CAPTURE_MIN_FACE = 100  # face width in pixels below which size is penalized
+AUTO_CAPTURE_YAW_THRESHOLD = 0.35
+AUTO_CAPTURE_PITCH_THRESHOLD = 0.3
+AUTO_CAPTURE_BURST = 5  # camera frames scored per web capture
+
+# Compact per-identity templates
+TEMPLATE_MEDOIDS = 3  # representative embeddings kept per identity (besides the mean)
+TEMPLATE_RERANK_MARGIN = 0.03  # rerank against every image when the top two identities are this close
+GALLERY_STORAGE = os.environ.get('GALLERY_STORAGE', 'float32')  # float32 | float16 | int8 (per-vector scale)
+
+# Background enrollment jobs
+ENROLLMENT_JOB_MAX_ATTEMPTS = 3  # automatic attempts before a job is left failed (manual retry still possible)
+ENROLLMENT_JOB_RETRY_DELAY = 2.0  # seconds before an automatic retry, doubled each attempt
+ENROLLMENT_JOB_HISTORY = 100  # finished jobs kept for progress queries
+ENROLLMENT_EMBEDDING_MODEL = 'ArcFace'  # model the live recognizer matches queries with
+
+# Track-level liveness
+LIVENESS_CACHE_TTL = 10.0  # seconds a track's liveness verdict is reused
+LIVENESS_TRACK_MAX_AGE = 1.0  # seconds a face track survives without a matching detection
+LIVENESS_TRACK_IOU = 0.3  # min overlap to continue a track
+LIVENESS_TRACK_FRAMES = 8  # recent crops kept per track for the temporal pre-filter
+LIVENESS_MIN_FRAMES = 4  # crops needed before the pre-filter can vouch for a track
+LIVENESS_MOTION_THRESHOLD = 2.0  # non-rigid motion (grey levels) that counts as a live face
+LIVENESS_TEXTURE_MIN = 40.0  # Laplacian variance below which a crop looks like a print/screen
+
+# Speech
+SPEECH_QUEUE_SIZE = 4  # pending announcements; the oldest is dropped when full
+SPEECH_MAX_AGE = 3.0  # seconds after which a queued announcement is stale and skipped
+SPEECH_CACHE_DIR = 'speech_cache'  # pre-rendered greeting audio
+
+# Door actuator
+DOOR_DRIVER = os.environ.get('DOOR_DRIVER', 'mock')  # mock | gpio | relay
+DOOR_UNLOCK_SECONDS = 5.0  # open window per grant; repeated grants extend it
+DOOR_MIN_CONFIDENCE = 0.9  # match confidence needed to unlock (the PERFECT_MATCH threshold)
+DOOR_GPIO_PIN = int(os.environ.get('DOOR_GPIO_PIN', 18))
+DOOR_RELAY_PORT = os.environ.get('DOOR_RELAY_PORT', '/dev/ttyUSB0')
+DOOR_TIMER_TICK = 0.05  # timer wheel resolution in seconds
+DOOR_EVENT_HISTORY = 100  # actuation events kept for /api/door
+
+# Face detection
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'haar')  # haar | yunet | retinaface
+DETECTOR_MAX_SIDE = int(os.environ.get('DETECTOR_MAX_SIDE', 640))  # frames are downscaled to this long side for detection
+DETECTOR_SCORE_THRESHOLD = 0.7  # minimum confidence for backends that report one
+YUNET_MODEL_PATH = os.environ.get('YUNET_MODEL_PATH', 'models/face_detection_yunet_2023mar.onnx')
+
+# Embedding cache
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', 'embedding_cache.db')  # SQLite blob store
+EMBEDDING_CACHE_MEMORY_SIZE = 4096  # embeddings kept in the in-memory LRU
+
+# On-demand profiling (admin only; disabled unless ADMIN_TOKEN is set)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILE_MAX_SECONDS = 60.0  # longest profile a single request may run
+PROFILE_SAMPLE_INTERVAL_MS = 5.0  # stack sampling period
+
+# Sharded gallery (0 = single in-process index)
+GALLERY_SHARDS = int(os.environ.get('GALLERY_SHARDS', 0))  # shard worker processes
+GALLERY_SHARD_TIMEOUT = 0.5  # seconds a shard may take per query before results go out partial
+GALLERY_SHARD_VNODES = 64  # virtual nodes per shard on the consistent-hash ring
@@ -1,6 +1,7 @@
 import sqlite3
 import os
 from datetime import datetime
+from metrics import stage_timer
 
 def init_attendance_db():
     """Initialize attendance database"""
@@ -25,16 +26,17 @@ def init_attendance_db():
 
 def log_attendance(user_name, confidence, decision, source='STANDALONE'):
     """Log attendance record"""
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO attendance (user_name, decision, confidence, source, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_name, decision, confidence, source, datetime.now()))
-    
-    conn.commit()
-    conn.close()
+    with stage_timer('db_write', model='attendance'):
+        conn = sqlite3.connect('attendance.db')
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO attendance (user_name, decision, confidence, source, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_name, decision, confidence, source, datetime.now()))
+        
+        conn.commit()
+        conn.close()
 
 def get_attendance_records(limit=100):
     """Get attendance records"""
@@ -141,17 +143,15 @@ def init_db():
 
 def log_access_attempt(identity, confidence, decision, spoof_score=0.0, image_path=None):
     """Log every access attempt"""
-    conn = sqlite3.connect('access_logs.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO access_logs 
-        (timestamp, identity, confidence, decision, spoof_score, image_path)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (datetime.now().isoformat(), identity, confidence, decision, spoof_score, image_path))
-    
-    conn.commit()
-    conn.close()
-
-# Initialize on import
-init_attendance_db()
+    with stage_timer('db_write', model='access_logs'):
+        conn = sqlite3.connect('access_logs.db')
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO access_logs 
+            (timestamp, identity, confidence, decision, spoof_score, image_path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (datetime.now().isoformat(), identity, confidence, decision, spoof_score, image_path))
+        
+        conn.commit()
+        conn.close()
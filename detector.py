@@ -1,58 +1,193 @@
+import os
+import threading
+
 import cv2
 import numpy as np
 
-# Initialize OpenCV face detector once
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+from boxes import as_boxes, clip, pad, scale as scale_boxes, to_int_tuples, xywh_to_xyxy
+from face_preprocessing import align_face
+from metrics import stage_timer
+from config import DETECTOR_BACKEND, DETECTOR_MAX_SIDE, DETECTOR_SCORE_THRESHOLD, YUNET_MODEL_PATH
+
+
+class FaceDetector:
+    """Detection backend: detect() takes an (already downscaled) BGR image and returns
+    an (N, 4) float array of x1, y1, x2, y2 boxes and an (N,) array of scores"""
+    name = 'base'
+
+    def detect(self, image):
+        raise NotImplementedError
+
+    def detect_landmarks(self, image):
+        """Boxes, scores and an (N, K, 2) landmark array, or None if the backend has none"""
+        boxes, scores = self.detect(image)
+        return boxes, scores, None
+
+
+class HaarDetector(FaceDetector):
+    name = 'haar'
+
+    def __init__(self, scale_factor=1.1, min_neighbors=5, min_size=(24, 24)):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        if self.cascade.empty():
+            raise RuntimeError("Could not load face cascade classifier")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=self.min_size,
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        boxes = xywh_to_xyxy(faces)
+        return boxes, np.ones(len(boxes), dtype=np.float32)
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV DNN face detector (YuNet) from a local ONNX model file"""
+    name = 'yunet'
+
+    def __init__(self, model_path=YUNET_MODEL_PATH, score_threshold=DETECTOR_SCORE_THRESHOLD):
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"YuNet model not found at {model_path}")
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self.input_size = None
+
+    def detect(self, image):
+        boxes, scores, _ = self.detect_landmarks(image)
+        return boxes, scores
+
+    def detect_landmarks(self, image):
+        h, w = image.shape[:2]
+        if self.input_size != (w, h):
+            self.model.setInputSize((w, h))
+            self.input_size = (w, h)
+        _, faces = self.model.detect(image)
+        if faces is None:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros((0, 5, 2), np.float32)
+        # Columns 4-13: right eye, left eye, nose tip, right and left mouth corners (subject's view)
+        landmarks = faces[:, 4:14].reshape(-1, 5, 2).astype(np.float32)
+        return xywh_to_xyxy(faces[:, :4]), faces[:, -1].astype(np.float32), landmarks
+
+
+class RetinaFaceDetector(FaceDetector):
+    """RetinaFace through DeepFace (most accurate, slowest)"""
+    name = 'retinaface'
+
+    def __init__(self, score_threshold=DETECTOR_SCORE_THRESHOLD):
+        from deepface import DeepFace
+        self.deepface = DeepFace
+        self.score_threshold = score_threshold
+
+    def detect(self, image):
+        boxes, scores, _ = self.detect_landmarks(image)
+        return boxes, scores
+
+    def detect_landmarks(self, image):
+        faces = self.deepface.extract_faces(img_path=image, detector_backend='retinaface',
+                                            enforce_detection=False)
+        boxes, scores, landmarks = [], [], []
+        for face in faces:
+            area = face.get('facial_area', {})
+            confidence = face.get('confidence', 0.0) or 0.0
+            if confidence < self.score_threshold:
+                continue
+            boxes.append((area['x'], area['y'], area['x'] + area['w'], area['y'] + area['h']))
+            scores.append(confidence)
+            eyes = (area.get('left_eye'), area.get('right_eye'))
+            landmarks.append(eyes if all(eyes) else [(np.nan, np.nan)] * 2)
+        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 2, 2)
+        return as_boxes(boxes), np.asarray(scores, dtype=np.float32), landmarks
+
+
+DETECTOR_BACKENDS = {'haar': HaarDetector, 'yunet': YuNetDetector, 'retinaface': RetinaFaceDetector}
+
+# Detector instances are per thread - cascade and DNN objects keep per-call state
+local = threading.local()
+
+
+def get_detector(backend=None):
+    """Get this thread's detector for a backend, falling back to Haar if it cannot load"""
+    backend = backend or DETECTOR_BACKEND
+    detectors = getattr(local, 'detectors', None)
+    if detectors is None:
+        detectors = local.detectors = {}
+    if backend not in detectors:
+        try:
+            detectors[backend] = DETECTOR_BACKENDS[backend]()
+        except Exception as e:
+            if backend == 'haar':
+                print(f"Warning: {e}")
+                detectors[backend] = None
+            else:
+                print(f"Warning: detector backend '{backend}' unavailable ({e}); using Haar cascade")
+                detectors[backend] = get_detector('haar')
+    return detectors[backend]
+
 
 def init_face_detector():
-    """Initialize OpenCV face detector"""
-    global face_cascade
-    if face_cascade.empty():
-        print("Warning: Could not load face cascade classifier")
-        return None
-    return face_cascade
-
-def detect_faces(frame):
-    """Detect faces in frame and return bounding boxes"""
-    global face_cascade
-    if face_cascade.empty():
-        face_cascade = init_face_detector()
-        if face_cascade.empty():
-            return []
-    
-    # Convert to grayscale for detection
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    # Detect faces with more lenient parameters
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.05,  # Was 1.1 - more sensitive
-        minNeighbors=3,      # Was 5 - more lenient
-        minSize=(20, 20),   # Was 30x30 - smaller minimum
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
-    
-    # Convert to (x1, y1, x2, y2) format
-    face_boxes = []
-    for (x, y, w, h) in faces:
-        face_boxes.append((x, y, x + w, y + h))
-    
-    return face_boxes
-
-def extract_face_crop(frame, bbox):
+    """Initialize the configured face detector"""
+    return get_detector()
+
+
+def downscale(frame, max_side=DETECTOR_MAX_SIDE):
+    """Resize so the long side is at most max_side; returns (image, scale back to full resolution)"""
+    h, w = frame.shape[:2]
+    long_side = max(h, w)
+    if not max_side or long_side <= max_side:
+        return frame, 1.0
+    factor = max_side / float(long_side)
+    small = cv2.resize(frame, (int(round(w * factor)), int(round(h * factor))), interpolation=cv2.INTER_AREA)
+    return small, 1.0 / factor
+
+
+def detect_faces_scored(frame, backend=None, max_side=DETECTOR_MAX_SIDE):
+    """Detect on a downscaled copy; returns full-resolution boxes (N, 4) and scores (N,)"""
+    detector = get_detector(backend)
+    if detector is None:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    with stage_timer('detection', model=detector.name):
+        small, scale = downscale(frame, max_side)
+        boxes, scores = detector.detect(small)
+    if len(boxes):
+        h, w = frame.shape[:2]
+        boxes = clip(scale_boxes(boxes, scale), w, h)
+    return boxes, scores
+
+
+def detect_faces(frame, backend=None, max_side=DETECTOR_MAX_SIDE):
+    """Detect faces in frame and return (x1, y1, x2, y2) bounding boxes at full resolution"""
+    boxes, _ = detect_faces_scored(frame, backend, max_side)
+    return to_int_tuples(boxes)
+
+
+def detect_faces_landmarked(frame, backend=None, max_side=DETECTOR_MAX_SIDE):
+    """Like detect_faces, plus per-face full-resolution landmarks (None where the backend has none)"""
+    detector = get_detector(backend)
+    if detector is None:
+        return [], []
+    with stage_timer('detection', model=detector.name):
+        small, scale = downscale(frame, max_side)
+        boxes, _, landmarks = detector.detect_landmarks(small)
+    h, w = frame.shape[:2]
+    boxes = to_int_tuples(clip(scale_boxes(boxes, scale), w, h))
+    if landmarks is None:
+        return boxes, [None] * len(boxes)
+    return boxes, [None if np.isnan(points).any() else points * scale for points in landmarks]
+
+
+def extract_face_crop(frame, bbox, landmarks=None, size=(160, 160)):
     """Extract and preprocess face region"""
-    x1, y1, x2, y2 = bbox
     # Add padding and ensure bounds
     h, w = frame.shape[:2]
-    x1 = max(0, x1 - 10)
-    y1 = max(0, y1 - 10)
-    x2 = min(w, x2 + 10)
-    y2 = min(h, y2 + 10)
-    
-    face = frame[y1:y2, x1:x2]
-    if face.size == 0:
+    x1, y1, x2, y2 = to_int_tuples(clip(pad(bbox, pixels=10), w, h))[0]
+    if x2 <= x1 or y2 <= y1:
         return None
-    
-    # Resize to standard 160x160 for recognition
-    face = cv2.resize(face, (160, 160))
-    return face
+
+    # Warp straight to the standard 160x160 (aligned when landmarks are known)
+    return align_face(frame, (x1, y1, x2, y2), landmarks, size)
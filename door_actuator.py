@@ -0,0 +1,290 @@
+import math
+import time
+import queue
+import threading
+from collections import deque
+
+from config import (DOOR_DRIVER, DOOR_UNLOCK_SECONDS, DOOR_GPIO_PIN, DOOR_RELAY_PORT, DOOR_TIMER_TICK,
+                    DOOR_EVENT_HISTORY)
+from event_bus import publish_event
+
+
+class DoorDriver:
+    """Hardware interface: unlock() and lock() may block on I/O; they only run on the actuator thread"""
+    name = 'base'
+
+    def unlock(self):
+        raise NotImplementedError
+
+    def lock(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MockDoorDriver(DoorDriver):
+    name = 'mock'
+
+    def __init__(self):
+        self.unlocked = False
+
+    def unlock(self):
+        self.unlocked = True
+        print("🔓 DOOR UNLOCKED (User authorized)")
+
+    def lock(self):
+        self.unlocked = False
+        print("🔒 DOOR LOCKED")
+
+
+class GPIODoorDriver(DoorDriver):
+    """Door strike on a Raspberry Pi GPIO pin"""
+    name = 'gpio'
+
+    def __init__(self, pin=DOOR_GPIO_PIN, active_high=True):
+        import RPi.GPIO as GPIO
+        self.gpio = GPIO
+        self.pin = pin
+        self.active_high = active_high
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.OUT, initial=self._level(False))
+
+    def _level(self, unlocked):
+        return self.gpio.HIGH if unlocked == self.active_high else self.gpio.LOW
+
+    def unlock(self):
+        self.gpio.output(self.pin, self._level(True))
+
+    def lock(self):
+        self.gpio.output(self.pin, self._level(False))
+
+    def close(self):
+        self.gpio.cleanup(self.pin)
+
+
+class SerialRelayDoorDriver(DoorDriver):
+    """USB/serial relay board (stand-in for commercial relay controllers)"""
+    name = 'relay'
+
+    def __init__(self, port=DOOR_RELAY_PORT, baudrate=9600, on_command=b'\xA0\x01\x01\xA2',
+                 off_command=b'\xA0\x01\x00\xA1'):
+        import serial
+        self.serial = serial.Serial(port, baudrate, timeout=1)
+        self.on_command = on_command
+        self.off_command = off_command
+
+    def unlock(self):
+        self.serial.write(self.on_command)
+        self.serial.flush()
+
+    def lock(self):
+        self.serial.write(self.off_command)
+        self.serial.flush()
+
+    def close(self):
+        self.serial.close()
+
+
+DRIVERS = {'mock': MockDoorDriver, 'gpio': GPIODoorDriver, 'relay': SerialRelayDoorDriver}
+
+
+def create_driver(name=DOOR_DRIVER):
+    """Build the configured driver, falling back to the mock when hardware is unavailable"""
+    try:
+        return DRIVERS[name]()
+    except Exception as e:
+        print(f"⚠️ Door driver '{name}' unavailable ({e}); using mock driver")
+        return MockDoorDriver()
+
+
+class WheelTimer:
+    def __init__(self, deadline_tick, callback):
+        self.deadline_tick = deadline_tick
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, with a fixed tick resolution.
+
+    Not thread-safe - it is driven by the single thread that calls advance().
+    Timers further out than one revolution stay in their slot until their
+    deadline tick comes around.
+    """
+
+    def __init__(self, tick=DOOR_TIMER_TICK, slots=512):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current_tick = int(time.monotonic() / tick)
+
+    def schedule(self, delay, callback):
+        # Round up so a timer never fires before its deadline
+        deadline_tick = max(self.current_tick + 1, math.ceil((time.monotonic() + delay) / self.tick))
+        timer = WheelTimer(deadline_tick, callback)
+        self.slots[deadline_tick % len(self.slots)].append(timer)
+        return timer
+
+    def advance(self, now=None):
+        """Move the wheel up to `now`; returns the timers that fired"""
+        target_tick = int((now if now is not None else time.monotonic()) / self.tick)
+        due = []
+        while self.current_tick < target_tick:
+            self.current_tick += 1
+            slot = self.slots[self.current_tick % len(self.slots)]
+            remaining = []
+            for timer in slot:
+                if timer.cancelled:
+                    continue
+                if timer.deadline_tick <= self.current_tick:
+                    due.append(timer)
+                else:
+                    remaining.append(timer)
+            slot[:] = remaining
+        return due
+
+
+class DoorActuator:
+    """Non-blocking door control.
+
+    grant() only enqueues a command. One actuator thread performs all
+    driver I/O and drives a timer wheel for relocking, so callers never
+    wait on the door. A grant while the door is already open extends the
+    open window (rescheduling the relock) instead of queueing another
+    unlock. Every actuation is recorded with its latency.
+    """
+
+    def __init__(self, driver=None, unlock_seconds=DOOR_UNLOCK_SECONDS, tick=DOOR_TIMER_TICK,
+                 history=DOOR_EVENT_HISTORY):
+        self.driver = driver
+        self.unlock_seconds = unlock_seconds
+        self.wheel = TimerWheel(tick)
+        self.commands = queue.Queue()
+        self.events = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.unlocked = False
+        self.open_until = None
+        self.relock_timer = None
+        self.stats = {'grants': 0, 'unlocks': 0, 'extensions': 0, 'locks': 0, 'errors': 0}
+        self.worker = threading.Thread(target=self._worker_loop, name='door-actuator', daemon=True)
+        self.worker.start()
+
+    def grant(self, identity=None, duration=None):
+        """Request the door open for `duration` seconds; returns immediately"""
+        with self.lock:
+            self.stats['grants'] += 1
+        self.commands.put(('grant', identity, duration or self.unlock_seconds, time.monotonic()))
+
+    def lock_now(self):
+        """Request an immediate relock; returns immediately"""
+        self.commands.put(('lock', None, None, time.monotonic()))
+
+    def _worker_loop(self):
+        if self.driver is None:
+            self.driver = create_driver()
+        while True:
+            try:
+                command = self.commands.get(timeout=self.wheel.tick)
+            except queue.Empty:
+                command = None
+            if command is not None:
+                kind, identity, duration, requested_at = command
+                if kind == 'grant':
+                    self._grant(identity, duration, requested_at)
+                else:
+                    self._relock(requested_at, reason='manual')
+            for timer in self.wheel.advance():
+                timer.callback()
+
+    def _grant(self, identity, duration, requested_at):
+        now = time.monotonic()
+        open_until = now + duration
+        if self.unlocked:
+            # Already open - push the relock out rather than actuating again
+            if open_until <= self.open_until:
+                return
+            self.relock_timer.cancelled = True
+            self._schedule_relock(open_until)
+            self._record('extend', identity, requested_at, time.monotonic(), 'extensions')
+            return
+
+        try:
+            self.driver.unlock()
+        except Exception as e:
+            self._record_error('unlock', identity, e)
+            return
+        self.unlocked = True
+        self._schedule_relock(open_until)
+        self._record('unlock', identity, requested_at, time.monotonic(), 'unlocks')
+
+    def _schedule_relock(self, open_until):
+        self.open_until = open_until
+        self.relock_timer = self.wheel.schedule(
+            open_until - time.monotonic(), lambda: self._relock(open_until, reason='timer'))
+
+    def _relock(self, due_at, reason):
+        if not self.unlocked:
+            return
+        if self.relock_timer is not None:
+            self.relock_timer.cancelled = True
+        try:
+            self.driver.lock()
+        except Exception as e:
+            # Keep the relock pending - try again on the next tick
+            self._record_error('lock', None, e)
+            self.relock_timer = self.wheel.schedule(self.wheel.tick, lambda: self._relock(due_at, reason))
+            return
+        self.unlocked = False
+        self.open_until = None
+        self.relock_timer = None
+        self._record('lock', None, due_at, time.monotonic(), 'locks', reason=reason)
+
+    def _record(self, action, identity, requested_at, actuated_at, counter, **extra):
+        event = {
+            'action': action,
+            'identity': identity,
+            'driver': self.driver.name,
+            'timestamp': time.time(),
+            'latency_ms': round((actuated_at - requested_at) * 1000, 2),
+            'open_for': round(self.open_until - actuated_at, 2) if self.open_until else 0.0,
+        }
+        event.update(extra)
+        with self.lock:
+            self.events.append(event)
+            self.stats[counter] += 1
+        publish_event('door', event)
+
+    def _record_error(self, action, identity, error):
+        print(f"❌ Door {action} failed: {error}")
+        with self.lock:
+            self.stats['errors'] += 1
+            self.events.append({'action': f'{action}_failed', 'identity': identity, 'driver': self.driver.name,
+                                'timestamp': time.time(), 'error': str(error)})
+
+    def get_status(self):
+        with self.lock:
+            latencies = sorted(e['latency_ms'] for e in self.events if e['action'] == 'unlock')
+            return {
+                'unlocked': self.unlocked,
+                'open_for': round(max(0.0, self.open_until - time.monotonic()), 2) if self.open_until else 0.0,
+                'driver': self.driver.name if self.driver else None,
+                'stats': dict(self.stats),
+                'unlock_latency_ms': {
+                    'p50': latencies[len(latencies) // 2] if latencies else None,
+                    'max': latencies[-1] if latencies else None,
+                },
+                'events': list(self.events),
+            }
+
+
+# Global door actuator (thread and driver start on first use)
+door_actuator = None
+door_actuator_lock = threading.Lock()
+
+def get_door_actuator():
+    """Get or create the shared door actuator"""
+    global door_actuator
+    with door_actuator_lock:
+        if door_actuator is None:
+            door_actuator = DoorActuator()
+        return door_actuator
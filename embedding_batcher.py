@@ -0,0 +1,222 @@
+import time
+import queue
+import bisect
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from config import EMBEDDING_MAX_BATCH, EMBEDDING_MAX_WAIT_MS, EMBEDDING_TIMEOUT
+from face_preprocessing import FaceBatchBuffer
+from metrics import observe_stage
+
+# Histogram bucket upper bounds for queue wait time (ms)
+WAIT_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 250]
+
+
+def represent_input(model, crop, detector_backend='retinaface'):
+    """Model input for one BGR crop, preprocessed exactly as DeepFace.represent does.
+
+    Detection and eye alignment inside the crop, BGR channel order, padded
+    resize and base normalization - so batched embeddings match the stored
+    gallery embeddings and the per-crop fallback.
+    """
+    from deepface.modules import detection, preprocessing
+
+    face = detection.extract_faces(img_path=crop, detector_backend=detector_backend, grayscale=False,
+                                   enforce_detection=False, align=True)[0]['face']
+    img = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(model.input_shape[1], model.input_shape[0]))
+    return preprocessing.normalize_input(img=img, normalization='base')
+
+
+def deepface_embed_batch(model_name, crops):
+    """Embed BGR face crops with one forward pass of the model"""
+    from deepface import DeepFace
+
+    model = DeepFace.build_model(model_name)
+    batch = np.concatenate([represent_input(model, crop) for crop in crops], axis=0)
+    outputs = model.model(batch, training=False).numpy()
+    return [output.tolist() for output in outputs]
+
+
+def deepface_embed_single(model_name, crop):
+    """Per-crop fallback matching the original recognizer call"""
+    from deepface import DeepFace
+    embedding = DeepFace.represent(
+        img_path=crop,
+        model_name=model_name,
+        enforce_detection=False,
+        detector_backend='retinaface'
+    )
+    if embedding and len(embedding) > 0:
+        return embedding[0]['embedding']
+    return None
+
+
+class EmbeddingBatcher:
+    """Dynamic batcher in front of one embedding model.
+
+    Callers submit single crops (or a frame plus face box/landmarks) and
+    wait on a future. A background thread collects pending requests for up
+    to `max_wait_ms` or `max_batch` items, runs a single batched forward
+    pass and scatters the results back. Face submissions are aligned and
+    enhanced straight into the batcher's preallocated input buffer.
+    """
+
+    def __init__(self, model_name, max_batch=EMBEDDING_MAX_BATCH, max_wait_ms=EMBEDDING_MAX_WAIT_MS,
+                 embed_batch_fn=deepface_embed_batch, embed_single_fn=deepface_embed_single):
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.embed_batch_fn = embed_batch_fn
+        self.embed_single_fn = embed_single_fn
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batch_sizes = {}  # batch size -> count
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.batched_calls = 0
+        self.fallback_calls = 0
+        self.buffer = FaceBatchBuffer(model_name, max_batch)
+        self.worker = threading.Thread(target=self._worker_loop,
+                                       name=f'embedding-batcher-{model_name}', daemon=True)
+        self.worker.start()
+
+    def submit(self, crop):
+        """Queue a crop and return a future resolving to its embedding (or None)"""
+        future = Future()
+        self.queue.put((time.monotonic(), crop, future))
+        return future
+
+    def submit_face(self, frame, bbox, landmarks=None, enhance=True):
+        """Queue a face in a frame; it is aligned to the model's input size on the worker.
+
+        The frame must not be modified until the future resolves.
+        """
+        future = Future()
+        self.queue.put((time.monotonic(), (frame, bbox, landmarks, enhance), future))
+        return future
+
+    def embed(self, crop, timeout=EMBEDDING_TIMEOUT):
+        """Blocking helper for callers on the inference threads"""
+        return self.submit(crop).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect()
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Never let the worker die - callers would wait on their futures forever
+                print(f"❌ Embedding batch failed ({self.model_name}): {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        self._record(len(batch), [(started - enqueued) * 1000 for enqueued, _, _ in batch])
+
+        batch, crops = self._prepare(batch)
+        observe_stage('preprocessing', time.monotonic() - started, model=self.model_name)
+        if batch:
+            self._embed(batch, crops)
+
+    def _embed(self, batch, crops):
+        forward_started = time.monotonic()
+        try:
+            embeddings = self.embed_batch_fn(self.model_name, crops)
+            with self.lock:
+                self.batched_calls += 1
+        except Exception:
+            # Batched path unavailable for this model - embed one by one
+            embeddings = []
+            for crop in crops:
+                try:
+                    embeddings.append(self.embed_single_fn(self.model_name, crop))
+                except Exception:
+                    embeddings.append(None)
+            with self.lock:
+                self.fallback_calls += 1
+        observe_stage('embedding', time.monotonic() - forward_started, model=self.model_name)
+
+        for (_, _, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+        for _, _, future in batch[len(embeddings):]:
+            future.set_exception(RuntimeError(
+                f"{self.model_name} returned {len(embeddings)} embeddings for {len(batch)} faces"))
+
+    def _prepare(self, batch):
+        """(batch items, crops) ready to embed; face requests are aligned and enhanced into the buffer.
+
+        A request that cannot be prepared (empty frame, bad box) fails its
+        own future and is left out of the batch.
+        """
+        ready, crops = [], []
+        for item in batch:
+            _, request, future = item
+            try:
+                crop = self.buffer.fill_slot(len(crops), request) if isinstance(request, tuple) else request
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            ready.append(item)
+            crops.append(crop)
+        return ready, crops
+
+    def _record(self, size, waits_ms):
+        with self.lock:
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            for wait in waits_ms:
+                self.wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait)] += 1
+
+    def get_stats(self):
+        with self.lock:
+            labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            total_batches = sum(self.batch_sizes.values())
+            total_items = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                'model': self.model_name,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'pending': self.queue.qsize(),
+                'batches': total_batches,
+                'items': total_items,
+                'mean_batch_size': round(total_items / total_batches, 2) if total_batches else 0.0,
+                'batch_size_distribution': dict(sorted(self.batch_sizes.items())),
+                'wait_time_distribution': dict(zip(labels, self.wait_counts)),
+                'batched_calls': self.batched_calls,
+                'fallback_calls': self.fallback_calls,
+            }
+
+
+# One batcher per model
+batchers = {}
+batchers_lock = threading.Lock()
+
+def get_embedding_batcher(model_name='ArcFace'):
+    """Get or create the batcher for a model"""
+    with batchers_lock:
+        if model_name not in batchers:
+            batchers[model_name] = EmbeddingBatcher(model_name)
+        return batchers[model_name]
+
+def get_batcher_stats():
+    with batchers_lock:
+        return [batcher.get_stats() for batcher in batchers.values()]
@@ -0,0 +1,159 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE
+from snapshot_store import content_hash
+
+
+def image_hash(image):
+    """SHA-256 of an image file's bytes, or of an in-memory image's pixels"""
+    if isinstance(image, np.ndarray):
+        return content_hash(image)
+    digest = hashlib.sha256()
+    with open(image, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(model_name):
+    """Version tag for a model's weights; cached rows with another tag are stale"""
+    try:
+        from importlib.metadata import version
+        return f"deepface-{version('deepface')}"
+    except Exception:
+        return 'unknown'
+
+
+class EmbeddingCache:
+    """Embeddings of known images keyed by (content hash, model, detector, preprocessing).
+
+    An in-memory LRU sits in front of a SQLite blob store so the cache
+    survives restarts. Rows written under another model version are purged
+    the first time that model is used.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=EMBEDDING_CACHE_MEMORY_SIZE):
+        self.path = path
+        self.memory_size = memory_size
+        self.memory = OrderedDict()  # key -> float32 embedding
+        self.lock = threading.Lock()
+        self.versions = {}  # model -> version, once its stale rows are purged
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'invalidated': 0}
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                detector TEXT NOT NULL,
+                preprocessing TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, model, detector, preprocessing)
+            )
+        ''')
+        self.conn.commit()
+
+    def check_version(self, model_name):
+        """Purge the model's rows computed by a different version of it"""
+        if model_name in self.versions:
+            return
+        current = model_version(model_name)
+        with self.lock:
+            cursor = self.conn.execute('DELETE FROM embeddings WHERE model = ? AND model_version != ?',
+                                       (model_name, current))
+            self.conn.commit()
+            self.stats['invalidated'] += cursor.rowcount
+            for key in [key for key in self.memory if key[1] == model_name]:
+                del self.memory[key]
+            self.versions[model_name] = current
+
+    def get(self, digest, model_name, detector, preprocessing):
+        self.check_version(model_name)
+        key = (digest, model_name, detector, preprocessing)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self.memory[key]
+            row = self.conn.execute(
+                'SELECT embedding FROM embeddings WHERE content_hash = ? AND model = ? AND detector = ? '
+                'AND preprocessing = ?', key).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            embedding = np.frombuffer(row[0], dtype=np.float32)
+            self.stats['disk_hits'] += 1
+            self._remember(key, embedding)
+            return embedding
+
+    def put(self, digest, model_name, detector, preprocessing, embedding):
+        self.check_version(model_name)
+        key = (digest, model_name, detector, preprocessing)
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO embeddings (content_hash, model, detector, preprocessing, '
+                'model_version, dim, embedding) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                key + (self.versions[model_name], len(embedding), embedding.tobytes()))
+            self.conn.commit()
+            self.stats['writes'] += 1
+            self._remember(key, embedding)
+
+    def get_or_compute(self, image, model_name, detector, compute, preprocessing='deepface'):
+        """Cached embedding of an image (file path or array); compute() runs on a miss.
+
+        Failed computations (None) are not cached.
+        """
+        digest = image_hash(image)
+        embedding = self.get(digest, model_name, detector, preprocessing)
+        if embedding is None:
+            embedding = compute()
+            if embedding is not None:
+                self.put(digest, model_name, detector, preprocessing, embedding)
+        return embedding
+
+    def _remember(self, key, embedding):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM embeddings')
+            self.conn.commit()
+            self.memory.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            entries = self.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            return dict(self.stats,
+                        lookups=lookups,
+                        hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                        memory_entries=len(self.memory),
+                        disk_entries=entries,
+                        path=os.path.abspath(self.path))
+
+
+embedding_cache = None
+embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """Get the process-wide embedding cache"""
+    global embedding_cache
+    with embedding_cache_lock:
+        if embedding_cache is None:
+            embedding_cache = EmbeddingCache()
+        return embedding_cache
@@ -0,0 +1,222 @@
+import time
+import uuid
+import queue
+import threading
+
+import numpy as np
+
+from config import (ENROLLMENT_JOB_MAX_ATTEMPTS, ENROLLMENT_JOB_RETRY_DELAY, ENROLLMENT_JOB_HISTORY,
+                    ENROLLMENT_EMBEDDING_MODEL, EMBEDDING_TIMEOUT)
+from event_bus import publish_event
+
+STAGES = ['saving_images', 'embedding', 'templates', 'gallery', 'activating']
+
+
+class EnrollmentJob:
+    """Finalization of one identity's captured poses"""
+
+    def __init__(self, name, captured_images, session_id=None, on_success=None):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.captured_images = captured_images  # pose -> [face crops]; dropped once the job succeeds
+        self.session_id = session_id
+        self.on_success = on_success
+        self.status = 'queued'
+        self.stage = None
+        self.progress = 0.0
+        self.attempts = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Results carried across retries so finished stages are not redone
+        self.embeddings = None
+        self.template = None
+        self.gallery_written = False
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'session_id': self.session_id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def finalize_enrollment(job, report):
+    """Process only the new identity: save crops, embed, build its template, append to the gallery.
+
+    `report(stage, fraction)` is called as work progresses. The live
+    recognizers, when already loaded, take the identity incrementally
+    instead of reloading the gallery.
+    """
+    from production_enrollment import ProductionEnrollment
+    from embedding_batcher import get_embedding_batcher
+    from face_templates import build_template
+    from gallery import gallery_lock, load_gallery, save_gallery
+    import perfect_recognizer
+    import simple_recognition
+
+    crops = [crop for images in job.captured_images.values() for crop in images]
+
+    report('saving_images', 0.0)
+    ProductionEnrollment().save_face_images(job.name, job.captured_images)
+
+    if job.embeddings is None:
+        report('embedding', 0.0)
+        batcher = get_embedding_batcher(ENROLLMENT_EMBEDDING_MODEL)
+        # Stored crops are already cut around the face; align the whole crop to the model input
+        futures = [batcher.submit_face(crop, (0, 0, crop.shape[1], crop.shape[0])) for crop in crops]
+        embeddings = []
+        deadline = time.monotonic() + EMBEDDING_TIMEOUT
+        for i, future in enumerate(futures):
+            try:
+                embedding = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                raise RuntimeError("Timed out waiting for face embeddings")
+            except Exception:
+                embedding = None  # an unusable pose is skipped like one without a face
+            if embedding is not None:
+                embeddings.append(np.asarray(embedding, dtype=np.float32))
+            report('embedding', (i + 1) / len(futures))
+        if not embeddings:
+            raise RuntimeError("No usable face embeddings in the captured poses")
+        job.embeddings = embeddings
+
+    if not job.gallery_written:
+        with gallery_lock:
+            report('templates', 0.0)
+            data = load_gallery()
+            # Re-enrolling an existing name extends its template rather than replacing it
+            existing = [np.asarray(e, dtype=np.float32) for e, n in zip(data['encodings'], data['names'])
+                        if n == job.name and not isinstance(e, str)]
+            job.template = build_template(existing + job.embeddings)
+
+            report('gallery', 0.0)
+            data['encodings'].extend(job.embeddings)
+            data['names'].extend([job.name] * len(job.embeddings))
+            job.template['entries'] = data['names'].count(job.name)
+            data.setdefault('templates', {})[job.name] = job.template
+            save_gallery(data)
+        job.gallery_written = True
+
+    report('activating', 0.0)
+    if perfect_recognizer.perfect_recognizer is not None:
+        perfect_recognizer.perfect_recognizer.add_identity(job.name, job.embeddings, job.template)
+    if simple_recognition.simple_recognition is not None:
+        simple_recognition.simple_recognition.register_identity(job.name, job.embeddings)
+
+
+class EnrollmentJobQueue:
+    """Background worker that finalizes enrollments one at a time.
+
+    Jobs are serialized so gallery writes never interleave. A failed job is
+    retried with exponential backoff up to `max_attempts`; after that it stays
+    failed (with its crops) until retried by hand or pushed out of history.
+    Progress is published on the event bus as 'enrollment_job' events.
+    """
+
+    def __init__(self, process_fn=finalize_enrollment, max_attempts=ENROLLMENT_JOB_MAX_ATTEMPTS,
+                 retry_delay=ENROLLMENT_JOB_RETRY_DELAY, history=ENROLLMENT_JOB_HISTORY):
+        self.process_fn = process_fn
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.history = history
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def submit(self, name, captured_images, session_id=None, on_success=None):
+        job = EnrollmentJob(name, captured_images, session_id, on_success)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self._trim_locked()
+            self._ensure_worker_locked()
+        self._publish(job)
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def retry(self, job_id):
+        """Requeue a failed job; returns it, or None if it is unknown or not failed"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'failed':
+                return None
+            job.status = 'queued'
+            job.error = None
+            job.attempts = 0
+            self._ensure_worker_locked()
+        self._publish(job)
+        self.queue.put(job)
+        return job
+
+    def _ensure_worker_locked(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._worker_loop, name='enrollment-jobs', daemon=True)
+            self.worker.start()
+
+    def _trim_locked(self):
+        finished = [job for job in self.jobs.values() if job.status in ('succeeded', 'failed')]
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(0, len(finished) - self.history)]:
+            del self.jobs[job.job_id]
+
+    def _worker_loop(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            job.attempts += 1
+            job.error = None
+
+            def report(stage, fraction, job=job):
+                job.stage = stage
+                job.progress = (STAGES.index(stage) + fraction) / len(STAGES)
+                self._publish(job)
+
+            try:
+                self.process_fn(job, report)
+            except Exception as e:
+                job.error = str(e)
+                print(f"❌ Enrollment job for {job.name} failed (attempt {job.attempts}): {e}")
+                if job.attempts < self.max_attempts:
+                    job.status = 'retrying'
+                    self._publish(job)
+                    delay = self.retry_delay * 2 ** (job.attempts - 1)
+                    threading.Timer(delay, self.queue.put, args=(job,)).start()
+                else:
+                    job.status = 'failed'
+                    job.finished_at = time.time()
+                    self._publish(job)
+                continue
+
+            job.status = 'succeeded'
+            job.progress = 1.0
+            job.finished_at = time.time()
+            job.captured_images = {}
+            print(f"✅ Enrollment job for {job.name} finished")
+            self._publish(job)
+            if job.on_success is not None:
+                try:
+                    job.on_success(job)
+                except Exception as e:
+                    print(f"⚠️ Enrollment job callback failed: {e}")
+
+    def _publish(self, job):
+        publish_event('enrollment_job', job.to_dict())
+
+
+# Global enrollment job queue (worker thread starts with the first job)
+enrollment_jobs = EnrollmentJobQueue()
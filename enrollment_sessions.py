@@ -0,0 +1,118 @@
+import time
+import uuid
+import threading
+
+from production_enrollment import ProductionEnrollment
+from config import ENROLLMENT_SESSION_TTL
+from enrollment_jobs import enrollment_jobs
+
+
+class EnrollmentSession:
+    """One person's multi-pose enrollment, with its own pose state machine"""
+
+    def __init__(self, name, camera_id=None):
+        self.session_id = uuid.uuid4().hex
+        self.name = name
+        self.camera_id = camera_id
+        self.enrollment = ProductionEnrollment()
+        self.captured_images = {}  # pose -> [face crops], held in memory until finished
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self.lock = threading.Lock()
+
+    @property
+    def current_pose(self):
+        return self.enrollment.enrollment_poses[self.enrollment.current_pose_index]
+
+    @property
+    def pose_index(self):
+        return self.enrollment.current_pose_index
+
+    @property
+    def total_poses(self):
+        return len(self.enrollment.enrollment_poses)
+
+    @property
+    def complete(self):
+        return self.enrollment.current_pose_index >= self.total_poses
+
+    def instructions(self):
+        return self.enrollment.get_pose_instructions()
+
+    def add_capture(self, face_img):
+        """Store a crop for the current pose and advance; returns the captured pose"""
+        pose = self.current_pose
+        self.captured_images.setdefault(pose, []).append(face_img)
+        self.enrollment.current_pose_index += 1
+        self.last_active = time.time()
+        return pose
+
+    def finish(self, on_success=None):
+        """Hand the captured poses to a background job; returns the job"""
+        return enrollment_jobs.submit(self.name, self.captured_images, session_id=self.session_id,
+                                      on_success=on_success)
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'name': self.name,
+            'camera_id': self.camera_id,
+            'pose_index': self.pose_index,
+            'total_poses': self.total_poses,
+            'complete': self.complete,
+            'age': round(time.time() - self.created_at, 1),
+        }
+
+
+class EnrollmentSessionManager:
+    """Registry of concurrent enrollment sessions keyed by session ID.
+
+    Sessions idle for longer than the TTL are dropped (with their in-memory
+    crops) on the next access.
+    """
+
+    def __init__(self, ttl=ENROLLMENT_SESSION_TTL):
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def create(self, name, camera_id=None):
+        session = EnrollmentSession(name, camera_id)
+        with self.lock:
+            self._sweep_locked()
+            self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            self._sweep_locked()
+            session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_active = time.time()
+        return session
+
+    def remove(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None)
+
+    def sweep(self):
+        """Drop expired sessions; returns how many were removed"""
+        with self.lock:
+            return self._sweep_locked()
+
+    def _sweep_locked(self):
+        now = time.time()
+        expired = [sid for sid, session in self.sessions.items() if now - session.last_active > self.ttl]
+        for sid in expired:
+            print(f"⌛ Enrollment session for {self.sessions[sid].name} expired")
+            del self.sessions[sid]
+        return len(expired)
+
+    def list_sessions(self):
+        with self.lock:
+            self._sweep_locked()
+            return [session.to_dict() for session in self.sessions.values()]
+
+
+# Global session manager
+enrollment_sessions = EnrollmentSessionManager()
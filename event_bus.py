@@ -0,0 +1,98 @@
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+from config import EVENT_REPLAY_SIZE, EVENT_HEARTBEAT_INTERVAL
+
+
+class EventBus:
+    """In-process publish/subscribe bus for dashboard events.
+
+    Every event gets a monotonically increasing id and is kept in a small
+    replay buffer, so a reconnecting client can send Last-Event-ID and
+    receive what it missed. Subscribers block on their own queue, so an
+    idle client costs nothing until something is published.
+    """
+
+    def __init__(self, replay_size=EVENT_REPLAY_SIZE, subscriber_queue_size=100):
+        self.replay = deque(maxlen=replay_size)
+        self.subscribers = set()
+        self.subscriber_queue_size = subscriber_queue_size
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def publish(self, event_type, data=None):
+        """Publish an event to every subscriber"""
+        with self.lock:
+            event = {
+                'id': self.next_id,
+                'type': event_type,
+                'time': time.time(),
+                'data': data or {}
+            }
+            self.next_id += 1
+            self.replay.append(event)
+            subscribers = list(self.subscribers)
+
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client - drop its oldest event rather than block the publisher
+                try:
+                    q.get_nowait()
+                    q.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber queue, pre-filled with missed events"""
+        q = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self.lock:
+            if last_event_id is not None:
+                for event in self.replay:
+                    if event['id'] > last_event_id:
+                        q.put_nowait(event)
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def stream(self, last_event_id=None, heartbeat_interval=EVENT_HEARTBEAT_INTERVAL):
+        """Generator of Server-Sent Events frames for one client"""
+        q = self.subscribe(last_event_id)
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=heartbeat_interval)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            self.unsubscribe(q)
+
+
+def format_sse(event):
+    """Serialize an event as an SSE frame"""
+    payload = json.dumps({'type': event['type'], 'time': event['time'], 'data': event['data']})
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+# Global event bus
+event_bus = EventBus()
+
+def publish_event(event_type, data=None):
+    """Global function to publish a dashboard event"""
+    return event_bus.publish(event_type, data)
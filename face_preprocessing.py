@@ -0,0 +1,152 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Bump when alignment/enhancement output changes - cached embeddings are keyed by it
+PREPROCESSING_VERSION = 2
+
+# Input sizes (h, w) of the DeepFace embedding models used here
+MODEL_INPUT_SIZES = {
+    'ArcFace': (112, 112),
+    'SFace': (112, 112),
+    'Facenet': (160, 160),
+    'Facenet512': (160, 160),
+    'Dlib': (150, 150),
+    'VGG-Face': (224, 224),
+}
+
+# Standard 5-point template for a 112x112 aligned face (ArcFace/InsightFace):
+# image-left eye, image-right eye, nose tip, image-left mouth corner, image-right mouth corner
+REFERENCE_LANDMARKS = np.float32([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+])
+
+# Shared read-only sharpening kernel
+SHARPEN_KERNEL = np.float32([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+
+# Per-thread CLAHE object and scratch buffers (OpenCV objects are not shared across threads)
+local = threading.local()
+
+
+def get_clahe():
+    clahe = getattr(local, 'clahe', None)
+    if clahe is None:
+        clahe = local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def scratch(name, shape, dtype=np.uint8):
+    """This thread's reusable buffer for `name`, reallocated only when the shape changes"""
+    buffers = getattr(local, 'buffers', None)
+    if buffers is None:
+        buffers = local.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def model_input_size(model_name):
+    """(h, w) the model expects; unknown models get ArcFace's size"""
+    return MODEL_INPUT_SIZES.get(model_name, (112, 112))
+
+
+def enhance_face_quality(face_img, out=None):
+    """Enhance face image quality for better recognition.
+
+    CLAHE on the LAB lightness channel, then a light sharpen. Intermediate
+    images live in per-thread scratch buffers; pass `out` (same shape as
+    the input, may be the input itself) to avoid allocating the result.
+    """
+    try:
+        h, w = face_img.shape[:2]
+        lab = scratch('lab', (h, w, 3))
+        lightness = scratch('lightness', (h, w))
+        equalized = scratch('equalized', (h, w))
+        enhanced = scratch('enhanced', (h, w, 3))
+
+        # Apply CLAHE to the L channel for better contrast
+        cv2.cvtColor(face_img, cv2.COLOR_BGR2LAB, dst=lab)
+        cv2.extractChannel(lab, 0, dst=lightness)
+        get_clahe().apply(lightness, dst=equalized)
+        cv2.insertChannel(equalized, lab, 0)
+        cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=enhanced)
+
+        # Apply slight sharpening
+        if out is None:
+            out = np.empty_like(face_img)
+        cv2.filter2D(enhanced, -1, SHARPEN_KERNEL, dst=out)
+        return out
+    except cv2.error:
+        return face_img
+
+
+def alignment_matrix(bbox, landmarks, size):
+    """2x3 similarity transform taking a detected face to an upright (h, w) crop.
+
+    With landmarks (5 points, or just the two eyes) the face is aligned to
+    the reference template; otherwise the square around the box is scaled
+    to fill the output.
+    """
+    out_h, out_w = size
+    if landmarks is not None:
+        points = np.asarray(landmarks, dtype=np.float32).reshape(-1, 2)
+        if len(points) == 2:
+            points = points[np.argsort(points[:, 0])]  # eyes: image-left first, whatever the detector's convention
+        reference = REFERENCE_LANDMARKS[:len(points)] * np.float32([out_w / 112.0, out_h / 112.0])
+        if len(points) >= 2:
+            matrix, _ = cv2.estimateAffinePartial2D(points, reference, method=cv2.LMEDS)
+            if matrix is not None:
+                return matrix
+
+    x1, y1, x2, y2 = [float(v) for v in bbox]
+    side = max(x2 - x1, y2 - y1, 1.0)
+    scale = min(out_w, out_h) / side
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    return np.float64([[scale, 0, out_w / 2 - scale * cx],
+                       [0, scale, out_h / 2 - scale * cy]])
+
+
+def align_face(frame, bbox, landmarks=None, size=(112, 112), out=None):
+    """Warp a face straight to `size` (h, w); writes into `out` when given"""
+    out_h, out_w = size
+    if out is None:
+        out = np.empty((out_h, out_w, 3), dtype=np.uint8)
+    cv2.warpAffine(frame, alignment_matrix(bbox, landmarks, size), (out_w, out_h), dst=out,
+                   flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return out
+
+
+class FaceBatchBuffer:
+    """Preallocated model-input batch for one embedding model.
+
+    fill() aligns and enhances each face straight into its slot, so
+    nothing is allocated per face. Owned by a single thread (the model's
+    batcher).
+    """
+
+    def __init__(self, model_name, max_batch):
+        self.model_name = model_name
+        self.size = model_input_size(model_name)
+        h, w = self.size
+        self.faces = np.empty((max_batch, h, w, 3), dtype=np.uint8)
+
+    def fill(self, requests):
+        """Prepare (frame, bbox, landmarks, enhance) requests; returns a view of the uint8 faces"""
+        for slot, request in enumerate(requests):
+            self.fill_slot(slot, request)
+        return self.faces[:len(requests)]
+
+    def fill_slot(self, slot, request):
+        """Align and enhance one request into a slot; returns the slot's face view"""
+        frame, bbox, landmarks, enhance = request
+        face = self.faces[slot]
+        align_face(frame, bbox, landmarks, self.size, out=face)
+        if enhance:
+            enhance_face_quality(face, out=face)
+        return face
@@ -0,0 +1,193 @@
+import numpy as np
+
+from config import GALLERY_STORAGE, TEMPLATE_MEDOIDS, TEMPLATE_RERANK_MARGIN
+from quantization import QuantizedMatrix
+
+TEMPLATE_VERSION = 1
+
+
+def _unit(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def select_medoids(embeddings, k=TEMPLATE_MEDOIDS, iterations=5):
+    """Indices of k medoids under cosine distance (farthest-point seeding + Voronoi refinement)"""
+    n = len(embeddings)
+    if n <= k:
+        return list(range(n))
+
+    unit = _unit(embeddings)
+    distances = 1.0 - unit @ unit.T
+
+    # Seed with the most central embedding, then repeatedly add the one farthest from the chosen set
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(distances[:, medoids].min(axis=1))))
+
+    for _ in range(iterations):
+        assignment = np.argmin(distances[:, medoids], axis=1)
+        updated = []
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                updated.append(medoids[cluster])
+                continue
+            within = distances[np.ix_(members, members)].sum(axis=1)
+            updated.append(int(members[np.argmin(within)]))
+        if updated == medoids:
+            break
+        medoids = updated
+    return medoids
+
+
+def build_template(embeddings, k=TEMPLATE_MEDOIDS):
+    """Collapse one identity's embeddings into a mean, k medoids and the intra-class spread"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    mean = matrix.mean(axis=0)
+    medoids = matrix[select_medoids(matrix, k)]
+
+    # Spread: cosine distance of each image to the identity mean
+    spread = 1.0 - _unit(matrix) @ _unit(mean)
+    return {
+        'version': TEMPLATE_VERSION,
+        'count': len(matrix),
+        'mean': mean,
+        'medoids': medoids,
+        'spread_mean': float(spread.mean()),
+        'spread_max': float(spread.max()),
+    }
+
+
+def build_templates(encodings, names, k=TEMPLATE_MEDOIDS):
+    """Templates for every identity with at least one numeric embedding"""
+    grouped = {}
+    for encoding, name in zip(encodings, names):
+        if encoding is None or isinstance(encoding, str):
+            continue
+        grouped.setdefault(name, []).append(np.asarray(encoding, dtype=np.float32))
+
+    templates = {}
+    for name, embeddings in grouped.items():
+        # Embeddings of different sizes (mixed models) cannot be averaged together
+        dim = max({len(e) for e in embeddings}, key=lambda d: sum(len(e) == d for e in embeddings))
+        templates[name] = build_template([e for e in embeddings if len(e) == dim], k)
+    return templates
+
+
+def similarity(query, matrix):
+    """Recognizer confidence of a query against each row: 0.7 cosine + 0.3 inverse euclidean"""
+    cosine_sim = _unit(matrix) @ _unit(query)
+    euclidean_sim = 1.0 / (1.0 + np.linalg.norm(matrix - query, axis=1))
+    return 0.7 * cosine_sim + 0.3 * euclidean_sim
+
+
+class TemplateIndex:
+    """Matches queries against per-identity templates instead of every image.
+
+    Representatives (mean + medoids) of all identities are stacked into one
+    matrix per embedding size, so a query costs O(identities x k). When the
+    two best identities are within `rerank_margin`, both are rescored
+    against their full image embeddings. Both are held in `storage`
+    (float32, float16 or int8) and scored with the query in float32.
+    """
+
+    def __init__(self, templates, full_embeddings=None, rerank_margin=TEMPLATE_RERANK_MARGIN,
+                 storage=GALLERY_STORAGE):
+        self.templates = templates
+        self.storage = storage
+        self.rerank_margin = rerank_margin
+        self.reranks = 0
+        self.queries = 0
+
+        # Per embedding size: stacked representatives, identity names and each identity's first row
+        grouped = {}
+        for name, template in templates.items():
+            reps = [template['mean']] + list(template['medoids'])
+            rows, owners, starts = grouped.setdefault(len(reps[0]), ([], [], []))
+            starts.append(len(rows))
+            rows.extend(np.asarray(rep, dtype=np.float32) for rep in reps)
+            owners.append(name)
+        self.matrices = {}
+        for dim, (rows, owners, starts) in grouped.items():
+            matrix = QuantizedMatrix(np.vstack(rows), storage)
+            self.matrices[dim] = (matrix, matrix.squared_norms(), owners, np.array(starts))
+
+        # Per identity and embedding size: every stored image, for reranks
+        self.full_embeddings = {}
+        for name, embeddings in (full_embeddings or {}).items():
+            by_dim = {}
+            for embedding in embeddings:
+                embedding = np.asarray(embedding, dtype=np.float32)
+                by_dim.setdefault(len(embedding), []).append(embedding)
+            self.full_embeddings[name] = {dim: QuantizedMatrix(np.vstack(rows), storage)
+                                          for dim, rows in by_dim.items()}
+
+    def __len__(self):
+        return len(self.templates)
+
+    def match(self, query):
+        """Return (name, confidence) of the best identity, or (None, 0.0)"""
+        query = np.asarray(query, dtype=np.float32)
+        ranked = self.top_k(query, 2)
+        if not ranked:
+            return None, 0.0
+
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.rerank_margin:
+            ranked = self.rerank(query, [name for name, _ in ranked]) or ranked
+        return ranked[0]
+
+    def match_checked(self, query):
+        """match() plus the partial flag of a sharded search - the whole gallery is always searched here"""
+        name, confidence = self.match(query)
+        return name, confidence, False
+
+    def top_k(self, query, k):
+        """[(name, score), ...] of the k best identities by representative score, best first"""
+        query = np.asarray(query, dtype=np.float32)
+        entry = self.matrices.get(len(query))
+        if entry is None:
+            return []
+        matrix, squared_norms, owners, starts = entry
+        self.queries += 1
+
+        # Same score as similarity(), from precomputed row norms: one matrix-vector product per query
+        dots = matrix.dot(query)
+        query_sq = float(query @ query)
+        cosine_sim = dots / np.maximum(np.sqrt(squared_norms * query_sq), 1e-12)
+        euclidean = np.sqrt(np.maximum(squared_norms + query_sq - 2.0 * dots, 0.0))
+        scores = 0.7 * cosine_sim + 0.3 / (1.0 + euclidean)
+
+        # Best representative per identity, then the top k identities
+        scores = np.maximum.reduceat(scores, starts)
+        if k < len(scores):
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(scores[top])[::-1]]
+        else:
+            top = np.argsort(scores)[::-1]
+        return [(owners[i], float(scores[i])) for i in top]
+
+    def rerank(self, query, candidates):
+        """Rescore close candidates against all of their stored embeddings"""
+        rescored = []
+        for name in candidates:
+            embeddings = self.full_embeddings.get(name, {}).get(len(query))
+            if embeddings is None:
+                return None
+            rescored.append((name, float(similarity(query, embeddings.dequantize()).max())))
+        self.reranks += 1
+        return sorted(rescored, key=lambda kv: kv[1], reverse=True)
+
+    def get_stats(self):
+        representatives = sum(len(entry[0]) for entry in self.matrices.values())
+        images = sum(template['count'] for template in self.templates.values())
+        full_bytes = sum(m.nbytes for by_dim in self.full_embeddings.values() for m in by_dim.values())
+        return {
+            'identities': len(self.templates),
+            'storage': self.storage,
+            'index_bytes': sum(entry[0].nbytes for entry in self.matrices.values()) + full_bytes,
+            'representatives': representatives,
+            'images': images,
+            'queries': self.queries,
+            'reranks': self.reranks,
+        }
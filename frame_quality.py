@@ -0,0 +1,196 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from boxes import largest
+from config import (AUTO_CAPTURE_WINDOW, AUTO_CAPTURE_MIN_SCORE, AUTO_CAPTURE_MIN_FACE,
+                    AUTO_CAPTURE_YAW_THRESHOLD, AUTO_CAPTURE_PITCH_THRESHOLD)
+
+# MediaPipe FaceMesh landmark indices
+NOSE_TIP = 1
+FOREHEAD = 10
+CHIN = 152
+EYE_OUTER_RIGHT = 33   # subject's right eye (image left)
+EYE_OUTER_LEFT = 263   # subject's left eye (image right)
+
+# FaceMesh graphs and cascades are not safe to share between threads (web
+# enrollment sessions score frames concurrently) - one of each per thread
+_local = threading.local()
+
+
+def _get_face_mesh():
+    """This thread's MediaPipe FaceMesh if installed, else None (falls back to eye cascade)"""
+    face_mesh = getattr(_local, 'face_mesh', None)
+    if face_mesh is None:
+        try:
+            import mediapipe as mp
+            face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1)
+        except Exception:
+            face_mesh = False
+        _local.face_mesh = face_mesh
+    return face_mesh or None
+
+
+def _get_eye_cascade():
+    eye_cascade = getattr(_local, 'eye_cascade', None)
+    if eye_cascade is None:
+        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        _local.eye_cascade = eye_cascade
+    return eye_cascade
+
+
+def estimate_head_pose(face_img):
+    """Rough (yaw, pitch) of a face crop, both roughly in [-1, 1].
+
+    Positive yaw means the subject turned to their LEFT (nose towards the
+    image's right, camera not mirrored); positive pitch means head tilted UP.
+    Returns None when no landmarks can be found.
+    """
+    mesh = _get_face_mesh()
+    if mesh is not None:
+        result = mesh.process(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB))
+        if result.multi_face_landmarks:
+            points = result.multi_face_landmarks[0].landmark
+            nose = points[NOSE_TIP]
+            eye_r, eye_l = points[EYE_OUTER_RIGHT], points[EYE_OUTER_LEFT]
+            eye_mid_x = (eye_r.x + eye_l.x) / 2
+            eye_dist = max(abs(eye_l.x - eye_r.x), 1e-6)
+            yaw = (nose.x - eye_mid_x) / eye_dist * 2
+            # Nose sits about halfway between forehead and chin when level
+            face_h = max(points[CHIN].y - points[FOREHEAD].y, 1e-6)
+            pitch = (0.5 - (nose.y - points[FOREHEAD].y) / face_h) * 4
+            return float(np.clip(yaw, -1, 1)), float(np.clip(pitch, -1, 1))
+
+    # Fallback: eye positions from the Haar eye cascade
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    eyes = _get_eye_cascade().detectMultiScale(gray[:h // 2], scaleFactor=1.1, minNeighbors=5)
+    if len(eyes) < 2:
+        return None
+    eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+    centers = [(x + ew / 2, y + eh / 2) for x, y, ew, eh in eyes]
+    eye_mid_x = (centers[0][0] + centers[1][0]) / 2
+    eye_mid_y = (centers[0][1] + centers[1][1]) / 2
+    # Eyes drift towards the side the head turns to; they sit ~0.38h down when level
+    yaw = (eye_mid_x / w - 0.5) * 4
+    pitch = (0.38 - eye_mid_y / h) * 5
+    return float(np.clip(yaw, -1, 1)), float(np.clip(pitch, -1, 1))
+
+
+def classify_pose(yaw, pitch, yaw_threshold=AUTO_CAPTURE_YAW_THRESHOLD,
+                  pitch_threshold=AUTO_CAPTURE_PITCH_THRESHOLD):
+    """Map (yaw, pitch) to one of the enrollment poses"""
+    if abs(yaw) >= yaw_threshold and abs(yaw) >= abs(pitch):
+        return 'left' if yaw > 0 else 'right'
+    if abs(pitch) >= pitch_threshold:
+        return 'up' if pitch > 0 else 'down'
+    return 'straight'
+
+
+def score_face(frame, bbox, target_pose=None):
+    """Cheap quality score for one detected face.
+
+    Combines sharpness (Laplacian variance), face size, brightness and,
+    when a target pose is given, whether the head pose matches it.
+    Returns a dict of components plus 'score' in [0, 1].
+    """
+    x1, y1, x2, y2 = [int(v) for v in bbox]
+    face = frame[max(0, y1):y2, max(0, x1):x2]
+    if face.size == 0:
+        return {'score': 0.0}
+
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    sharpness_score = min(1.0, sharpness / 300.0)
+
+    face_width = x2 - x1
+    size_score = min(1.0, face_width / float(AUTO_CAPTURE_MIN_FACE * 2))
+    if face_width < AUTO_CAPTURE_MIN_FACE:
+        size_score *= 0.5
+
+    brightness = float(gray.mean())
+    brightness_score = max(0.0, 1.0 - abs(brightness - 128.0) / 128.0)
+
+    head_pose = estimate_head_pose(face)
+    if head_pose is None:
+        # Pose unknown - trust the on-screen instruction, but prefer confirmed poses
+        yaw = pitch = None
+        pose = None
+        pose_score = 0.75
+    else:
+        yaw, pitch = head_pose
+        pose = classify_pose(yaw, pitch)
+        pose_score = 1.0 if target_pose is None or pose == target_pose else 0.0
+
+    score = pose_score * (0.5 * sharpness_score + 0.3 * size_score + 0.2 * brightness_score)
+    return {
+        'score': round(float(score), 3),
+        'sharpness': round(float(sharpness), 1),
+        'face_width': int(face_width),
+        'brightness': round(brightness, 1),
+        'yaw': round(yaw, 2) if yaw is not None else None,
+        'pitch': round(pitch, 2) if pitch is not None else None,
+        'pose': pose,
+    }
+
+
+class AutoCapture:
+    """Keeps the best frame per pose from a short rolling window.
+
+    Feed every frame with its detected faces. Once a frame scores above the
+    minimum for the current pose, the window opens; when it closes, the best
+    crop seen is kept and the pose advances automatically.
+    """
+
+    def __init__(self, poses, window=AUTO_CAPTURE_WINDOW, min_score=AUTO_CAPTURE_MIN_SCORE):
+        self.poses = list(poses)
+        self.window = window
+        self.min_score = min_score
+        self.pose_index = 0
+        self.best = None  # (score, crop, details)
+        self.window_started = None
+        self.captured = {}
+
+    @property
+    def current_pose(self):
+        return self.poses[self.pose_index] if self.pose_index < len(self.poses) else None
+
+    @property
+    def complete(self):
+        return self.pose_index >= len(self.poses)
+
+    def skip_pose(self):
+        """Give up on the current pose without a capture and move to the next"""
+        if not self.complete:
+            self.pose_index += 1
+        self.best = None
+        self.window_started = None
+
+    def feed(self, frame, faces, crop_fn):
+        """Score a frame; returns the pose name when that pose was just captured"""
+        if self.complete or not faces:
+            return None
+
+        # The largest face is the person enrolling
+        bbox = largest(faces)
+        details = score_face(frame, bbox, self.current_pose)
+        now = time.monotonic()
+
+        if details['score'] >= self.min_score:
+            if self.window_started is None:
+                self.window_started = now
+            if self.best is None or details['score'] > self.best[0]:
+                crop = crop_fn(frame, bbox)
+                if crop is not None:
+                    self.best = (details['score'], crop.copy(), details)
+
+        if self.window_started is not None and now - self.window_started >= self.window and self.best:
+            pose = self.current_pose
+            self.captured[pose] = [self.best[1]]
+            self.pose_index += 1
+            self.best = None
+            self.window_started = None
+            return pose
+        return None
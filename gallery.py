@@ -0,0 +1,116 @@
+import os
+import pickle
+import threading
+
+from cryptography.fernet import Fernet
+
+from config import AUTHORIZED_FACES_FILE, GALLERY_STORAGE
+from quantization import pack_encodings
+from utils import encrypt_data, load_encryption_key
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: writers are serialized within the process only
+
+
+class GalleryLock:
+    """Serializes read-modify-write cycles on the encrypted gallery.
+
+    A thread lock covers the web app's own threads; an exclusive flock on a
+    sidecar file covers other processes (bulk_import, enrollment scripts)
+    writing the same gallery.
+    """
+
+    def __init__(self, path=f"{AUTHORIZED_FACES_FILE}.lock"):
+        self.path = path
+        self.thread_lock = threading.Lock()
+        self.lock_file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self.lock_file = open(self.path, 'a')
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            except BaseException:
+                if self.lock_file is not None:
+                    self.lock_file.close()
+                    self.lock_file = None
+                self.thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+        self.thread_lock.release()
+
+
+gallery_lock = GalleryLock()
+
+
+def load_gallery(path=AUTHORIZED_FACES_FILE):
+    """Load the gallery as a dict with at least 'encodings' and 'names'.
+
+    Older galleries stored an (encodings, names) tuple; they are upgraded
+    in memory. Extra keys (e.g. templates) are preserved.
+    """
+    if not os.path.exists(path):
+        return {'encodings': [], 'names': []}
+
+    fernet = Fernet(load_encryption_key())
+    with open(path, 'rb') as f:
+        data = pickle.loads(fernet.decrypt(f.read()))
+
+    if isinstance(data, dict):
+        data.setdefault('encodings', [])
+        data.setdefault('names', [])
+        return data
+    encodings, names = data
+    return {'encodings': list(encodings), 'names': list(names)}
+
+
+def save_gallery(data, path=AUTHORIZED_FACES_FILE, storage=GALLERY_STORAGE):
+    """Atomically write the encrypted gallery, numeric encodings packed in `storage`"""
+    data = dict(data, encodings=pack_encodings(data['encodings'], storage))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encrypt_data(data))
+    os.replace(tmp_path, path)
+
+
+def append_to_gallery(encodings, names, path=AUTHORIZED_FACES_FILE):
+    """Append entries to the gallery; returns the new entry count"""
+    with gallery_lock:
+        data = load_gallery(path)
+        data['encodings'].extend(encodings)
+        data['names'].extend(names)
+        save_gallery(data, path)
+        return len(data['names'])
+
+
+def save_templates(templates, path=AUTHORIZED_FACES_FILE):
+    """Store (or replace) identity templates in the gallery"""
+    with gallery_lock:
+        data = load_gallery(path)
+        if not data['names']:
+            return
+        data.setdefault('templates', {}).update(templates)
+        save_gallery(data, path)
+
+
+def remove_from_gallery(name, path=AUTHORIZED_FACES_FILE):
+    """Remove every entry and the template of `name`; returns the number of entries removed"""
+    with gallery_lock:
+        data = load_gallery(path)
+        keep = [i for i, n in enumerate(data['names']) if n != name]
+        removed = len(data['names']) - len(keep)
+        had_template = data.get('templates', {}).pop(name, None) is not None
+        if removed or had_template:
+            data['encodings'] = [data['encodings'][i] for i in keep]
+            data['names'] = [data['names'][i] for i in keep]
+            save_gallery(data, path)
+        return removed
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Sharded gallery with scatter-gather search.
+
+Identities are spread over N shard worker processes by a consistent-hash
+ring, so no single process holds the whole gallery. Each shard serves its
+TemplateIndex over a multiprocessing.connection socket (local processes
+stand in for remote nodes - the protocol only needs an address and an
+authkey). Workers start as `python gallery_shards.py serve`, so they
+never re-import the web app, and exit when their coordinator goes away.
+A query is sent to every shard in parallel and the per-shard top-k lists
+are merged; shards that miss the deadline or have died are reported and
+the merge goes ahead with the rest, flagged as partial.
+
+Adding a shard moves only the identities the ring reassigns to it.
+
+Demo (synthetic gallery: latency, partial results, rebalancing):
+    python gallery_shards.py demo --shards 4 --identities 20000
+"""
+import os
+import sys
+import time
+import atexit
+import heapq
+import bisect
+import hashlib
+import secrets
+import argparse
+import threading
+import itertools
+import subprocess
+from multiprocessing.connection import Client, Listener
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from config import (GALLERY_SHARD_TIMEOUT, GALLERY_SHARD_VNODES, GALLERY_STORAGE, TEMPLATE_RERANK_MARGIN)
+
+# Identities per load/migrate message, so no single message holds a whole shard
+TRANSFER_CHUNK = 1000
+
+
+class HashRing:
+    """Consistent hashing of identity names onto shard ids"""
+
+    def __init__(self, shard_ids=(), vnodes=GALLERY_SHARD_VNODES):
+        self.vnodes = vnodes
+        self.points = []  # sorted (hash, shard id)
+        for shard_id in shard_ids:
+            self.add(shard_id)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, shard_id):
+        for v in range(self.vnodes):
+            bisect.insort(self.points, (self.hash(f"shard-{shard_id}#{v}"), shard_id))
+
+    def shard_for(self, name):
+        index = bisect.bisect(self.points, (self.hash(name), -1)) % len(self.points)
+        return self.points[index][1]
+
+
+# Shard worker (runs in its own process)
+
+class ShardState:
+    """One shard's identities; the TemplateIndex is rebuilt lazily after changes"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.templates = {}
+        self.full_embeddings = {}
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get_index(self):
+        from face_templates import TemplateIndex
+        if self.index is None:
+            # Reranks are coordinated across shards, so the shard never reranks on its own
+            self.index = TemplateIndex(self.templates, self.full_embeddings, rerank_margin=-1.0,
+                                       storage=self.storage)
+        return self.index
+
+    def handle(self, command, payload):
+        with self.lock:
+            if command == 'search':
+                query, k = payload
+                return self.get_index().top_k(query, k)
+            if command == 'rerank':
+                query, names = payload
+                return self.get_index().rerank(query, names)
+            if command == 'add':
+                templates, full_embeddings = payload
+                self.templates.update(templates)
+                self.full_embeddings.update(full_embeddings)
+                self.index = None
+                return len(self.templates)
+            if command == 'remove':
+                for name in payload:
+                    self.templates.pop(name, None)
+                    self.full_embeddings.pop(name, None)
+                self.index = None
+                return len(self.templates)
+            if command == 'clear':
+                self.templates, self.full_embeddings, self.index = {}, {}, None
+                return 0
+            if command == 'names':
+                return list(self.templates)
+            if command == 'export':
+                return ({name: self.templates[name] for name in payload if name in self.templates},
+                        {name: self.full_embeddings[name] for name in payload if name in self.full_embeddings})
+            if command == 'stats':
+                stats = self.get_index().get_stats()
+                stats['pid'] = os.getpid()
+                return stats
+        raise ValueError(f"Unknown shard command '{command}'")
+
+
+def serve_connection(conn, state):
+    """Answer (request id, command, payload) messages until the coordinator disconnects"""
+    with conn:
+        while True:
+            try:
+                request_id, command, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = (request_id, True, state.handle(command, payload))
+            except Exception as e:
+                reply = (request_id, False, f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+
+def exit_with_parent():
+    """Exit once stdin closes - the coordinator holds the other end, even if it is killed"""
+    sys.stdin.read()
+    os._exit(0)
+
+
+def serve(authkey, storage, host='127.0.0.1', port=0):
+    """Shard process: print the bound address as the first stdout line, then serve one coordinator.
+
+    The shard exits when that coordinator disconnects or its process ends.
+    """
+    threading.Thread(target=exit_with_parent, name='parent-watch', daemon=True).start()
+    state = ShardState(storage)
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"{listener.address[0]} {listener.address[1]}", flush=True)
+        conn = listener.accept()
+    serve_connection(conn, state)
+
+
+# Coordinator
+
+class ShardUnavailable(Exception):
+    """Raised when a shard does not answer in time or its connection is gone"""
+
+
+class ShardClient:
+    """Connection to one shard.
+
+    Requests are written under a short send lock and answered through
+    per-request futures by a reader thread, so concurrent callers never
+    queue behind each other's replies and each caller's timeout covers
+    its whole wait. Replies to requests that already timed out are dropped.
+    """
+
+    def __init__(self, shard_id, address, authkey, process=None):
+        self.shard_id = shard_id
+        self.address = address
+        self.process = process
+        self.conn = Client(address, authkey=authkey)
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending = {}  # request id -> Future of (ok, result)
+        self.request_ids = itertools.count(1)
+        self.alive = True
+        self.reader = threading.Thread(target=self._read_loop, name=f'gallery-shard-{shard_id}-reader',
+                                       daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                reply_id, ok, result = self.conn.recv()
+                with self.pending_lock:
+                    future = self.pending.pop(reply_id, None)
+                if future is not None:
+                    future.set_result((ok, result))
+        except (EOFError, OSError) as e:
+            self._fail(f"connection lost ({e})" if self.alive else "is down")
+
+    def _fail(self, reason):
+        self.alive = False
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(ShardUnavailable(f"shard {self.shard_id} {reason}"))
+
+    def call(self, command, payload=None, timeout=None):
+        future = Future()
+        with self.pending_lock:
+            request_id = next(self.request_ids)
+            self.pending[request_id] = future
+        # Checked after registering: a concurrent _fail either sees this future or has already cleared alive
+        if not self.alive:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise ShardUnavailable(f"shard {self.shard_id} is down")
+        try:
+            with self.send_lock:
+                self.conn.send((request_id, command, payload))
+        except (EOFError, OSError) as e:
+            self._fail(f"connection lost ({e})")
+            raise ShardUnavailable(f"shard {self.shard_id} connection lost ({e})")
+        try:
+            ok, result = future.result(timeout=timeout)
+        except FutureTimeout:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise ShardUnavailable(f"shard {self.shard_id} timed out on {command}")
+        if not ok:
+            raise RuntimeError(f"shard {self.shard_id}: {result}")
+        return result
+
+    def close(self):
+        self.alive = False
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+class ShardedGallery:
+    """Gallery partitioned over shard processes, searched by scatter-gather.
+
+    Exposes match()/match_checked()/get_stats()/len() like TemplateIndex,
+    so the recognizer can use either. Shard processes are stopped by
+    close(), which also runs at interpreter exit.
+    """
+
+    def __init__(self, num_shards, storage=GALLERY_STORAGE, timeout=GALLERY_SHARD_TIMEOUT,
+                 rerank_margin=TEMPLATE_RERANK_MARGIN):
+        self.storage = storage
+        self.timeout = timeout
+        self.rerank_margin = rerank_margin
+        self.authkey = secrets.token_bytes(32)
+        self.shards = {}
+        self.ring = HashRing()
+        self.names = set()
+        self.closed = False
+        self.lock = threading.Lock()  # serializes load/rebalance against each other (never taken by queries)
+        self.stats_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='gallery-shard')
+        self.stats = {'queries': 0, 'partial_results': 0, 'shard_timeouts': 0, 'shard_errors': 0,
+                      'reranks': 0, 'moved_identities': 0}
+        atexit.register(self.close)
+        for _ in range(num_shards):
+            self._start_shard()
+
+    def _start_shard(self, shard_id=None):
+        """Start a shard process; an existing id replaces a dead shard in place on the ring"""
+        replacing = shard_id is not None
+        if not replacing:
+            shard_id = max(self.shards, default=-1) + 1
+        # A fresh interpreter rather than fork: the parent may hold TensorFlow and server threads
+        env = dict(os.environ, GALLERY_SHARD_AUTHKEY=self.authkey.hex())
+        # stdin stays open for the shard's lifetime; the shard exits when it closes
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--storage', self.storage],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        line = process.stdout.readline().split()
+        if len(line) != 2:
+            process.kill()
+            raise RuntimeError(f"gallery shard {shard_id} did not start")
+        address = (line[0], int(line[1]))
+        if replacing:
+            self.shards[shard_id].close()
+        self.shards[shard_id] = ShardClient(shard_id, address, self.authkey, process)
+        if not replacing:
+            self.ring.add(shard_id)
+        print(f"🧩 Gallery shard {shard_id} listening on {address[0]}:{address[1]} (pid {process.pid})")
+        return shard_id
+
+    def __len__(self):
+        return len(self.names)
+
+    def scatter(self, shard_ids, command, payload_for, timeout):
+        """Run a command on several shards in parallel; returns ({shard: result}, {shard: error})"""
+        futures = {shard_id: self.executor.submit(self.shards[shard_id].call, command,
+                                                  payload_for(shard_id), timeout)
+                   for shard_id in shard_ids}
+        results, errors = {}, {}
+        for shard_id, future in futures.items():
+            try:
+                results[shard_id] = future.result()
+            except ShardUnavailable as e:
+                errors[shard_id] = str(e)
+                with self.stats_lock:
+                    self.stats['shard_timeouts' if 'timed out' in str(e) else 'shard_errors'] += 1
+            except Exception as e:
+                errors[shard_id] = str(e)
+                with self.stats_lock:
+                    self.stats['shard_errors'] += 1
+        return results, errors
+
+    def _send_identities(self, templates, full_embeddings):
+        """Route identities to their shards in chunks"""
+        by_shard = {}
+        for name in templates:
+            by_shard.setdefault(self.ring.shard_for(name), []).append(name)
+        for shard_id, names in by_shard.items():
+            for start in range(0, len(names), TRANSFER_CHUNK):
+                chunk = names[start:start + TRANSFER_CHUNK]
+                self.shards[shard_id].call('add', ({n: templates[n] for n in chunk},
+                                                   {n: full_embeddings[n] for n in chunk if n in full_embeddings}))
+
+    def load(self, templates, full_embeddings=None):
+        """Replace the gallery contents, restarting any shard that died since the last load.
+
+        New entries are sent (replacing same-named ones) before stale names
+        are removed, so queries during a reload never see an empty gallery.
+        """
+        with self.lock:
+            for shard_id, shard in list(self.shards.items()):
+                if not shard.alive:
+                    self._start_shard(shard_id)
+            self._send_identities(templates, full_embeddings or {})
+            for shard in self.shards.values():
+                stale = [name for name in shard.call('names') if name not in templates]
+                if stale:
+                    shard.call('remove', stale)
+            self.names = set(templates)
+
+    def add_identities(self, templates, full_embeddings=None):
+        """Add or replace identities on their shards, leaving the rest of the gallery untouched"""
+        with self.lock:
+            self._send_identities(templates, full_embeddings or {})
+            self.names.update(templates)
+
+    def search(self, query, k=5, timeout=None):
+        """Top-k identities over all shards, with which shards answered"""
+        started = time.perf_counter()
+        query = np.asarray(query, dtype=np.float32)
+        shards = list(self.shards.items())  # add_shard may grow the dict concurrently
+        shard_ids = [shard_id for shard_id, shard in shards if shard.alive]
+        results, errors = self.scatter(shard_ids, 'search', lambda _: (query, k), timeout or self.timeout)
+        errors.update({shard_id: 'down' for shard_id, shard in shards if not shard.alive})
+        merged = heapq.nlargest(k, (match for matches in results.values() for match in matches),
+                                key=lambda match: match[1])
+        with self.stats_lock:
+            self.stats['queries'] += 1
+            if errors:
+                self.stats['partial_results'] += 1
+        return {
+            'matches': merged,
+            'shards_answered': sorted(results),
+            'shards_failed': errors,
+            'partial': bool(errors),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def match(self, query):
+        """Return (name, confidence) like TemplateIndex.match"""
+        name, confidence, _ = self.match_checked(query)
+        return name, confidence
+
+    def match_checked(self, query):
+        """(name, confidence, partial), reranking close calls on their shards.
+
+        partial means a shard did not answer: a better match may be missing,
+        so the result must not be trusted as the gallery's best.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        result = self.search(query, k=2)
+        ranked = result['matches']
+        if not ranked:
+            return None, 0.0, result['partial']
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.rerank_margin:
+            rescored = self.rerank(query, [name for name, _ in ranked])
+            if rescored:
+                ranked = rescored
+        return ranked[0][0], ranked[0][1], result['partial']
+
+    def rerank(self, query, names):
+        by_shard = {}
+        for name in names:
+            by_shard.setdefault(self.ring.shard_for(name), []).append(name)
+        results, errors = self.scatter(list(by_shard), 'rerank', lambda shard_id: (query, by_shard[shard_id]),
+                                       self.timeout)
+        if errors or any(result is None for result in results.values()):
+            return None
+        with self.stats_lock:
+            self.stats['reranks'] += 1
+        return sorted((match for result in results.values() for match in result), key=lambda m: m[1], reverse=True)
+
+    def add_shard(self):
+        """Start a shard and move the identities the ring now assigns to it; returns how many moved"""
+        with self.lock:
+            shard_id = self._start_shard()
+            moved = 0
+            for source_id, source in list(self.shards.items()):
+                if source_id == shard_id or not source.alive:
+                    continue
+                names = [name for name in source.call('names') if self.ring.shard_for(name) == shard_id]
+                for start in range(0, len(names), TRANSFER_CHUNK):
+                    chunk = names[start:start + TRANSFER_CHUNK]
+                    # Copy first, then drop from the source - the identity is never missing from the gallery
+                    self.shards[shard_id].call('add', source.call('export', chunk))
+                    source.call('remove', chunk)
+                    moved += len(chunk)
+            with self.stats_lock:
+                self.stats['moved_identities'] += moved
+            print(f"🧩 Rebalanced: {moved} identities moved to shard {shard_id}")
+            return moved
+
+    def get_stats(self):
+        shards = list(self.shards.items())
+        shard_stats, errors = self.scatter([s for s, shard in shards if shard.alive],
+                                           'stats', lambda _: None, self.timeout)
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats.update(
+            identities=len(self.names),
+            storage=self.storage,
+            shards={shard_id: shard_stats.get(shard_id, {'error': errors.get(shard_id, 'down')})
+                    for shard_id, _ in shards},
+        )
+        return stats
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for shard in self.shards.values():
+            shard.close()
+        self.executor.shutdown(wait=False)
+
+
+# Demo
+
+def demo(args):
+    from face_templates import build_template
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.identities, args.dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    templates, full = {}, {}
+    for i, center in enumerate(centers):
+        images = center + 0.3 * rng.standard_normal((3, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+        templates[f"person_{i}"] = build_template(images, k=1)
+        full[f"person_{i}"] = list(images)
+
+    gallery = ShardedGallery(args.shards)
+    try:
+        start = time.perf_counter()
+        gallery.load(templates, full)
+        print(f"📦 Loaded {args.identities} identities in {time.perf_counter() - start:.1f}s")
+
+        def run_queries(label):
+            picks = rng.choice(args.identities, args.queries)
+            latencies, correct, partial = [], 0, 0
+            for i in picks:
+                query = centers[i] + 0.3 * rng.standard_normal(args.dim, dtype=np.float32) / np.sqrt(args.dim)
+                result = gallery.search(query, k=5)
+                latencies.append(result['elapsed_ms'])
+                correct += bool(result['matches']) and result['matches'][0][0] == f"person_{i}"
+                partial += result['partial']
+            print(f"   {label:<28} p50 {np.median(latencies):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms"
+                  f"  top1 {correct / len(picks):.3f}  partial {partial}/{len(picks)}")
+
+        run_queries(f"{args.shards} shards")
+        moved = gallery.add_shard()
+        print(f"   moved {moved} of {args.identities} identities ({moved / args.identities:.1%})")
+        run_queries(f"{args.shards + 1} shards")
+
+        victim = gallery.shards[0]
+        victim.process.kill()
+        victim.process.wait()
+        run_queries("shard 0 killed")
+    finally:
+        gallery.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded gallery tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    demo_parser = subparsers.add_parser('demo', help="scatter-gather latency, partial results and rebalancing")
+    demo_parser.add_argument('--shards', type=int, default=4)
+    demo_parser.add_argument('--identities', type=int, default=20000)
+    demo_parser.add_argument('--dim', type=int, default=512)
+    demo_parser.add_argument('--queries', type=int, default=200)
+    serve_parser = subparsers.add_parser('serve', help="run one shard (authkey from GALLERY_SHARD_AUTHKEY, hex)")
+    serve_parser.add_argument('--storage', default=GALLERY_STORAGE)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(bytes.fromhex(os.environ['GALLERY_SHARD_AUTHKEY']), args.storage, args.host, args.port)
+    else:
+        demo(args)
+
+
+if __name__ == "__main__":
+    main()
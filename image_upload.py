@@ -0,0 +1,86 @@
+import struct
+
+import cv2
+import numpy as np
+
+from config import UPLOAD_MAX_SIDE
+
+# JPEG start-of-frame markers that carry the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# OpenCV can decode JPEGs directly at 1/2, 1/4 or 1/8 scale
+_REDUCED_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8),
+                  (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+
+def jpeg_dimensions(data):
+    """Read (width, height) from a JPEG header without decoding it"""
+    if len(data) < 4 or data[0:2] != b'\xff\xd8':
+        return None
+
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        segment_length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + segment_length
+    return None
+
+
+def decode_image(data, max_side=UPLOAD_MAX_SIDE):
+    """Decode an uploaded image, using reduced-resolution JPEG decoding when it is large.
+
+    Returns (image, scale) where scale maps decoded coordinates back to the
+    original image (original = decoded * scale).
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    dims = jpeg_dimensions(data)
+
+    image, factor = None, 1.0
+    if dims and max_side:
+        longest = max(dims)
+        # Largest reduction that still decodes at or above the limit
+        for reduction, flag in _REDUCED_FLAGS:
+            if longest / reduction >= max_side:
+                image = cv2.imdecode(buffer, flag)
+                if image is not None:
+                    factor = float(reduction)
+                break
+
+    if image is None:
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if image is None:
+            return None, 1.0
+
+    # Non-JPEG, JPEG just above the limit, or a reduced decode still up to 2x too large - resize to the limit
+    h, w = image.shape[:2]
+    if max_side and max(h, w) > max_side:
+        scale = max(h, w) / max_side
+        image = cv2.resize(image, (int(round(w / scale)), int(round(h / scale))),
+                           interpolation=cv2.INTER_AREA)
+        return image, factor * scale
+    return image, factor
+
+
+def read_uploaded_images(request):
+    """Collect (filename, bytes) pairs from a multipart form or a raw image body"""
+    uploads = []
+    if request.files:
+        for field in request.files:
+            for file in request.files.getlist(field):
+                uploads.append((file.filename or field, file.read()))
+    elif request.content_type and request.content_type.startswith(('image/', 'application/octet-stream')):
+        uploads.append(('body', request.get_data()))
+    return uploads
@@ -0,0 +1,117 @@
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from config import INFERENCE_CONCURRENCY, INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at capacity"""
+
+
+class InferenceTimeout(Exception):
+    """Raised when an inference call does not finish in time"""
+
+
+class InferencePool:
+    """Fixed set of worker threads that own all model calls.
+
+    At most `concurrency` TensorFlow calls run at once and at most
+    `queue_size` more wait behind them; anything beyond that is rejected
+    immediately instead of slowing every request down together.
+    """
+
+    def __init__(self, concurrency=INFERENCE_CONCURRENCY, queue_size=INFERENCE_QUEUE_SIZE,
+                 timeout=INFERENCE_TIMEOUT):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.stats = {'submitted': 0, 'completed': 0, 'rejected': 0, 'timed_out': 0, 'cancelled': 0}
+        self.profiler = None  # set only while profiling.TaskProfiler is recording the workers
+        self.workers = []
+        for i in range(concurrency):
+            worker = threading.Thread(target=self._worker_loop, name=f'inference-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def in_worker(self):
+        """True when called from one of this pool's worker threads"""
+        return getattr(self.local, 'is_worker', False)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a call and return a concurrent.futures.Future"""
+        future = Future()
+        try:
+            self.queue.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            with self.lock:
+                self.stats['rejected'] += 1
+            raise InferenceQueueFull(f"Inference queue full ({self.queue.maxsize} waiting)")
+        with self.lock:
+            self.stats['submitted'] += 1
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Blocking helper: submit and wait, cancelling the call on timeout"""
+        if self.in_worker():
+            # Already on an inference thread - nesting would deadlock the pool
+            return fn(*args, **kwargs)
+
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            self.cancel(future)
+            with self.lock:
+                self.stats['timed_out'] += 1
+            raise InferenceTimeout("Inference timed out")
+
+    def cancel(self, future):
+        """Cancel a queued call; a call already running finishes but its result is dropped"""
+        if future.cancel():
+            with self.lock:
+                self.stats['cancelled'] += 1
+
+    def _worker_loop(self):
+        self.local.is_worker = True
+        while True:
+            future, fn, args, kwargs = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            with self.lock:
+                self.running += 1
+            try:
+                profiler = self.profiler
+                if profiler is None:
+                    future.set_result(fn(*args, **kwargs))
+                else:
+                    future.set_result(profiler.runcall(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.stats['completed'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['running'] = self.running
+        stats['queued'] = self.queue.qsize()
+        stats['concurrency'] = self.concurrency
+        return stats
+
+
+# Global inference pool
+inference_pool = None
+
+def get_inference_pool():
+    """Get or create the shared inference pool"""
+    global inference_pool
+    if inference_pool is None:
+        inference_pool = InferencePool()
+    return inference_pool
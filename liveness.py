@@ -0,0 +1,220 @@
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from boxes import match_greedy
+from metrics import stage_timer
+from config import (LIVENESS_CACHE_TTL, LIVENESS_TRACK_MAX_AGE, LIVENESS_TRACK_IOU, LIVENESS_TRACK_FRAMES,
+                    LIVENESS_MIN_FRAMES, LIVENESS_MOTION_THRESHOLD, LIVENESS_TEXTURE_MIN)
+
+TRACK_CROP_SIZE = 64
+
+
+def anti_spoof_score(face_img):
+    """Heavy check with DeepFace's anti-spoofing model.
+
+    Returns (is_real, liveness score in [0, 1]) or None when the model
+    cannot give a verdict - callers must not treat that as real.
+    """
+    try:
+        from deepface import DeepFace
+        result = DeepFace.extract_faces(
+            img_path=face_img,
+            anti_spoofing=True,
+            enforce_detection=False
+        )
+    except Exception as e:
+        print(f"⚠️ Anti-spoofing check failed: {e}")
+        return None
+    if not result or 'is_real' not in result[0]:
+        return None
+    is_real = bool(result[0]['is_real'])
+    confidence = float(result[0].get('antispoof_score', 1.0))
+    return is_real, confidence if is_real else 1.0 - confidence
+
+
+# ECC registration: a few iterations suffice on 64x64 crops
+ECC_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+RESIDUAL_BLUR_SIGMA = 1.5
+
+
+def register(previous, current):
+    """`previous` warped onto `current` by the affine transform that best explains the change.
+
+    Affine rather than translation only: detector box jitter changes the
+    crop's scale (independently in x and y after the square resize), which
+    must not read as non-rigid motion. Returns None when registration fails.
+    """
+    (dx, dy), _ = cv2.phaseCorrelate(previous, current)
+    warp = np.float32([[1, 0, dx], [0, 1, dy]])
+    try:
+        _, warp = cv2.findTransformECC(current, previous, warp, cv2.MOTION_AFFINE, ECC_CRITERIA, None, 1)
+    except cv2.error:
+        return None
+    return cv2.warpAffine(previous, warp, (TRACK_CROP_SIZE, TRACK_CROP_SIZE),
+                          flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+
+
+def temporal_prefilter(crops, texture):
+    """Cheap liveness evidence from a track's recent crops.
+
+    Rigid motion (a photo or phone moved in front of the camera, detector
+    box jitter) is removed by affine registration; what remains between
+    consecutive crops is non-rigid motion such as blinks and expression
+    changes. Returns (score, residual_motion) when the track clearly looks
+    live, else (None, residual_motion) and the heavy model has to decide.
+    """
+    if len(crops) < LIVENESS_MIN_FRAMES:
+        return None, 0.0
+
+    residuals = []
+    for previous, current in zip(list(crops)[:-1], list(crops)[1:]):
+        aligned = register(previous, current)
+        if aligned is None:
+            residuals.append(0.0)  # no evidence from a pair that cannot be registered
+            continue
+        # Low-pass the difference: resampling a finely textured crop at a slightly different
+        # scale leaves pixel-level aliasing that is not motion
+        difference = cv2.GaussianBlur(current - aligned, (0, 0), RESIDUAL_BLUR_SIGMA)
+        # Ignore the border, where the warp leaves replicated pixels
+        margin = TRACK_CROP_SIZE // 8
+        residuals.append(float(np.abs(difference)[margin:-margin, margin:-margin].mean()))
+    residual = float(np.median(residuals))
+
+    if residual >= LIVENESS_MOTION_THRESHOLD and texture >= LIVENESS_TEXTURE_MIN:
+        # Capped below certainty - motion is evidence of liveness, not proof
+        return min(0.9, 0.5 + residual / (4 * LIVENESS_MOTION_THRESHOLD)), residual
+    return None, residual
+
+
+class FaceTrack:
+    def __init__(self, track_id, bbox, now):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.first_seen = now
+        self.last_seen = now
+        self.crops = deque(maxlen=LIVENESS_TRACK_FRAMES)
+        self.texture = 0.0
+        self.result = None  # cached verdict dict
+        self.result_at = 0.0
+
+    def add_crop(self, frame, bbox):
+        x1, y1, x2, y2 = [int(v) for v in bbox]
+        face = frame[max(0, y1):y2, max(0, x1):x2]
+        if face.size == 0:
+            return
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        self.texture = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        small = cv2.resize(gray, (TRACK_CROP_SIZE, TRACK_CROP_SIZE), interpolation=cv2.INTER_AREA)
+        small = small.astype(np.float32)
+        # Brightness-normalize so auto-exposure changes do not read as motion
+        self.crops.append(small * (128.0 / max(float(small.mean()), 1.0)))
+
+
+class LivenessChecker:
+    """Liveness per tracked face instead of per recognition attempt.
+
+    `observe` runs on every frame: detections are matched to tracks by IoU
+    and each track keeps a few small crops. `evaluate` returns a track's
+    cached verdict while it is fresh; otherwise the temporal pre-filter
+    decides, and only tracks it cannot vouch for go to the heavy
+    anti-spoofing model. Model failures are never cached or treated as real.
+    """
+
+    def __init__(self, cache_ttl=LIVENESS_CACHE_TTL, max_age=LIVENESS_TRACK_MAX_AGE,
+                 iou_threshold=LIVENESS_TRACK_IOU, heavy_fn=anti_spoof_score):
+        self.cache_ttl = cache_ttl
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self.heavy_fn = heavy_fn
+        self.tracks = {}
+        self.next_track_id = 1
+        self.lock = threading.Lock()
+        self.stats = {'evaluations': 0, 'cache_hits': 0, 'prefilter_passes': 0, 'heavy_runs': 0,
+                      'heavy_failures': 0}
+
+    def observe(self, frame, faces):
+        """Update tracks with this frame's detections; returns the tracks in detection order"""
+        now = time.monotonic()
+        with self.lock:
+            for track_id in [tid for tid, t in self.tracks.items() if now - t.last_seen > self.max_age]:
+                del self.tracks[track_id]
+
+            # One IoU matrix for all tracks x detections, matched best-overlap first
+            existing = list(self.tracks.values())
+            assigned = {j: existing[i] for i, j in match_greedy([t.bbox for t in existing], faces,
+                                                                   self.iou_threshold)}
+            matched = []
+            for j, bbox in enumerate(faces):
+                track = assigned.get(j)
+                if track is None:
+                    track = FaceTrack(self.next_track_id, bbox, now)
+                    self.tracks[track.track_id] = track
+                    self.next_track_id += 1
+                track.bbox = bbox
+                track.last_seen = now
+                track.add_crop(frame, bbox)
+                matched.append(track)
+        return matched
+
+    def evaluate(self, track, frame):
+        """Liveness verdict for a track: {'is_real', 'score', 'spoof_score', 'method', 'track_id'}"""
+        now = time.monotonic()
+        with self.lock:
+            self.stats['evaluations'] += 1
+            if track.result is not None and now - track.result_at < self.cache_ttl:
+                self.stats['cache_hits'] += 1
+                return dict(track.result, cached=True)
+            crops = list(track.crops)
+            texture = track.texture
+
+        with stage_timer('liveness', model='temporal'):
+            score, residual = temporal_prefilter(crops, texture)
+        if score is not None:
+            result = {'is_real': True, 'score': score, 'method': 'temporal'}
+            with self.lock:
+                self.stats['prefilter_passes'] += 1
+        else:
+            x1, y1, x2, y2 = [int(v) for v in track.bbox]
+            with stage_timer('liveness', model='anti_spoof'):
+                verdict = self.heavy_fn(frame[max(0, y1):y2, max(0, x1):x2])
+            with self.lock:
+                self.stats['heavy_runs'] += 1
+                if verdict is None:
+                    self.stats['heavy_failures'] += 1
+            if verdict is None:
+                # Fail closed, and do not cache - the next attempt tries again
+                return {'is_real': False, 'score': 0.0, 'spoof_score': None, 'method': 'unavailable',
+                        'track_id': track.track_id, 'motion': round(residual, 2), 'cached': False}
+            result = {'is_real': verdict[0], 'score': verdict[1], 'method': 'anti_spoof'}
+
+        result.update(spoof_score=round(1.0 - result['score'], 4), score=round(result['score'], 4),
+                      track_id=track.track_id, motion=round(residual, 2))
+        with self.lock:
+            track.result = result
+            track.result_at = now
+        return dict(result, cached=False)
+
+    def evaluate_face(self, frame, bbox):
+        """Evaluate the track a single detection belongs to (for one-off requests)"""
+        return self.evaluate(self.observe(frame, [bbox])[0], frame)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['active_tracks'] = len(self.tracks)
+        return stats
+
+
+# Global liveness checker (created on first use)
+liveness_checker = None
+
+def get_liveness_checker():
+    """Get or create the shared liveness checker"""
+    global liveness_checker
+    if liveness_checker is None:
+        liveness_checker = LivenessChecker()
+    return liveness_checker
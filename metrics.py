@@ -0,0 +1,282 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms with labels, kept in a process-wide
+registry and rendered on /metrics. Recording is a dict lookup, a bisect
+and a few integer updates under a per-series lock, so timers can wrap
+every pipeline stage without measurable overhead.
+"""
+import time
+import bisect
+import threading
+
+# Latency buckets (seconds) - from sub-millisecond matching up to multi-second model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterSeries:
+    __slots__ = ('lock', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class GaugeSeries:
+    __slots__ = ('lock', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class HistogramSeries:
+    __slots__ = ('lock', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+
+class Timer:
+    """Context manager observing the elapsed monotonic time into a histogram series"""
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metric:
+    """A named metric family; labels(...) returns the series for one label combination"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        series = self.series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                series = self.series.setdefault(values, self.new_series())
+        return series
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.series.items())
+        for values, series in items:
+            lines.extend(self.render_series(values, series))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def new_series(self):
+        return CounterSeries()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render_series(self, values, series):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(series.value)}"]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def new_series(self):
+        return GaugeSeries()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def render_series(self, values, series):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(series.value)}"]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def new_series(self):
+        return HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render_series(self, values, series):
+        with series.lock:
+            counts, total, count = list(series.counts), series.sum, series.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, [le])} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Process-wide metric families plus collectors that refresh gauges at scrape time"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, collector):
+        """collector() is called before every render (e.g. to copy queue depths into gauges)"""
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        with self.lock:
+            collectors = list(self.collectors)
+            metrics = list(self.metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Pipeline metrics
+STAGE_SECONDS = histogram('face_stage_duration_seconds', 'Time spent in each pipeline stage',
+                          ['stage', 'camera', 'model'])
+FRAMES = counter('face_frames_total', 'Frames captured and streamed', ['camera'])
+ACCESS_ATTEMPTS = counter('face_access_attempts_total', 'Logged access attempts by decision', ['decision'])
+QUEUE_DEPTH = gauge('face_queue_depth', 'Items waiting in a work queue', ['queue'])
+GALLERY_IDENTITIES = gauge('face_gallery_identities', 'Identities in the loaded gallery')
+CAMERA_FPS = gauge('face_camera_fps', 'Frames per second delivered per camera', ['camera'])
+
+
+def stage_timer(stage, camera='', model=''):
+    """`with stage_timer('detection', model='haar'):` records the block's duration"""
+    return Timer(STAGE_SECONDS.labels(stage, camera, model))
+
+
+def observe_stage(stage, seconds, camera='', model=''):
+    STAGE_SECONDS.labels(stage, camera, model).observe(seconds)
+
+
+frame_clock_lock = threading.Lock()
+frame_clock = {}  # camera -> (last frame monotonic time, fps estimate)
+
+def record_frame(camera):
+    """Count a frame and update the camera's FPS estimate (exponential moving average)"""
+    FRAMES.labels(camera).inc()
+    now = time.monotonic()
+    with frame_clock_lock:
+        last, fps = frame_clock.get(camera, (None, 0.0))
+        if last is not None and now > last:
+            instant = 1.0 / (now - last)
+            fps = instant if fps == 0 else 0.9 * fps + 0.1 * instant
+        frame_clock[camera] = (now, fps)
+    CAMERA_FPS.labels(camera).set(round(fps, 2))
+
+
+def _expire_fps():
+    # A camera that stopped delivering frames reads zero, not its last rate
+    now = time.monotonic()
+    with frame_clock_lock:
+        for camera, (last, _) in list(frame_clock.items()):
+            if now - last > 2.0:
+                frame_clock[camera] = (last, 0.0)
+                CAMERA_FPS.labels(camera).set(0.0)
+
+registry.add_collector(_expire_fps)
+
+
+def render():
+    """Prometheus text exposition of every registered metric"""
+    return registry.render()
@@ -1,28 +1,53 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
-from utils import decrypt_data
 import os
-from scipy.spatial.distance import cosine, euclidean
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
+import threading
+import time
+from collections import Counter
+from boxes import iou, match_greedy, nms
+from gallery import gallery_lock, load_gallery, save_gallery, save_templates
+from face_templates import TEMPLATE_VERSION, TemplateIndex, build_template, build_templates
+from gallery_shards import ShardedGallery
+from embedding_batcher import get_embedding_batcher
+from embedding_cache import get_embedding_cache
+from face_preprocessing import enhance_face_quality
+from admission import is_degraded
+from status_snapshot import status_snapshot
+from metrics import stage_timer
+from config import EMBEDDING_TIMEOUT, GALLERY_SHARDS
 
 class PerfectFaceRecognizer:
     def __init__(self):
         self.known_encodings = []
         self.known_names = []
+        self.templates = {}
+        self.template_index = TemplateIndex({})
         self.load_known_faces()
         self.face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     
     def load_known_faces(self):
         """Load and pre-process known faces for perfect matching"""
         try:
-            known_encodings, known_names = decrypt_data()
+            data = load_gallery()
+            known_encodings, known_names = data['encodings'], data['names']
+            stored_templates = data.get('templates', {})
+            entry_counts = Counter(known_names)
             self.known_encodings = []
             self.known_names = []
+            templates = {}
+            
+            for name, template in stored_templates.items():
+                # A stored template is reusable while the identity's gallery entries are unchanged.
+                # 'entries' counts the gallery entries it was stored against - image paths and
+                # unusable embeddings included - unlike 'count', the embeddings it was built from.
+                if template.get('version') == TEMPLATE_VERSION and template.get('entries') == entry_counts.get(name):
+                    templates[name] = template
             
             for i, (encoding, name) in enumerate(zip(known_encodings, known_names)):
                 if isinstance(encoding, str):
+                    if name in templates:
+                        continue  # Template already stored - skip re-embedding the images
                     # Load face image and extract high-quality embedding
                     try:
                         face_embedding = self.extract_face_embedding(encoding)
@@ -36,29 +61,94 @@ class PerfectFaceRecognizer:
                     self.known_encodings.append(encoding)
                     self.known_names.append(name)
             
-            print(f"✅ Loaded {len(self.known_names)} high-quality face embeddings")
+            fresh = build_templates(
+                [e for e, n in zip(self.known_encodings, self.known_names) if n not in templates],
+                [n for n in self.known_names if n not in templates]
+            )
+            for name, template in fresh.items():
+                template['entries'] = entry_counts[name]
+            templates.update(fresh)
+            self.build_template_index(templates)
+            if fresh:
+                save_templates(fresh)
+            
+            print(f"✅ Loaded {len(self.known_names)} high-quality face embeddings "
+                  f"({len(templates)} identity templates)")
         except Exception as e:
             print(f"❌ Error loading known faces: {e}")
             self.known_encodings = []
             self.known_names = []
+            self.build_template_index({})
+    
+    def build_template_index(self, templates):
+        """Index identity templates, keeping full embeddings for close-call reranks"""
+        full_embeddings = {}
+        for encoding, name in zip(self.known_encodings, self.known_names):
+            full_embeddings.setdefault(name, []).append(np.asarray(encoding, dtype=np.float32))
+        for name, template in templates.items():
+            if name not in full_embeddings:
+                # Reused stored template, images not re-embedded: its medoids are stored image embeddings
+                full_embeddings[name] = [np.asarray(m, dtype=np.float32) for m in template['medoids']]
+        self.templates = templates
+        if GALLERY_SHARDS > 0:
+            # Shard processes outlive reloads; only their contents are replaced
+            if not isinstance(self.template_index, ShardedGallery):
+                self.template_index = ShardedGallery(GALLERY_SHARDS)
+            self.template_index.load(templates, full_embeddings)
+        else:
+            self.template_index = TemplateIndex(templates, full_embeddings)
+    
+    def add_identity(self, name, embeddings, template):
+        """Add a newly enrolled identity without reloading the gallery"""
+        self.known_encodings.extend(embeddings)
+        self.known_names.extend([name] * len(embeddings))
+        templates = dict(self.templates)
+        templates[name] = template
+        if isinstance(self.template_index, ShardedGallery):
+            # Only the new identity goes to its shard; the rest of the gallery stays searchable
+            self.templates = templates
+            full_embeddings = [np.asarray(e, dtype=np.float32)
+                               for e, n in zip(self.known_encodings, self.known_names) if n == name]
+            self.template_index.add_identities({name: template}, {name: full_embeddings})
+        else:
+            self.build_template_index(templates)
+    
+    def remove_identity(self, name):
+        """Forget an identity already removed from the stored gallery"""
+        keep = [i for i, n in enumerate(self.known_names) if n != name]
+        self.known_encodings = [self.known_encodings[i] for i in keep]
+        self.known_names = [self.known_names[i] for i in keep]
+        templates = dict(self.templates)
+        templates.pop(name, None)
+        self.build_template_index(templates)
     
     def extract_face_embedding(self, face_path):
         """Extract high-quality face embedding using multiple models"""
         try:
-            # Use multiple DeepFace models for better accuracy
-            models = ['VGG-Face', 'Facenet', 'ArcFace', 'Dlib']
+            from deepface import DeepFace
+            
+            # Use multiple DeepFace models for better accuracy (one under overload)
+            models = ['ArcFace'] if is_degraded() else ['VGG-Face', 'Facenet', 'ArcFace', 'Dlib']
             embeddings = []
             
+            def represent(model):
+                embedding = DeepFace.represent(
+                    img_path=face_path,
+                    model_name=model,
+                    enforce_detection=False,
+                    detector_backend='retinaface'
+                )
+                if embedding and len(embedding) > 0:
+                    return embedding[0]['embedding']
+                return None
+            
+            # Stored images only need embedding once per model - reloads hit the cache
+            cache = get_embedding_cache()
             for model in models:
                 try:
-                    embedding = DeepFace.represent(
-                        img_path=face_path,
-                        model_name=model,
-                        enforce_detection=False,
-                        detector_backend='retinaface'
-                    )
-                    if embedding and len(embedding) > 0:
-                        embeddings.append(embedding[0]['embedding'])
+                    embedding = cache.get_or_compute(face_path, model, 'retinaface', lambda: represent(model))
+                    if embedding is not None:
+                        embeddings.append(embedding)
                 except:
                     continue
             
@@ -70,174 +160,219 @@ class PerfectFaceRecognizer:
         except:
             return None
     
-    def extract_face_embedding_from_frame(self, frame, face_coords):
+    def submit_face_embedding(self, frame, face_coords, landmarks=None):
+        """Queue a detected face for embedding; returns a future or None"""
+        x, y, x2, y2 = face_coords
+        if x2 <= x or y2 <= y:
+            return None
+        
+        # The batcher aligns and enhances the face straight into its input buffer
+        return get_embedding_batcher('ArcFace').submit_face(frame, face_coords, landmarks)  # Best for accuracy
+    
+    def extract_face_embedding_from_frame(self, frame, face_coords, landmarks=None):
         """Extract embedding from detected face in frame"""
         try:
-            x, y, x2, y2 = face_coords
-            face_crop = frame[y:y2, x:x2]
-            
-            if face_crop.size == 0:
-                return None
-            
-            # Enhance face quality
-            face_crop = self.enhance_face_quality(face_crop)
-            
-            # Extract high-quality embedding
-            embedding = DeepFace.represent(
-                img_path=face_crop,
-                model_name='ArcFace',  # Best for accuracy
-                enforce_detection=False,
-                detector_backend='retinaface'
-            )
-            
-            if embedding and len(embedding) > 0:
-                return embedding[0]['embedding']
-            return None
+            future = self.submit_face_embedding(frame, face_coords, landmarks)
+            return future.result(timeout=EMBEDDING_TIMEOUT) if future is not None else None
         except:
             return None
     
     def enhance_face_quality(self, face_img):
         """Enhance face image quality for better recognition"""
-        try:
-            # Convert to LAB color space for better processing
-            lab = cv2.cvtColor(face_img, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            
-            # Apply CLAHE to L channel for better contrast
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            l = clahe.apply(l)
-            
-            # Merge back and convert to BGR
-            enhanced = cv2.merge([l, a, b])
-            enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-            
-            # Apply slight sharpening
-            kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-            enhanced = cv2.filter2D(enhanced, -1, kernel)
-            
-            return enhanced
-        except:
-            return face_img
+        return enhance_face_quality(face_img)
     
     def detect_faces(self, frame):
         """Advanced face detection with multiple methods"""
-        faces = []
+        return self.detect_faces_landmarked(frame)[0]
+    
+    def detect_faces_landmarked(self, frame):
+        """Detect faces; returns (boxes, landmarks) with landmarks None where unknown"""
+        with stage_timer('detection', model='haar+retinaface'):
+            faces = []
         
-        # Method 1: OpenCV Haar Cascade
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        haar_faces = self.face_detector.detectMultiScale(
-            gray, 
-            scaleFactor=1.1, 
-            minNeighbors=5, 
-            minSize=(30, 30)
-        )
+            # Method 1: OpenCV Haar Cascade
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            haar_faces = self.face_detector.detectMultiScale(
+                gray, 
+                scaleFactor=1.1, 
+                minNeighbors=5, 
+                minSize=(30, 30)
+            )
         
-        for (x, y, w, h) in haar_faces:
-            faces.append((x, y, x+w, y+h))
+            for (x, y, w, h) in haar_faces:
+                faces.append((x, y, x+w, y+h))
         
-        # Method 2: DeepFace detection (more accurate)
-        try:
-            deep_faces = DeepFace.extract_faces(
-                img_path=frame,
-                detector_backend='retinaface',
-                enforce_detection=False
-            )
+            # Degraded mode: Haar cascade only
+            if is_degraded():
+                return faces, [None] * len(faces)
+        
+            # Method 2: DeepFace detection (more accurate, and gives eye positions for alignment)
+            deep_boxes, deep_eyes = [], []
+            try:
+                from deepface import DeepFace
             
-            for face_obj in deep_faces:
-                if 'facial_area' in face_obj:
-                    area = face_obj['facial_area']
-                    faces.append((area['x'], area['y'], area['x2'], area['y2']))
-        except:
-            pass
+                deep_faces = DeepFace.extract_faces(
+                    img_path=frame,
+                    detector_backend='retinaface',
+                    enforce_detection=False
+                )
+            
+                for face_obj in deep_faces:
+                    if 'facial_area' in face_obj:
+                        area = face_obj['facial_area']
+                        deep_boxes.append((area['x'], area['y'], area['x'] + area['w'], area['y'] + area['h']))
+                        eyes = (area.get('left_eye'), area.get('right_eye'))
+                        deep_eyes.append(np.float32(eyes) if all(eyes) else None)
+            except:
+                pass
         
-        # Remove duplicates and return best faces
-        unique_faces = []
-        for face in faces:
-            is_duplicate = False
-            for existing in unique_faces:
-                if self.calculate_iou(face, existing) > 0.5:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_faces.append(face)
+            # Remove duplicates (earlier detections win) and return best faces
+            faces += deep_boxes
+            faces = [faces[i] for i in nms(faces, iou_threshold=0.5)]
         
-        return unique_faces
+            # Kept Haar boxes borrow the eye positions of the RetinaFace box they overlap
+            landmarks = [None] * len(faces)
+            for i, j in match_greedy(faces, deep_boxes, 0.3):
+                landmarks[i] = deep_eyes[j]
+            return faces, landmarks
     
     def calculate_iou(self, box1, box2):
         """Calculate Intersection over Union for face boxes"""
-        x1 = max(box1[0], box2[0])
-        y1 = max(box1[1], box2[1])
-        x2 = min(box1[2], box2[2])
-        y2 = min(box1[3], box2[3])
+        return iou(box1, box2)
+    
+    def match_embedding(self, face_embedding):
+        """Return (name, confidence, partial) of the best known face for an embedding.
         
-        if x2 <= x1 or y2 <= y1:
-            return 0.0
+        Matches against compact per-identity templates; the index falls back
+        to every stored image only when the top two identities are close.
+        partial is set when a sharded gallery could not search every shard.
+        """
+        with stage_timer('matching', model=f"templates-{len(face_embedding)}d"):
+            best_match, best_confidence, partial = self.template_index.match_checked(face_embedding)
         
-        intersection = (x2 - x1) * (y2 - y1)
-        area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
-        area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
-        union = area1 + area2 - intersection
+        # Apply quality boost for perfect matching
+        if best_confidence > 0.95:
+            best_confidence = min(1.0, best_confidence + 0.05)  # Boost to 100%
         
-        return intersection / union if union > 0 else 0.0
+        return best_match, best_confidence, partial
+    
+    def match_status(self, name, confidence, partial=False):
+        """Map a match to the recognizer's status codes"""
+        if name and partial:
+            # Some gallery shards did not answer - the true identity may be among them
+            return "UNVERIFIED_MATCH"
+        if name and confidence > 0.9:  # High threshold for perfect recognition
+            return "PERFECT_MATCH"
+        elif name:
+            return "PARTIAL_MATCH"
+        return "NO_MATCH"
+    
+    def recognize_faces_batch(self, frames):
+        """Recognize every face in a batch of images.
+        
+        Detection runs per image, then all crops are embedded and matched in
+        one pass. Returns one dict per image with per-face bbox, identity,
+        confidence, status and stage timings (ms).
+        """
+        results = []
+        crops = []  # (result index, bbox, landmarks)
+        
+        for frame in frames:
+            start = time.perf_counter()
+            faces, landmarks = self.detect_faces_landmarked(frame) if frame is not None else ([], [])
+            results.append({
+                'faces': [],
+                'timings': {'detection_ms': (time.perf_counter() - start) * 1000,
+                            'embedding_ms': 0.0, 'matching_ms': 0.0}
+            })
+            for bbox, points in zip(faces, landmarks):
+                crops.append((len(results) - 1, bbox, points))
+        
+        # Submit every crop up front so the batcher can embed them together
+        start = time.perf_counter()
+        futures = []
+        for index, bbox, points in crops:
+            try:
+                futures.append(self.submit_face_embedding(frames[index], bbox, points))
+            except Exception:
+                futures.append(None)
+        
+        deadline = time.monotonic() + EMBEDDING_TIMEOUT
+        for (index, bbox, _), future in zip(crops, futures):
+            timings = results[index]['timings']
+            try:
+                embedding = (future.result(timeout=max(0.0, deadline - time.monotonic()))
+                             if future is not None else None)
+            except Exception:
+                embedding = None
+            # Batched embedding time is shared by every crop in the batch
+            timings['embedding_ms'] = (time.perf_counter() - start) * 1000
+            
+            face = {'bbox': [int(v) for v in bbox], 'identity': None, 'confidence': 0.0}
+            if embedding is None:
+                face['status'] = "EMBEDDING_FAILED"
+            else:
+                start = time.perf_counter()
+                name, confidence, partial = self.match_embedding(embedding)
+                timings['matching_ms'] += (time.perf_counter() - start) * 1000
+                face['status'] = self.match_status(name, confidence, partial)
+                if name:
+                    face['identity'] = name
+                    face['confidence'] = float(confidence)
+            results[index]['faces'].append(face)
+        
+        for result in results:
+            result['timings'] = {k: round(v, 2) for k, v in result['timings'].items()}
+        return results
     
     def recognize_face_perfect(self, frame):
         """Perfect face recognition with 100% accuracy"""
+        return self.recognize_face_located(frame)[:3]
+    
+    def recognize_face_located(self, frame):
+        """recognize_face_perfect plus the box of the matched face (None without a match)"""
         try:
             # Detect faces
-            faces = self.detect_faces(frame)
+            faces, landmarks = self.detect_faces_landmarked(frame)
             
             if len(faces) == 0:
-                return None, 0.0, "NO_FACE_DETECTED"
+                return None, 0.0, "NO_FACE_DETECTED", None
             
             # Process each detected face
             best_match = None
             best_confidence = 0.0
             best_face_coords = None
+            best_partial = False
             
-            for face_coords in faces:
+            for face_coords, points in zip(faces, landmarks):
                 # Extract high-quality embedding
-                face_embedding = self.extract_face_embedding_from_frame(frame, face_coords)
+                face_embedding = self.extract_face_embedding_from_frame(frame, face_coords, points)
                 
                 if face_embedding is None:
                     continue
                 
-                # Compare with all known faces using multiple metrics
-                for i, known_embedding in enumerate(self.known_encodings):
-                    if known_embedding is None:
-                        continue
-                    
-                    # Calculate similarity using multiple methods
-                    cosine_sim = 1 - cosine(face_embedding, known_embedding)
-                    euclidean_sim = 1 / (1 + euclidean(face_embedding, known_embedding))
-                    
-                    # Combined confidence (weighted average)
-                    confidence = 0.7 * cosine_sim + 0.3 * euclidean_sim
-                    
-                    # Apply quality boost for perfect matching
-                    if confidence > 0.95:
-                        confidence = min(1.0, confidence + 0.05)  # Boost to 100%
-                    
-                    if confidence > best_confidence:
-                        best_confidence = confidence
-                        best_match = self.known_names[i]
-                        best_face_coords = face_coords
+                name, confidence, partial = self.match_embedding(face_embedding)
+                if name and confidence > best_confidence:
+                    best_confidence = confidence
+                    best_match = name
+                    best_face_coords = face_coords
+                    best_partial = partial
             
-            if best_match and best_confidence > 0.9:  # High threshold for perfect recognition
-                return best_match, best_confidence, "PERFECT_MATCH"
-            elif best_match:
-                return best_match, best_confidence, "PARTIAL_MATCH"
+            if best_match:
+                status = self.match_status(best_match, best_confidence, best_partial)
+                return best_match, best_confidence, status, best_face_coords
             else:
-                return None, 0.0, "NO_MATCH"
+                return None, 0.0, "NO_MATCH", None
                 
         except Exception as e:
             print(f"❌ Error in perfect recognition: {e}")
-            return None, 0.0, "RECOGNITION_ERROR"
+            return None, 0.0, "RECOGNITION_ERROR", None
     
     def add_perfect_user(self, frame, name):
         """Add user with perfect face encoding"""
         try:
             # Detect faces
-            faces = self.detect_faces(frame)
+            faces, landmarks = self.detect_faces_landmarked(frame)
             
             if len(faces) == 0:
                 return False, "No face detected"
@@ -246,41 +381,64 @@ class PerfectFaceRecognizer:
                 return False, "Multiple faces detected"
             
             # Extract perfect embedding
-            face_embedding = self.extract_face_embedding_from_frame(frame, faces[0])
+            face_embedding = self.extract_face_embedding_from_frame(frame, faces[0], landmarks[0])
             
             if face_embedding is None:
                 return False, "Cannot extract face embedding"
             
             # Add to known faces
-            self.known_encodings.append(face_embedding)
-            self.known_names.append(name)
+            existing = [e for e, n in zip(self.known_encodings, self.known_names) if n == name]
+            if not existing and name in self.templates:
+                # Reused template without loaded embeddings - extend its medoids until the next load rebuilds it
+                existing = list(self.templates[name]['medoids'])
+            template = build_template(existing + [face_embedding])
+            self.add_identity(name, [face_embedding], template)
             
             # Save to database
-            self.save_to_database()
+            self.save_to_database([face_embedding], [name])
             
             return True, f"Perfectly enrolled {name} with 100% accuracy"
             
         except Exception as e:
             return False, f"Error: {str(e)}"
     
-    def save_to_database(self):
-        """Save perfect encodings to database"""
+    def save_to_database(self, encodings, names):
+        """Append new encodings to the stored gallery and store their identities' templates.
+
+        Appends to what is on disk rather than writing the in-memory lists,
+        which lack the image entries behind reused templates.
+        """
         try:
-            from utils import encrypt_data
-            data = (self.known_encodings, self.known_names)
-            with open('authorized_faces.pkl', 'wb') as f:
-                f.write(encrypt_data(data))
-            print(f"✅ Saved {len(self.known_names)} perfect face encodings")
+            with gallery_lock:
+                data = load_gallery()
+                data['encodings'].extend(encodings)
+                data['names'].extend(names)
+                templates = data.setdefault('templates', {})
+                for name in set(names):
+                    templates[name] = dict(self.templates[name], entries=data['names'].count(name))
+                save_gallery(data)
+            print(f"✅ Saved {len(encodings)} perfect face encodings ({len(data['names'])} in gallery)")
         except Exception as e:
             print(f"❌ Error saving database: {e}")
 
-# Global perfect recognizer instance
-perfect_recognizer = PerfectFaceRecognizer()
+# Global perfect recognizer instance (built on first use - loads models and the gallery)
+perfect_recognizer = None
+perfect_recognizer_lock = threading.Lock()
+
+def get_perfect_recognizer():
+    """Get or create the perfect recognizer (built once, even when startup and requests race)"""
+    global perfect_recognizer
+    if perfect_recognizer is None:
+        with perfect_recognizer_lock:
+            if perfect_recognizer is None:
+                perfect_recognizer = PerfectFaceRecognizer()
+                status_snapshot.models_loaded()
+    return perfect_recognizer
 
 def recognize_face_perfect(frame):
     """Perfect face recognition function"""
-    return perfect_recognizer.recognize_face_perfect(frame)
+    return get_perfect_recognizer().recognize_face_perfect(frame)
 
 def add_perfect_user(frame, name):
     """Add user with perfect recognition"""
-    return perfect_recognizer.add_perfect_user(frame, name)
+    return get_perfect_recognizer().add_perfect_user(frame, name)
@@ -1,10 +1,12 @@
 import cv2
 import os
+import sys
 import time
 import numpy as np
 from detector import detect_faces, extract_face_crop
-from utils import encrypt_data
-import pickle
+from boxes import largest
+from gallery import append_to_gallery
+from frame_quality import AutoCapture
 
 class ProductionEnrollment:
     def __init__(self):
@@ -44,27 +46,59 @@ class ProductionEnrollment:
     
     def update_encrypted_data(self, name):
         """Update encrypted user database"""
-        try:
-            with open('authorized_faces.pkl', 'rb') as f:
-                key = open('key.key', 'rb').read()
-                from cryptography.fernet import Fernet
-                fernet = Fernet(key)
-                encrypted = f.read()
-                decrypted = fernet.decrypt(encrypted)
-                data = pickle.loads(decrypted)
-        except:
-            data = {'encodings': [], 'names': []}
-        
-        # Add new user
+        # Add new user (serialized with other gallery writers, atomic, templates kept)
         user_dir = f"known_faces/{name}"
-        data['encodings'].append(user_dir)
-        data['names'].append(name)
+        append_to_gallery([user_dir], [name])
+    
+    def auto_capture_poses(self, cap, pose_timeout=10.0):
+        """Capture every pose hands-free, keeping the best-scoring frame per pose.
+        
+        Returns {pose: [crop]} (poses that timed out are left for manual
+        capture), or None if the user pressed ESC.
+        """
+        auto = AutoCapture(self.enrollment_poses)
+        face_images = {}
+        pose_started = time.time()
         
-        # Save back encrypted
-        with open('authorized_faces.pkl', 'wb') as f:
-            f.write(encrypt_data(data))
+        while not auto.complete:
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            
+            self.current_pose_index = auto.pose_index
+            faces = detect_faces(frame)
+            captured_pose = auto.feed(frame, faces, extract_face_crop)
+            
+            if captured_pose:
+                face_images[captured_pose] = auto.captured[captured_pose]
+                print(f"  ✅ Auto-captured {captured_pose} pose!")
+                pose_started = time.time()
+                continue
+            
+            if time.time() - pose_started > pose_timeout:
+                print(f"  ⏭️ No good {auto.current_pose} frame - leaving it for manual capture")
+                auto.skip_pose()
+                pose_started = time.time()
+                continue
+            
+            # Draw UI
+            cv2.putText(frame, f"AUTO {auto.pose_index + 1}/{len(self.enrollment_poses)}: {auto.current_pose.upper()}",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            cv2.putText(frame, self.get_pose_instructions(), (10, 70),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+            if auto.best:
+                cv2.putText(frame, f"Quality: {auto.best[0]:.2f}", (10, 110),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            for (x1, y1, x2, y2) in faces:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 165, 255), 2)
+            
+            cv2.imshow('Production Enrollment', frame)
+            if cv2.waitKey(1) & 0xFF == 27:  # ESC
+                return None
+        
+        return face_images
     
-    def enroll_user(self, name):
+    def enroll_user(self, name, auto_capture=False):
         """Complete enrollment process with multiple poses"""
         print(f"🎯 Production Enrollment: {name}")
         print("=" * 50)
@@ -119,9 +153,19 @@ class ProductionEnrollment:
             time.sleep(1)
         
         face_images = {}
+        if auto_capture:
+            face_images = self.auto_capture_poses(cap)
+            if face_images is None:
+                print("❌ Enrollment cancelled")
+                cap.release()
+                cv2.destroyAllWindows()
+                return False
         
         # Auto-capture all poses with manual control
         for pose_index, current_pose in enumerate(self.enrollment_poses):
+            if current_pose in face_images:
+                continue
+            self.current_pose_index = pose_index
             print(f"\n📸 Capturing {current_pose.upper()} pose...")
             
             # Initialize pose capture
@@ -152,7 +196,6 @@ class ProductionEnrollment:
                 # Process detected faces
                 for bbox in faces:
                     x1, y1, x2, y2 = bbox
-                    face_img = extract_face_crop(frame, bbox)
                     
                     if len(face_images[current_pose]) >= self.max_faces_per_pose:
                         # Already captured - show success
@@ -174,15 +217,13 @@ class ProductionEnrollment:
                 elif key == 32:  # SPACE
                     # Try to capture current frame
                     if faces:
-                        for bbox in faces:
-                            x1, y1, x2, y2 = bbox
-                            face_img = extract_face_crop(frame, bbox)
-                            
-                            if face_img is not None:
-                                face_images[current_pose].append(face_img.copy())
-                                print(f"  ✅ Captured {current_pose} pose!")
-                                captured = True
-                                break
+                        # The largest face is the person enrolling
+                        face_img = extract_face_crop(frame, largest(faces))
+                        
+                        if face_img is not None:
+                            face_images[current_pose].append(face_img.copy())
+                            print(f"  ✅ Captured {current_pose} pose!")
+                            captured = True
                     
                     if not captured:
                         print("  ❌ No face detected. Try again.")
@@ -219,8 +260,11 @@ def main():
         print("❌ Name cannot be empty")
         return
     
+    # --auto: hands-free capture of the best frame per pose
+    auto_capture = '--auto' in sys.argv
+    
     enrollment = ProductionEnrollment()
-    success = enrollment.enroll_user(name)
+    success = enrollment.enroll_user(name, auto_capture=auto_capture)
     
     if success:
         print(f"\n🎉 User '{name}' successfully enrolled!")
@@ -0,0 +1,168 @@
+"""On-demand profiling of the running server.
+
+Two time-bounded modes, one at a time per process:
+
+- sampling: a background thread snapshots every thread's stack at a fixed
+  interval and returns collapsed stacks ("thread;outer;...;inner count"),
+  the input format of flamegraph.pl and speedscope.
+- cprofile: deterministic cProfile of the inference pool workers, merged
+  across workers into a pstats file (snakeviz, gprof2dot, flameprof).
+
+Nothing runs while no profile is in progress: the sampler thread only
+exists for the duration, and the inference workers only check one
+attribute per task.
+"""
+import os
+import sys
+import time
+import hmac
+import pstats
+import cProfile
+import tempfile
+import threading
+from functools import wraps
+
+from flask import jsonify, request
+
+from config import ADMIN_TOKEN, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS
+
+PROFILE_MODES = ('sampling', 'cprofile')
+
+# One profile at a time - concurrent profiles would distort each other
+profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already running"""
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads; counts identical stacks"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL_MS / 1000.0):
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+
+    def sample(self, skip_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """Sample for `seconds` on the calling thread (which is left out of the stacks)"""
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+            self.sample(me)
+            next_sample += self.interval
+        return self
+
+    def collapsed(self):
+        """Folded stacks, heaviest first"""
+        lines = [f"{stack} {count}" for stack, count in sorted(self.counts.items(), key=lambda kv: -kv[1])]
+        return '\n'.join(lines) + '\n'
+
+
+class TaskProfiler:
+    """cProfile of every task the inference workers run while installed.
+
+    cProfile hooks a single thread, so each worker gets its own profile
+    and they are merged at the end.
+    """
+
+    def __init__(self):
+        self.profiles = {}  # thread ident -> cProfile.Profile
+        self.lock = threading.Lock()
+        self.tasks = 0
+
+    def runcall(self, fn, *args, **kwargs):
+        ident = threading.get_ident()
+        with self.lock:
+            profile = self.profiles.setdefault(ident, cProfile.Profile())
+            self.tasks += 1
+        return profile.runcall(fn, *args, **kwargs)
+
+    def run(self, pool, seconds):
+        pool.profiler = self
+        try:
+            time.sleep(seconds)
+        finally:
+            pool.profiler = None
+        return self
+
+    def pstats_bytes(self):
+        """Merged stats in the marshal format pstats.Stats() loads; None if no task ran"""
+        with self.lock:
+            profiles = list(self.profiles.values())
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        fd, path = tempfile.mkstemp(suffix='.pstats')
+        os.close(fd)
+        try:
+            stats.dump_stats(path)
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+def run_profile(mode, seconds, interval_ms=PROFILE_SAMPLE_INTERVAL_MS):
+    """Run one profile; returns (artifact bytes or text, summary dict)"""
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+    if not profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        started = time.monotonic()
+        if mode == 'sampling':
+            profiler = SamplingProfiler(max(1.0, float(interval_ms)) / 1000.0).run(seconds)
+            artifact = profiler.collapsed()
+            summary = {'samples': profiler.samples, 'stacks': len(profiler.counts)}
+        else:
+            from inference_pool import get_inference_pool
+            profiler = TaskProfiler().run(get_inference_pool(), seconds)
+            artifact = profiler.pstats_bytes()
+            summary = {'tasks': profiler.tasks, 'threads': len(profiler.profiles)}
+        summary.update(mode=mode, seconds=round(time.monotonic() - started, 3))
+        return artifact, summary
+    finally:
+        profile_lock.release()
+
+
+def admin_required(view):
+    """Flask view decorator: requires ADMIN_TOKEN (X-Admin-Token or Bearer); 404 when unset"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'success': False, 'error': 'Admin endpoints are disabled'}), 404
+        supplied = request.headers.get('X-Admin-Token', '')
+        authorization = request.headers.get('Authorization', '')
+        if not supplied and authorization.startswith('Bearer '):
+            supplied = authorization[len('Bearer '):]
+        if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'success': False, 'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
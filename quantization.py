@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Quantized embedding storage with asymmetric (float query, quantized gallery) scoring.
+
+Storage modes:
+    float32  - unchanged
+    float16  - half precision, 2x smaller
+    int8     - symmetric per-vector scale (max |x| / 127), 4x smaller
+
+Queries stay float32; gallery rows are dequantized block by block while
+scoring, so memory never holds a float32 copy of the whole gallery.
+
+Evaluation (memory saved and accuracy delta against float32):
+    python quantization.py evaluate
+    python quantization.py evaluate --identities 20000 --images 5 --dim 512
+    python quantization.py evaluate --gallery authorized_faces.pkl
+"""
+import time
+import argparse
+
+import numpy as np
+
+STORAGE_MODES = ('float32', 'float16', 'int8')
+
+# Rows dequantized per step while scoring (bounds the temporary float32 buffer)
+SCORE_BLOCK_ROWS = 8192
+
+
+def quantize_rows(matrix, storage):
+    """(data, per-row scales or None) for a float matrix in the given storage"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if storage == 'float32':
+        return matrix, None
+    if storage == 'float16':
+        return matrix.astype(np.float16), None
+    if storage == 'int8':
+        scales = np.abs(matrix).max(axis=-1) / 127.0
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        data = np.rint(matrix / scales[..., None]).astype(np.int8)
+        return data, scales
+    raise ValueError(f"Unknown storage '{storage}' (expected one of {', '.join(STORAGE_MODES)})")
+
+
+def dequantize_rows(data, scales):
+    rows = data.astype(np.float32)
+    if scales is not None:
+        rows *= scales[..., None]
+    return rows
+
+
+class QuantizedMatrix:
+    """Row-wise quantized embedding matrix scored against float queries"""
+
+    def __init__(self, matrix, storage='float32'):
+        self.storage = storage
+        self.data, self.scales = quantize_rows(np.atleast_2d(matrix), storage)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def blocks(self):
+        """(start, float32 rows) in blocks of SCORE_BLOCK_ROWS"""
+        for start in range(0, len(self.data), SCORE_BLOCK_ROWS):
+            stop = start + SCORE_BLOCK_ROWS
+            scales = self.scales[start:stop] if self.scales is not None else None
+            yield start, dequantize_rows(self.data[start:stop], scales)
+
+    def dequantize(self):
+        if self.storage == 'float32':
+            return self.data
+        return dequantize_rows(self.data, self.scales)
+
+    def dot(self, query):
+        """Asymmetric inner products of every row with a float32 query"""
+        query = np.asarray(query, dtype=np.float32)
+        if self.storage == 'float32':
+            return self.data @ query
+        if self.storage == 'int8':
+            # int8 rows times the float query, then one multiply by the row scales
+            out = np.empty(len(self.data), dtype=np.float32)
+            for start in range(0, len(self.data), SCORE_BLOCK_ROWS):
+                block = self.data[start:start + SCORE_BLOCK_ROWS]
+                out[start:start + len(block)] = block.astype(np.float32) @ query
+            return out * self.scales
+        out = np.empty(len(self.data), dtype=np.float32)
+        for start, rows in self.blocks():
+            out[start:start + len(rows)] = rows @ query
+        return out
+
+    def squared_norms(self):
+        """Squared norms of the stored (dequantized) rows"""
+        out = np.empty(len(self.data), dtype=np.float32)
+        for start, rows in self.blocks():
+            out[start:start + len(rows)] = np.einsum('ij,ij->i', rows, rows)
+        return out
+
+
+class PackedEmbedding:
+    """One gallery embedding in compact storage.
+
+    Converts back with np.asarray(packed, dtype=np.float32), so code that
+    treats gallery encodings as arrays keeps working.
+    """
+    __slots__ = ('storage', 'data', 'scale')
+
+    def __init__(self, embedding, storage):
+        data, scales = quantize_rows(np.asarray(embedding, dtype=np.float32)[None, :], storage)
+        self.storage = storage
+        self.data = data[0]
+        self.scale = float(scales[0]) if scales is not None else None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.data.astype(np.float32)
+        if self.scale is not None:
+            values *= self.scale
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __getstate__(self):
+        return self.storage, self.data, self.scale
+
+    def __setstate__(self, state):
+        self.storage, self.data, self.scale = state
+
+
+def pack_encodings(encodings, storage):
+    """Gallery encodings with numeric entries in `storage`; paths and None pass through"""
+    packed = []
+    for encoding in encodings:
+        if encoding is None or isinstance(encoding, str):
+            packed.append(encoding)
+        elif storage == 'float32':
+            packed.append(np.asarray(encoding, dtype=np.float32) if isinstance(encoding, PackedEmbedding)
+                          else encoding)
+        elif isinstance(encoding, PackedEmbedding) and encoding.storage == storage:
+            packed.append(encoding)
+        else:
+            packed.append(PackedEmbedding(encoding, storage))
+    return packed
+
+
+# Evaluation
+
+def synthetic_gallery(identities, images, dim, noise=0.35, seed=0):
+    """Clustered unit embeddings: (gallery rows, owner ids, held-out queries, query owner ids)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((identities, dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    def samples(count):
+        owners = np.repeat(np.arange(identities), count)
+        rows = centers[owners] + noise * rng.standard_normal((len(owners), dim), dtype=np.float32) / np.sqrt(dim)
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True), owners
+
+    gallery, owners = samples(images)
+    queries, query_owners = samples(1)
+    return gallery, owners, queries, query_owners
+
+
+def gallery_from_file(path, seed=0):
+    """Numeric encodings of a saved gallery; one image per identity is held out as its query"""
+    from gallery import load_gallery
+    data = load_gallery(path)
+    rows, names = [], []
+    for encoding, name in zip(data['encodings'], data['names']):
+        if encoding is None or isinstance(encoding, str):
+            continue
+        rows.append(np.asarray(encoding, dtype=np.float32))
+        names.append(name)
+    if not rows:
+        raise ValueError(f"No numeric embeddings in {path}")
+    dim = max({len(r) for r in rows}, key=lambda d: sum(len(r) == d for r in rows))
+    keep = [i for i, r in enumerate(rows) if len(r) == dim]
+    ids = {name: i for i, name in enumerate(dict.fromkeys(names[i] for i in keep))}
+    owners = np.array([ids[names[i]] for i in keep])
+    matrix = np.vstack([rows[i] for i in keep])
+
+    rng = np.random.default_rng(seed)
+    query_index = []
+    for owner in np.unique(owners):
+        members = np.flatnonzero(owners == owner)
+        if len(members) > 1:
+            query_index.append(rng.choice(members))
+    query_mask = np.zeros(len(owners), dtype=bool)
+    query_mask[query_index] = True
+    return matrix[~query_mask], owners[~query_mask], matrix[query_mask], owners[query_mask]
+
+
+def score_all(matrix, squared_norms, query):
+    """Recognizer score (0.7 cosine + 0.3 inverse euclidean) per gallery row"""
+    dots = matrix.dot(query)
+    query_sq = float(query @ query)
+    cosine = dots / np.maximum(np.sqrt(squared_norms * query_sq), 1e-12)
+    euclidean = np.sqrt(np.maximum(squared_norms + query_sq - 2.0 * dots, 0.0))
+    return 0.7 * cosine + 0.3 / (1.0 + euclidean)
+
+
+def evaluate(gallery, owners, queries, query_owners, storages=STORAGE_MODES):
+    """Memory, latency and accuracy of each storage mode against float32"""
+    reference = QuantizedMatrix(gallery, 'float32')
+    reference_norms = reference.squared_norms()
+    reference_scores = [score_all(reference, reference_norms, q) for q in queries]
+    reference_top = np.array([owners[np.argmax(s)] for s in reference_scores])
+
+    results = []
+    for storage in storages:
+        matrix = QuantizedMatrix(gallery, storage)
+        norms = matrix.squared_norms()
+        start = time.perf_counter()
+        scores = [score_all(matrix, norms, q) for q in queries]
+        elapsed = time.perf_counter() - start
+        top = np.array([owners[np.argmax(s)] for s in scores])
+        deltas = np.concatenate([np.abs(s - r) for s, r in zip(scores, reference_scores)])
+        best_deltas = np.array([abs(s.max() - r.max()) for s, r in zip(scores, reference_scores)])
+        results.append({
+            'storage': storage,
+            'bytes': matrix.nbytes,
+            'compression': reference.nbytes / matrix.nbytes,
+            'ms_per_query': elapsed / len(queries) * 1000,
+            'top1_accuracy': float(np.mean(top == query_owners)),
+            'top1_agreement': float(np.mean(top == reference_top)),
+            'score_delta_mean': float(deltas.mean()),
+            'score_delta_max': float(deltas.max()),
+            'best_score_delta_max': float(best_deltas.max()),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized gallery storage tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    evaluate_parser = subparsers.add_parser('evaluate', help="memory savings and accuracy delta per storage mode")
+    evaluate_parser.add_argument('--gallery', help="encrypted gallery file (default: synthetic gallery)")
+    evaluate_parser.add_argument('--identities', type=int, default=10000)
+    evaluate_parser.add_argument('--images', type=int, default=3, help="gallery images per identity")
+    evaluate_parser.add_argument('--dim', type=int, default=512, help="512 = ArcFace, 4096 = VGG-Face")
+    evaluate_parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.gallery:
+        gallery, owners, queries, query_owners = gallery_from_file(args.gallery)
+        source = args.gallery
+    else:
+        gallery, owners, queries, query_owners = synthetic_gallery(args.identities, args.images, args.dim)
+        source = f"synthetic ({args.identities} identities x {args.images} images, {args.dim}-d)"
+    if len(queries) == 0:
+        print("❌ Need identities with at least two embeddings to hold one out as a query")
+        return
+    if len(queries) > args.queries:
+        pick = np.random.default_rng(1).choice(len(queries), args.queries, replace=False)
+        queries, query_owners = queries[pick], query_owners[pick]
+
+    print(f"📏 Gallery: {source} - {len(gallery)} rows, {len(queries)} queries")
+    print(f"   {'storage':<9}{'MB':>9}{'ratio':>7}{'ms/query':>10}{'top1':>8}{'agree':>8}"
+          f"{'mean dScore':>13}{'max dScore':>12}")
+    for result in evaluate(gallery, owners, queries, query_owners):
+        print(f"   {result['storage']:<9}{result['bytes'] / 2 ** 20:>9.1f}{result['compression']:>6.1f}x"
+              f"{result['ms_per_query']:>10.2f}{result['top1_accuracy']:>8.3f}{result['top1_agreement']:>8.3f}"
+              f"{result['score_delta_mean']:>13.5f}{result['score_delta_max']:>12.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import { BrowserRouter as Router, Routes, Route, Link, useLocation } from 'react
 import { CameraComponent as Camera, UsersComponent as Users, Dashboard, SettingsComponent as Settings, EnrollmentComponent, SimpleRecognitionComponent } from './components/index';
 import { Camera as CameraIcon, Users as UsersIcon, Layout } from 'lucide-react';
 import { startCamera, stopCamera, getSystemStatus, getEnrolledUsers } from './utils/api';
+import { subscribeToEvents } from './utils/events';
 import './App.css';
 
 function AppContent() {
@@ -19,21 +20,44 @@ function AppContent() {
   useEffect(() => {
     fetchSystemStatus();
     fetchEnrolledUsers();
-    const interval = setInterval(fetchSystemStatus, 5000);
-    return () => clearInterval(interval);
+    return subscribeToEvents({
+      camera: (data) => setSystemStatus((prev) => ({
+        ...prev,
+        cameraActive: data.camera_active,
+        recognitionActive: data.recognition_active
+      })),
+      recognition: (data, event) => {
+        setSystemStatus((prev) => ({
+          ...prev,
+          lastRecognition: {
+            identity: data.name,
+            confidence: `${(data.confidence * 100).toFixed(1)}%`,
+            timestamp: new Date(event.time * 1000).toLocaleString()
+          }
+        }));
+        if (data.name && data.name !== 'Unknown' && data.name !== lastSpokenName.current) {
+          speakName(data.name);
+          lastSpokenName.current = data.name;
+          setTimeout(() => { lastSpokenName.current = null; }, 5000);
+        }
+      },
+      enrollment: (data) => {
+        if (data.users) {
+          setEnrolledUsers(data.users);
+        }
+      }
+    });
   }, []);
 
   const fetchSystemStatus = async () => {
     try {
       const response = await getSystemStatus();
-      setSystemStatus(response.data);
-
-      const latest = response.data.latest_recognition;
-      if (latest && latest.name && latest.name !== lastSpokenName.current) {
-        speakName(latest.name);
-        lastSpokenName.current = latest.name;
-        setTimeout(() => { lastSpokenName.current = null; }, 5000);
-      }
+      setSystemStatus((prev) => ({
+        ...prev,
+        cameraActive: response.data.camera_active,
+        recognitionActive: response.data.recognition_active,
+        enrolledUsers: response.data.enrolled_users
+      }));
     } catch (error) {
       console.error('Error fetching system status:', error);
     }
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Users, Camera as CameraIcon, UserPlus, Zap } from 'lucide-react';
 import { getEnrolledUsers, getSystemStatus, startCamera } from '../utils/api';
+import { subscribeToEvents } from '../utils/events';
 
 export function Dashboard() {
   const navigate = useNavigate();
@@ -14,8 +15,18 @@ export function Dashboard() {
 
   useEffect(() => {
     fetchDashboardData();
-    const interval = setInterval(fetchDashboardData, 5000);
-    return () => clearInterval(interval);
+    return subscribeToEvents({
+      camera: (data) => setStats((prev) => ({
+        ...prev,
+        cameraActive: data.camera_active,
+        recognitionActive: data.recognition_active
+      })),
+      enrollment: (data) => {
+        if (data.enrolled_users !== undefined) {
+          setStats((prev) => ({ ...prev, enrolledUsers: data.enrolled_users }));
+        }
+      }
+    });
   }, []);
 
   const fetchDashboardData = async () => {
@@ -1,16 +1,65 @@
 import React, { useState, useEffect } from 'react';
 import { Camera, User, X, Check, AlertCircle, Loader } from 'lucide-react';
-import { startEnrollment, captureEnrollment, cancelEnrollment } from '../utils/api';
+import { startEnrollment, captureEnrollment, cancelEnrollment, getEnrollmentJob, retryEnrollmentJob } from '../utils/api';
+import { subscribeToEvents } from '../utils/events';
 
 export function EnrollmentComponent({ onEnrollmentComplete }) {
   const [isEnrolling, setIsEnrolling] = useState(false);
   const [userName, setUserName] = useState('');
+  const [sessionId, setSessionId] = useState(null);
   const [currentPose, setCurrentPose] = useState('');
   const [poseIndex, setPoseIndex] = useState(0);
   const [totalPoses, setTotalPoses] = useState(5);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
+  const [job, setJob] = useState(null);
+
+  const handleJobUpdate = (update) => {
+    setJob(update);
+    if (update.status === 'succeeded') {
+      setSuccess(`Enrollment successful for ${update.name}!`);
+      if (onEnrollmentComplete) {
+        onEnrollmentComplete();
+      }
+    } else if (update.status === 'failed') {
+      setSuccess('');
+      setError(`Enrollment for ${update.name} failed: ${update.error}`);
+    }
+  };
+
+  // Follow the background finalization job until it finishes
+  const activeJobId = job && job.status !== 'succeeded' && job.status !== 'failed' ? job.job_id : null;
+
+  useEffect(() => {
+    if (!activeJobId) {
+      return undefined;
+    }
+    const jobId = activeJobId;
+    const unsubscribe = subscribeToEvents({
+      enrollment_job: (update) => {
+        if (update.job_id === jobId) {
+          handleJobUpdate(update);
+        }
+      },
+    });
+    // The job may have finished before the stream connected
+    getEnrollmentJob(jobId)
+      .then((response) => handleJobUpdate(response.data.job))
+      .catch(() => {});
+    return unsubscribe;
+  }, [activeJobId]);
+
+  const handleRetryJob = async () => {
+    try {
+      setError('');
+      const response = await retryEnrollmentJob(job.job_id);
+      setJob(response.data.job);
+      setSuccess(`Retrying enrollment for ${response.data.job.name}...`);
+    } catch (error) {
+      setError('Retry failed: ' + (error.response?.data?.error || error.message));
+    }
+  };
 
   const handleStartEnrollment = async () => {
     if (!userName.trim()) {
@@ -27,6 +76,7 @@ export function EnrollmentComponent({ onEnrollmentComplete }) {
       
       if (response.data.success) {
         setIsEnrolling(true);
+        setSessionId(response.data.session_id);
         setCurrentPose(response.data.current_pose);
         setPoseIndex(response.data.pose_index);
         setTotalPoses(response.data.total_poses);
@@ -45,20 +95,18 @@ export function EnrollmentComponent({ onEnrollmentComplete }) {
       setError('');
       setSuccess('');
       
-      const response = await captureEnrollment(userName);
+      const response = await captureEnrollment(userName, sessionId);
       
       if (response.data.success) {
         if (response.data.complete) {
+          // Finalization continues in the background; the parent is notified when the job succeeds
           setSuccess(response.data.message);
+          setJob(response.data.job);
           setIsEnrolling(false);
+          setSessionId(null);
           setUserName('');
           setCurrentPose('');
           setPoseIndex(0);
-          
-          // Notify parent component
-          if (onEnrollmentComplete) {
-            onEnrollmentComplete();
-          }
         } else {
           setCurrentPose(response.data.next_pose);
           setPoseIndex(response.data.pose_index);
@@ -74,8 +122,9 @@ export function EnrollmentComponent({ onEnrollmentComplete }) {
 
   const handleCancel = async () => {
     try {
-      await cancelEnrollment();
+      await cancelEnrollment(sessionId);
       setIsEnrolling(false);
+      setSessionId(null);
       setUserName('');
       setCurrentPose('');
       setPoseIndex(0);
@@ -117,6 +166,33 @@ export function EnrollmentComponent({ onEnrollmentComplete }) {
               </div>
             )}
 
+            {job && job.status !== 'succeeded' && (
+              <div className="mb-4 bg-gray-50 border border-gray-200 rounded-md p-4">
+                <div className="flex justify-between items-center mb-2">
+                  <span className="text-sm font-medium text-gray-700">
+                    Finishing enrollment for {job.name}
+                    {job.stage ? ` (${job.stage.replace('_', ' ')})` : ''}
+                  </span>
+                  {job.status === 'failed' ? (
+                    <button
+                      onClick={handleRetryJob}
+                      className="text-sm text-blue-600 hover:text-blue-800 font-medium"
+                    >
+                      Retry
+                    </button>
+                  ) : (
+                    <Loader className="w-4 h-4 text-gray-500 animate-spin" />
+                  )}
+                </div>
+                <div className="w-full bg-gray-200 rounded-full h-2">
+                  <div
+                    className="bg-blue-600 h-2 rounded-full transition-all duration-300"
+                    style={{ width: `${Math.round(job.progress * 100)}%` }}
+                  />
+                </div>
+              </div>
+            )}
+
             {!isEnrolling ? (
               /* Start Enrollment Form */
               <div className="space-y-4">
@@ -16,6 +16,7 @@ import {
   startCamera,
   stopCamera
 } from '../utils/api';
+import { subscribeToEvents } from '../utils/events';
 
 export function SimpleRecognitionComponent() {
   const [cameraActive, setCameraActive] = useState(false);
@@ -29,8 +30,14 @@ export function SimpleRecognitionComponent() {
 
   useEffect(() => {
     fetchStatus();
-    const interval = setInterval(fetchStatus, 5000);
-    return () => clearInterval(interval);
+    return subscribeToEvents({
+      camera: (data) => setCameraActive(data.camera_active),
+      enrollment: (data) => {
+        if (data.users) {
+          setEnrolledUsers(data.users);
+        }
+      }
+    });
   }, []);
 
   const fetchStatus = async () => {
@@ -33,8 +33,10 @@ export const getEnrolledUsers = () => apiCall('/api/users');
 
 // Enrollment functions
 export const startEnrollment = (userName) => apiCall('/api/enrollment/start', 'POST', { name: userName });
-export const captureEnrollment = (userName) => apiCall('/api/enrollment/capture', 'POST', { name: userName });
-export const cancelEnrollment = () => apiCall('/api/enrollment/cancel', 'POST');
+export const captureEnrollment = (userName, sessionId) => apiCall('/api/enrollment/capture', 'POST', { name: userName, session_id: sessionId });
+export const cancelEnrollment = (sessionId) => apiCall('/api/enrollment/cancel', 'POST', { session_id: sessionId });
+export const getEnrollmentJob = (jobId) => apiCall(`/api/enrollment/jobs/${jobId}`);
+export const retryEnrollmentJob = (jobId) => apiCall(`/api/enrollment/jobs/${jobId}/retry`, 'POST');
 
 // User CRUD functions
 export const deleteUser = (userName) => apiCall(`/api/users/${encodeURIComponent(userName)}`, 'DELETE');
@@ -44,3 +46,10 @@ export const updateUser = (userName, newName) => apiCall(`/api/users/${encodeURI
 export const simpleRecognize = () => apiCall('/api/simple/recognize', 'POST');
 export const simpleEnroll = (userName) => apiCall('/api/simple/enroll', 'POST', { name: userName });
 export const getSimpleStatus = () => apiCall('/api/simple/status');
+
+// Upload recognition (works without a server-side camera)
+export const recognizeImages = (files) => {
+  const form = new FormData();
+  Array.from(files).forEach((file) => form.append('images', file));
+  return axios.post(`${API_BASE_URL}/api/recognize/batch`, form);
+};
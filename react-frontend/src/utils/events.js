@@ -0,0 +1,20 @@
+// Server-pushed dashboard events (recognition, enrollment, camera).
+// EventSource reconnects on its own and resends Last-Event-ID, so the
+// server replays anything missed while the connection was down.
+
+export const subscribeToEvents = (handlers) => {
+  const source = new EventSource('/api/events');
+
+  Object.entries(handlers).forEach(([eventType, handler]) => {
+    source.addEventListener(eventType, (message) => {
+      try {
+        const event = JSON.parse(message.data);
+        handler(event.data, event);
+      } catch (error) {
+        console.error(`Event Error (${eventType}):`, error);
+      }
+    });
+  });
+
+  return () => source.close();
+};
@@ -1,25 +1,14 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
 from utils import decrypt_data
 import os
+from liveness import anti_spoof_score
+from embedding_cache import get_embedding_cache
 
 def check_liveness(face_img):
-    """Anti-spoofing check using DeepFace - more lenient for testing"""
-    try:
-        result = DeepFace.extract_faces(
-            img_path=face_img,
-            anti_spoofing=True,
-            enforce_detection=False
-        )
-        if result and len(result) > 0:
-            # Lower the threshold for testing - was 0.8, now 0.3
-            is_real = result[0].get('is_real', 0) > 0.3
-            return is_real
-    except:
-        # If anti-spoofing fails, assume it's real for testing
-        return True
-    return False
+    """Anti-spoofing check using DeepFace; a check that cannot run counts as failed"""
+    verdict = anti_spoof_score(face_img)
+    return verdict is not None and verdict[0]
 
 def recognize_face(face_img, tolerance=0.8):  # Increased tolerance from 0.6 to 0.8
     """Complete recognition pipeline with liveness check using DeepFace"""
@@ -35,41 +24,47 @@ def recognize_face(face_img, tolerance=0.8):  # Increased tolerance from 0.6 to
         return None, 0.0, "NO_KNOWN_FACES"
     
     # 3. Try to match against known faces using DeepFace
+    # Embed the query once; stored images come from the embedding cache
+    from deepface import DeepFace
+    from deepface.modules.verification import find_cosine_distance, find_threshold
+    model_name, detector = 'VGG-Face', 'opencv'
+    cache = get_embedding_cache()
+    
+    def represent(img):
+        faces = DeepFace.represent(img_path=img, model_name=model_name,
+                                   enforce_detection=False, detector_backend=detector)
+        return faces[0]['embedding'] if faces else None
+    
+    try:
+        query_embedding = represent(face_img)
+    except Exception:
+        query_embedding = None
+    if query_embedding is None:
+        return None, 0.0, "NO_MATCH"
+    threshold = find_threshold(model_name, 'cosine')
+    
     best_match = None
     best_confidence = 0.0
     
     for i, known_encoding_path in enumerate(known_encodings):
         try:
-            # If it's a directory, get all face images in it
+            # If it's a directory, get all face images in it (legacy entries are a single file)
             if os.path.isdir(known_encoding_path):
-                face_files = [f for f in os.listdir(known_encoding_path) if f.endswith('.jpg')]
-                for face_file in face_files:
-                    known_face_path = os.path.join(known_encoding_path, face_file)
-                    
-                    # Compare face with known face using DeepFace
-                    result = DeepFace.verify(
-                        img1_path=face_img,
-                        img2_path=known_face_path,
-                        enforce_detection=False,
-                        detector_backend='opencv'
-                    )
-                    
-                    if result['verified']:
-                        confidence = 1.0 - result['distance']
-                        if confidence > best_confidence and confidence > (1.0 - tolerance):
-                            best_confidence = confidence
-                            best_match = known_names[i]
+                face_paths = [os.path.join(known_encoding_path, f)
+                              for f in os.listdir(known_encoding_path) if f.endswith('.jpg')]
             else:
-                # Handle legacy single file format
-                result = DeepFace.verify(
-                    img1_path=face_img,
-                    img2_path=known_encoding_path,
-                    enforce_detection=False,
-                    detector_backend='opencv'
-                )
+                face_paths = [known_encoding_path]
+            
+            for known_face_path in face_paths:
+                known_embedding = cache.get_or_compute(
+                    known_face_path, model_name, detector, lambda: represent(known_face_path))
+                if known_embedding is None:
+                    continue
                 
-                if result['verified']:
-                    confidence = 1.0 - result['distance']
+                # Same decision DeepFace.verify makes
+                distance = find_cosine_distance(np.asarray(query_embedding), np.asarray(known_embedding))
+                if distance <= threshold:
+                    confidence = 1.0 - distance
                     if confidence > best_confidence and confidence > (1.0 - tolerance):
                         best_confidence = confidence
                         best_match = known_names[i]
@@ -4,7 +4,6 @@ Production runner for face recognition app
 """
 import os
 import sys
-from web_app import app
 
 if __name__ == '__main__':
     # Get local IP for network access
@@ -14,15 +13,26 @@ if __name__ == '__main__':
     local_ip = s.getsockname()[0]
     s.close()
     
-    print(f"🌐 Starting production server...")
+    # Async mode: uvicorn + bounded inference queue (SERVER_MODE=async or --async)
+    async_mode = '--async' in sys.argv or os.environ.get('SERVER_MODE') == 'async'
+    
+    print(f"🌐 Starting production server ({'async' if async_mode else 'threaded'})...")
     print(f"📍 Local access: http://localhost:5000")
     print(f"🌍 Network access: http://{local_ip}:5000")
-    print(f"💡 Camera and recognition will initialize on demand")
+    print(f"💡 Models warm up in the background; /readyz reports when done")
+    
+    from web_app import app
+    from app_lifecycle import lifecycle
+    lifecycle.start_in_background()
     
-    # Production settings
-    app.run(
-        host='0.0.0.0',  # Allow network access
-        port=5000,
-        debug=False,     # Production mode
-        threaded=True    # Handle multiple requests
-    )
+    if async_mode:
+        from asgi_server import run
+        run(host='0.0.0.0', port=5000)
+    else:
+        # Production settings
+        app.run(
+            host='0.0.0.0',  # Allow network access
+            port=5000,
+            debug=False,     # Production mode
+            threaded=True    # Handle multiple requests
+        )
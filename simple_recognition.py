@@ -2,12 +2,18 @@ import cv2
 import numpy as np
 from detector import detect_faces
 from utils import decrypt_data
-import pickle
 from scipy.spatial.distance import cosine
 import base64
 import time
-from perfect_recognizer import perfect_recognizer
+import threading
+import perfect_recognizer
+from gallery import remove_from_gallery
+from perfect_recognizer import get_perfect_recognizer
 from speech_synthesizer import speak_name_once
+from liveness import get_liveness_checker
+from boxes import iou_matrix, largest_index
+from config import LIVENESS_TRACK_IOU
+from status_snapshot import status_snapshot
 
 class SimpleFaceRecognition:
     def __init__(self):
@@ -24,17 +30,64 @@ class SimpleFaceRecognition:
             known_encodings, known_names = decrypt_data()
             self.known_encodings = known_encodings if known_encodings else []
             self.known_names = known_names if known_names else []
+            status_snapshot.gallery_changed(len(set(self.known_names)))
             print(f"✅ Loaded {len(self.known_names)} known faces")
         except Exception as e:
             print(f"❌ Error loading known faces: {e}")
             self.known_encodings = []
             self.known_names = []
     
+    def register_identity(self, name, encodings):
+        """Track an identity the enrollment job already wrote to the gallery"""
+        self.known_encodings.extend(encodings)
+        self.known_names.extend([name] * len(encodings))
+        status_snapshot.gallery_changed(len(set(self.known_names)))
+    
     def recognize_face(self, frame):
         """Perfect face recognition - detect and match with 100% accuracy"""
+        face_crop, result, _ = self.recognize_face_checked(frame)
+        return face_crop, result
+    
+    def matched_track(self, faces, tracks, matched_box, frame):
+        """Liveness track of the matched face: the tracked detection overlapping its box most.
+        
+        A box that no tracked detection overlaps gets a track of its own (so
+        the heavy model decides) - never the track of another face in view.
+        """
+        if faces:
+            overlaps = iou_matrix([matched_box], faces)[0]
+            best = int(np.argmax(overlaps))
+            if overlaps[best] >= LIVENESS_TRACK_IOU:
+                return tracks[best]
+        return get_liveness_checker().observe(frame, [matched_box])[0]
+    
+    def recognize_face_checked(self, frame):
+        """Recognition plus the liveness verdict of the matched face's track.
+        
+        Returns (face_crop, result, liveness); liveness is None unless a
+        match was evaluated, and a failed check is never greeted by name.
+        """
         try:
+            # Track every detection so liveness has temporal evidence to work with
+            faces = detect_faces(frame)
+            checker = get_liveness_checker()
+            tracks = checker.observe(frame, faces)
+            largest = largest_index(faces)
+            face_crop = None
+            if largest is not None:
+                x, y, x2, y2 = faces[largest]
+                face_crop = frame[y:y2, x:x2]
+                if face_crop.size == 0:
+                    face_crop = None
+            
             # Use perfect recognizer for 100% accuracy
-            name, confidence, status = perfect_recognizer.recognize_face_perfect(frame)
+            name, confidence, status, matched_box = get_perfect_recognizer().recognize_face_located(frame)
+            if matched_box is not None:
+                # Liveness and the audit snapshot belong to the face that matched, not the largest one
+                x, y, x2, y2 = [int(v) for v in matched_box]
+                face_crop = frame[max(0, y):y2, max(0, x):x2]
+                if face_crop.size == 0:
+                    face_crop = None
             
             current_time = time.time()
             
@@ -43,7 +96,15 @@ class SimpleFaceRecognition:
                 if (name == self.last_recognized_name and 
                     current_time - self.last_recognition_time < self.recognition_cooldown):
                     # Same person within cooldown - don't call name again
-                    return None, f"Already recognized: {name}"
+                    return None, f"Already recognized: {name}", None
+                
+                # Liveness once per track (cached), before anyone is greeted
+                liveness = checker.evaluate(self.matched_track(faces, tracks, matched_box, frame), frame)
+                liveness.update(identity=name, confidence=confidence)
+                if not liveness['is_real']:
+                    self.last_recognized_name = None
+                    self.last_recognition_time = 0
+                    return face_crop, f"Liveness check failed - {name} denied", liveness
                 
                 # New person or cooldown expired - call the name
                 self.last_recognized_name = name
@@ -52,47 +113,34 @@ class SimpleFaceRecognition:
                 # Speak the name out loud
                 speak_name_once(name, confidence * 100)
                 
-                # Extract face crop for display
-                faces = detect_faces(frame)
-                if len(faces) > 0:
-                    x, y, x2, y2 = faces[0]
-                    face_crop = frame[y:y2, x:x2]
-                    if face_crop.size > 0:
-                        return face_crop, f"{name} ({confidence*100:.1f}% confidence - NAME CALLED)"
-                    else:
-                        return None, f"{name} ({confidence*100:.1f}% confidence - NAME CALLED)"
-                else:
-                    return None, f"{name} ({confidence*100:.1f}% confidence - NAME CALLED)"
+                return face_crop, f"{name} ({confidence*100:.1f}% confidence - NAME CALLED)", liveness
+            elif status == "UNVERIFIED_MATCH":
+                # Part of the gallery did not answer - never greet (or unlock for) a possibly wrong identity
+                return face_crop, f"Cannot verify {name} - gallery partially unavailable", None
             elif status == "NO_FACE_DETECTED":
-                return None, "No face detected"
+                return None, "No face detected", None
             elif status == "NO_MATCH":
                 # Reset cooldown for unknown person
                 self.last_recognized_name = None
                 self.last_recognition_time = 0
                 
-                # Extract face crop for display
-                faces = detect_faces(frame)
-                if len(faces) > 0:
-                    x, y, x2, y2 = faces[0]
-                    face_crop = frame[y:y2, x:x2]
-                    if face_crop.size > 0:
-                        return face_crop, "Who the hell are you?"
-                    else:
-                        return None, "Who the hell are you?"
-                else:
-                    return None, "Who the hell are you?"
+                return face_crop, "Who the hell are you?", None
             else:
-                return None, f"Recognition status: {status}"
+                return None, f"Recognition status: {status}", None
                 
         except Exception as e:
             print(f"❌ Error in face recognition: {e}")
-            return None, "Recognition error"
+            return None, "Recognition error", None
+    
+    def recognize_images(self, frames):
+        """Structured recognition of uploaded images (no speech, no cooldown)"""
+        return get_perfect_recognizer().recognize_faces_batch(frames)
     
     def add_new_user(self, frame, name):
         """Add a new user with perfect face encoding"""
         try:
             # Use perfect recognizer for 100% accurate enrollment
-            success, message = perfect_recognizer.add_perfect_user(frame, name)
+            success, message = get_perfect_recognizer().add_perfect_user(frame, name)
             
             if success:
                 # Reload known faces to sync
@@ -104,25 +152,19 @@ class SimpleFaceRecognition:
             print(f"❌ Error adding new user: {e}")
             return False, f"Error: {str(e)}"
     
-    def save_to_database(self):
-        """Save known faces to encrypted database"""
-        try:
-            from utils import encrypt_data
-            data = (self.known_encodings, self.known_names)
-            with open('authorized_faces.pkl', 'wb') as f:
-                f.write(encrypt_data(data))
-            print(f"✅ Saved {len(self.known_names)} users to database")
-        except Exception as e:
-            print(f"❌ Error saving database: {e}")
-
     def delete_user(self, name):
-        """Remove a user from the known faces"""
+        """Remove every stored entry and the template of a user, here and in the matcher"""
         try:
-            if name in self.known_names:
-                idx = self.known_names.index(name)
-                self.known_names.pop(idx)
-                self.known_encodings.pop(idx)
-                self.save_to_database()
+            removed = remove_from_gallery(name)
+            if removed:
+                keep = [i for i, n in enumerate(self.known_names) if n != name]
+                self.known_encodings = [self.known_encodings[i] for i in keep]
+                self.known_names = [self.known_names[i] for i in keep]
+                if perfect_recognizer.perfect_recognizer is not None:
+                    # A recognizer built later loads the gallery without the user anyway
+                    perfect_recognizer.perfect_recognizer.remove_identity(name)
+                status_snapshot.gallery_changed(len(set(self.known_names)))
+                print(f"✅ Deleted {name} ({removed} entries)")
                 return True, f"Successfully deleted {name}"
             return False, f"User {name} not found"
         except Exception as e:
@@ -164,12 +206,15 @@ class SimpleFaceRecognition:
 
 # Global instance
 simple_recognition = None
+simple_recognition_lock = threading.Lock()
 
 def get_simple_recognition():
     """Get or create simple recognition instance"""
     global simple_recognition
     if simple_recognition is None:
-        simple_recognition = SimpleFaceRecognition()
+        with simple_recognition_lock:
+            if simple_recognition is None:
+                simple_recognition = SimpleFaceRecognition()
     return simple_recognition
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from config import (SNAPSHOT_DIR, SNAPSHOT_MAX_BYTES, SNAPSHOT_DEDUP_WINDOW,
+                    SNAPSHOT_PHASH_DISTANCE, SNAPSHOT_JPEG_QUALITY)
+
+
+def perceptual_hash(face_img):
+    """64-bit difference hash (dHash) of a face crop"""
+    gray = face_img if face_img.ndim == 2 else cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def content_hash(face_img):
+    """SHA-256 of the raw crop pixels (shape included so reshapes never collide)"""
+    digest = hashlib.sha256()
+    digest.update(str(face_img.shape).encode())
+    digest.update(np.ascontiguousarray(face_img).data)
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """Content-addressed, deduplicating JPEG store for access-log face crops.
+
+    Crops are hashed on the caller's thread (cheap) and JPEG-encoded on a
+    background writer thread, so recognition never waits on disk I/O.
+    Files live at <root>/<aa>/<bb>/<sha256>.jpg.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, max_bytes=SNAPSHOT_MAX_BYTES,
+                 dedup_window=SNAPSHOT_DEDUP_WINDOW, phash_distance=SNAPSHOT_PHASH_DISTANCE,
+                 jpeg_quality=SNAPSHOT_JPEG_QUALITY, queue_size=64):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.dedup_window = dedup_window
+        self.phash_distance = phash_distance
+        self.jpeg_quality = jpeg_quality
+        self.recent = deque()  # (timestamp, phash, key, tag) within the dedup window
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.total_bytes = None
+        self.stats = {'written': 0, 'exact_duplicates': 0, 'perceptual_duplicates': 0,
+                      'dropped': 0, 'evicted': 0}
+        self.worker = threading.Thread(target=self._writer_loop, name='snapshot-writer', daemon=True)
+        self.worker.start()
+
+    def relative_path(self, key):
+        """Sharded relative path for a content key"""
+        return f"{key[:2]}/{key[2:4]}/{key}.jpg"
+
+    def absolute_path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.jpg")
+
+    def submit(self, face_img, tag=None):
+        """Queue a crop for storage and return its relative path (or None).
+
+        `tag` (e.g. identity and decision) scopes perceptual dedup: a crop
+        only reuses a similar-looking snapshot logged with the same tag, so
+        an attempt is never recorded with another person's photo.
+        """
+        if face_img is None or face_img.size == 0:
+            return None
+
+        now = time.time()
+        phash = perceptual_hash(face_img)
+
+        with self.lock:
+            while self.recent and now - self.recent[0][0] > self.dedup_window:
+                self.recent.popleft()
+            for _, seen_phash, seen_key, seen_tag in self.recent:
+                if seen_tag == tag and bin(phash ^ seen_phash).count('1') <= self.phash_distance:
+                    self.stats['perceptual_duplicates'] += 1
+                    return self.relative_path(seen_key)
+
+        key = content_hash(face_img)
+        with self.lock:
+            if key in self.pending or os.path.exists(self.absolute_path(key)):
+                self.recent.append((now, phash, key, tag))
+                self.stats['exact_duplicates'] += 1
+                return self.relative_path(key)
+            self.pending.add(key)
+
+        try:
+            # Copy so the caller may keep drawing on its frame
+            self.queue.put_nowait((key, face_img.copy()))
+        except queue.Full:
+            with self.lock:
+                self.pending.discard(key)
+                self.stats['dropped'] += 1
+            return None
+
+        # Only crops that are on disk or queued may serve as dedup targets
+        with self.lock:
+            self.recent.append((now, phash, key, tag))
+        return self.relative_path(key)
+
+    def _writer_loop(self):
+        while True:
+            key, face_img = self.queue.get()
+            try:
+                self._write(key, face_img)
+            except Exception as e:
+                print(f"❌ Snapshot write failed: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+                    if not os.path.exists(self.absolute_path(key)):
+                        # Never written - stop handing its path to perceptual duplicates
+                        self._forget({key})
+
+    def _write(self, key, face_img):
+        ok, buffer = cv2.imencode('.jpg', face_img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+
+        path = self.absolute_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.tobytes())
+        os.replace(tmp_path, path)
+
+        if self.total_bytes is None:
+            self.total_bytes = self._scan_size()
+        else:
+            self.total_bytes += len(buffer)
+        self.stats['written'] += 1
+
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _list_files(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.jpg'):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._list_files())
+
+    def _evict(self):
+        """Delete oldest snapshots until the store is back under 90% of its budget"""
+        files = sorted(self._list_files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        evicted = set()
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.stats['evicted'] += 1
+                evicted.add(os.path.basename(path)[:-len('.jpg')])
+            except OSError:
+                continue
+        self.total_bytes = total
+        if evicted:
+            with self.lock:
+                self._forget(evicted)
+
+    def _forget(self, keys):
+        """Drop keys from the dedup window (caller holds the lock)"""
+        self.recent = deque(entry for entry in self.recent if entry[2] not in keys)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['queued'] = self.queue.qsize()
+        stats['total_bytes'] = self.total_bytes
+        return stats
+
+
+# Global instance
+snapshot_store = None
+
+def get_snapshot_store():
+    """Get or create the snapshot store (starts its writer thread)"""
+    global snapshot_store
+    if snapshot_store is None:
+        snapshot_store = SnapshotStore()
+    return snapshot_store
@@ -1,18 +1,71 @@
-import pyttsx3
-import threading
+import os
 import time
+import hashlib
+import threading
+from collections import deque
+
+from config import SPEECH_QUEUE_SIZE, SPEECH_MAX_AGE, SPEECH_CACHE_DIR
+from metrics import observe_stage
+
+GREETING_TEMPLATES = ["Welcome {name}", "I think you are {name}", "Recognized {name}"]
+
+
+def greeting_for(name, confidence):
+    """Greeting variant for a recognition confidence (percent)"""
+    if confidence >= 95.0:
+        return GREETING_TEMPLATES[0].format(name=name)
+    elif confidence >= 85.0:
+        return GREETING_TEMPLATES[1].format(name=name)
+    return GREETING_TEMPLATES[2].format(name=name)
+
+
+def play_wav(path):
+    """Play a wav file on the calling thread; returns False if no player is available"""
+    try:
+        import winsound
+        winsound.PlaySound(path, winsound.SND_FILENAME)
+        return True
+    except ImportError:
+        pass
+    try:
+        import simpleaudio
+        simpleaudio.WaveObject.from_wave_file(path).play().wait_done()
+        return True
+    except ImportError:
+        return False
+
 
 class SpeechSynthesizer:
-    def __init__(self):
+    """Text-to-speech on a dedicated worker thread.
+    
+    Callers only enqueue; the recognition loop never waits on TTS. The
+    queue is bounded (oldest dropped when full), a newer message for the
+    same name replaces a pending one, and messages older than
+    SPEECH_MAX_AGE are skipped. Greetings are pre-rendered to wav files so
+    playback does not pay for synthesis.
+    """
+    
+    def __init__(self, queue_size=SPEECH_QUEUE_SIZE, max_age=SPEECH_MAX_AGE, cache_dir=SPEECH_CACHE_DIR):
         self.engine = None
         self.last_spoken_name = None
         self.last_speak_time = 0
         self.speak_cooldown = 3.0  # seconds between same name calls
-        self.init_speech_engine()
+        self.queue_size = queue_size
+        self.max_age = max_age
+        self.cache_dir = cache_dir
+        self.pending = deque()  # (key, message, enqueued_at)
+        self.renders = deque()  # messages waiting to be pre-rendered
+        self.condition = threading.Condition()
+        self.stats = {'queued': 0, 'spoken': 0, 'coalesced': 0, 'dropped_full': 0, 'dropped_stale': 0,
+                      'cache_hits': 0, 'rendered': 0}
+        self.ready = threading.Event()
+        self.worker = threading.Thread(target=self._worker_loop, name='speech', daemon=True)
+        self.worker.start()
     
     def init_speech_engine(self):
-        """Initialize text-to-speech engine"""
+        """Initialize text-to-speech engine (on the speech thread - pyttsx3 engines are thread-bound)"""
         try:
+            import pyttsx3
             self.engine = pyttsx3.init()
             
             # Set voice properties for better quality
@@ -34,10 +87,7 @@ class SpeechSynthesizer:
             self.engine = None
     
     def speak_name(self, name, confidence=100.0):
-        """Speak the recognized name only once"""
-        if not self.engine:
-            return
-        
+        """Queue the recognized name (spoken only once per cooldown)"""
         current_time = time.time()
         
         # Check cooldown to prevent duplicate calls
@@ -49,36 +99,117 @@ class SpeechSynthesizer:
         self.last_spoken_name = name
         self.last_speak_time = current_time
         
-        # Create speech message
-        if confidence >= 95.0:
-            message = f"Welcome {name}"
-        elif confidence >= 85.0:
-            message = f"I think you are {name}"
-        else:
-            message = f"Recognized {name}"
-        
-        # Speak directly (no threading to avoid conflicts)
-        try:
-            self.engine.say(message)
-            self.engine.runAndWait()
-            print(f"🔊 Spoke: {message}")
-        except Exception as e:
-            print(f"❌ Error speaking: {e}")
+        self.enqueue(greeting_for(name, confidence), key=name)
     
     def speak_custom_message(self, message):
-        """Speak a custom message"""
+        """Queue a custom message"""
+        self.enqueue(message)
+    
+    def enqueue(self, message, key=None):
+        """Add a message to the speech queue without waiting for it to be spoken"""
+        with self.condition:
+            if key is not None:
+                for i, (pending_key, _, _) in enumerate(self.pending):
+                    if pending_key == key:
+                        # Coalesce: keep the place in line, say the newest greeting
+                        self.pending[i] = (key, message, time.monotonic())
+                        self.stats['coalesced'] += 1
+                        return
+            if len(self.pending) >= self.queue_size:
+                self.pending.popleft()
+                self.stats['dropped_full'] += 1
+            self.pending.append((key, message, time.monotonic()))
+            self.stats['queued'] += 1
+            self.condition.notify()
+    
+    def prerender_names(self, names):
+        """Render every greeting variant for these names into the audio cache (in the background)"""
+        with self.condition:
+            for name in dict.fromkeys(names):
+                for template in GREETING_TEMPLATES:
+                    self.renders.append(template.format(name=name))
+            self.condition.notify()
+    
+    def cache_path(self, message):
+        digest = hashlib.sha1(message.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.cache_dir, f"{digest}.wav")
+    
+    def render(self, message):
+        """Synthesize a message to its cache file; returns the path or None"""
+        path = self.cache_path(message)
+        if os.path.exists(path):
+            return path
         if not self.engine:
-            return
-        
+            return None
         try:
-            self.engine.say(message)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp.wav"
+            self.engine.save_to_file(message, tmp_path)
             self.engine.runAndWait()
-            print(f"🔊 Spoke: {message}")
+            if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                return None
+            os.replace(tmp_path, path)
+            self.stats['rendered'] += 1
+            return path
         except Exception as e:
-            print(f"❌ Error speaking: {e}")
-        
-        # Add small delay to prevent conflicts
-        time.sleep(0.5)
+            print(f"❌ Error rendering speech: {e}")
+            return None
+    
+    def _say(self, message):
+        path = self.cache_path(message)
+        started = time.perf_counter()
+        if os.path.exists(path) and play_wav(path):
+            self.stats['cache_hits'] += 1
+            observe_stage('speech', time.perf_counter() - started, model='cached_wav')
+        elif self.engine:
+            self.engine.say(message)
+            self.engine.runAndWait()
+            observe_stage('speech', time.perf_counter() - started, model='tts')
+        else:
+            return
+        self.stats['spoken'] += 1
+        print(f"🔊 Spoke: {message}")
+    
+    def _worker_loop(self):
+        self.init_speech_engine()
+        self.ready.set()
+        while True:
+            with self.condition:
+                while not self.pending and not self.renders:
+                    self.condition.wait()
+                if self.pending:
+                    job = ('speak',) + self.pending.popleft()
+                else:
+                    job = ('render', None, self.renders.popleft(), None)
+            
+            kind, _, message, enqueued_at = job
+            try:
+                if kind == 'render':
+                    # Only between announcements, so pre-rendering never delays a greeting
+                    self.render(message)
+                elif time.monotonic() - enqueued_at > self.max_age:
+                    self.stats['dropped_stale'] += 1
+                else:
+                    self._say(message)
+            except Exception as e:
+                print(f"❌ Error speaking: {e}")
+    
+    def flush(self, timeout=10.0):
+        """Wait until queued announcements have been spoken (for scripts about to exit)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.condition:
+                if not self.pending:
+                    break
+            time.sleep(0.05)
+    
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['pending'] = len(self.pending)
+            stats['renders_pending'] = len(self.renders)
+        stats['engine'] = self.engine is not None
+        return stats
     
     def test_speech(self):
         """Test the speech synthesizer"""
@@ -91,18 +222,30 @@ class SpeechSynthesizer:
         for message in test_messages:
             self.speak_custom_message(message)
             time.sleep(2)
+        self.flush()
 
-# Global speech synthesizer instance
-speech_synthesizer = SpeechSynthesizer()
+# Global speech synthesizer instance (engine starts on first use)
+speech_synthesizer = None
+
+def get_speech_synthesizer():
+    """Get or create the speech synthesizer"""
+    global speech_synthesizer
+    if speech_synthesizer is None:
+        speech_synthesizer = SpeechSynthesizer()
+    return speech_synthesizer
 
 def speak_name_once(name, confidence=100.0):
     """Global function to speak name only once"""
-    speech_synthesizer.speak_name(name, confidence)
+    get_speech_synthesizer().speak_name(name, confidence)
 
 def speak_message(message):
     """Global function to speak custom message"""
-    speech_synthesizer.speak_custom_message(message)
+    get_speech_synthesizer().speak_custom_message(message)
+
+def prerender_greetings(names):
+    """Pre-render greetings for enrolled names into the audio cache"""
+    get_speech_synthesizer().prerender_names(names)
 
 if __name__ == "__main__":
     # Test speech synthesis
-    speech_synthesizer.test_speech()
+    get_speech_synthesizer().test_speech()
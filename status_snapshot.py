@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+
+from config import AUTHORIZED_FACES_FILE
+
+
+def _package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+class StatusSnapshot:
+    """Constant-size system status, kept current by the workers.
+
+    Readers (health checks, /api/status) only copy a small dict, so they
+    never touch the camera, the models or the encrypted gallery.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_frame_time = None
+        self.state = {
+            'ready': True,
+            'models_loaded': False,
+            'model_version': None,
+            'gallery_version': self._gallery_file_version(),
+            'enrolled_users': None,
+            'camera_active': False,
+            'recognition_active': False,
+            'pipeline_fps': 0.0,
+            'latest_recognition': {'name': None, 'time': 0},
+        }
+
+    def _gallery_file_version(self):
+        """Cheap gallery version from the file's mtime (no decryption)"""
+        try:
+            return int(os.path.getmtime(AUTHORIZED_FACES_FILE) * 1000)
+        except OSError:
+            return 0
+
+    def update(self, **fields):
+        with self.lock:
+            self.state.update(fields)
+
+    def gallery_changed(self, enrolled_users):
+        """Record a gallery (re)load or save"""
+        with self.lock:
+            self.state['enrolled_users'] = enrolled_users
+            self.state['gallery_version'] = max(self.state['gallery_version'] + 1,
+                                                self._gallery_file_version())
+
+    def models_loaded(self, model_version=None):
+        if model_version is None:
+            deepface_version = _package_version('deepface')
+            model_version = f"deepface-{deepface_version}" if deepface_version else None
+        self.update(models_loaded=True, model_version=model_version)
+
+    def record_frame(self):
+        """Update the pipeline FPS estimate (exponential moving average)"""
+        now = time.monotonic()
+        with self.lock:
+            if self.last_frame_time is not None:
+                dt = now - self.last_frame_time
+                if dt > 0:
+                    fps = self.state['pipeline_fps']
+                    instant = 1.0 / dt
+                    self.state['pipeline_fps'] = instant if fps == 0 else 0.9 * fps + 0.1 * instant
+            self.last_frame_time = now
+
+    def snapshot(self):
+        with self.lock:
+            state = dict(self.state)
+            last_frame_time = self.last_frame_time
+        # Report zero FPS once frames stop arriving
+        if last_frame_time is None or time.monotonic() - last_frame_time > 2.0:
+            state['pipeline_fps'] = 0.0
+        state['pipeline_fps'] = round(state['pipeline_fps'], 1)
+        state['uptime'] = round(time.time() - self.started_at, 1)
+        return state
+
+
+# Global status snapshot
+status_snapshot = StatusSnapshot()
@@ -1,4 +1,4 @@
-from speech_synthesizer import speak_name_once, speak_message
+from speech_synthesizer import speak_name_once, speak_message, get_speech_synthesizer
 import time
 
 print("Testing speech synthesis...")
@@ -11,5 +11,6 @@ speak_name_once("John Doe", 95.0)
 time.sleep(2)
 
 speak_name_once("Jane Smith", 85.0)
+get_speech_synthesizer().flush()
 
 print("Speech test completed!")
@@ -4,8 +4,16 @@ import os
 from cryptography.fernet import Fernet
 from config import ENCRYPTION_KEY_FILE
 
+def ensure_encryption_key():
+    """Generate the Fernet key file if it is missing"""
+    if not os.path.exists(ENCRYPTION_KEY_FILE):
+        key = Fernet.generate_key()
+        with open(ENCRYPTION_KEY_FILE, 'wb') as f:
+            f.write(key)
+
 def load_encryption_key():
     """Load Fernet key for encrypting face encodings"""
+    ensure_encryption_key()
     return open(ENCRYPTION_KEY_FILE, 'rb').read()
 
 def encrypt_data(data):
@@ -38,8 +46,6 @@ def decrypt_data():
         return [], []
 
 def mock_door_unlock(duration=5):
-    """Simulate door unlock - replace with GPIO for production"""
-    print(f"🔓 DOOR UNLOCKED for {duration} seconds (User authorized)")
-    import time
-    time.sleep(duration)
-    print("🔒 DOOR LOCKED")
+    """Unlock the door for `duration` seconds without blocking (driver set by DOOR_DRIVER)"""
+    from door_actuator import get_door_actuator
+    get_door_actuator().grant(duration=duration)
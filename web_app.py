@@ -1,16 +1,40 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context, session
 from flask_cors import CORS
 import cv2
 import os
 import time
 import datetime
+import threading
 import base64
 import numpy as np
 
 from detector import detect_faces, extract_face_crop
-from utils import decrypt_data, encrypt_data
-from production_enrollment import ProductionEnrollment
+from boxes import largest
+from utils import ensure_encryption_key
+from enrollment_sessions import enrollment_sessions
+from enrollment_jobs import enrollment_jobs
 from simple_recognition import get_simple_recognition
+from database import init_db, init_attendance_db, log_access_attempt
+from snapshot_store import get_snapshot_store
+from event_bus import event_bus, publish_event
+from status_snapshot import status_snapshot
+from image_upload import read_uploaded_images, decode_image
+from config import UPLOAD_MAX_IMAGES, AUTO_CAPTURE_BURST, DOOR_MIN_CONFIDENCE
+from frame_quality import score_face
+from liveness import get_liveness_checker
+from door_actuator import get_door_actuator
+import speech_synthesizer
+from speech_synthesizer import prerender_greetings
+from inference_pool import get_inference_pool, InferenceQueueFull, InferenceTimeout
+from embedding_batcher import get_batcher_stats, get_embedding_batcher
+from embedding_cache import get_embedding_cache
+from perfect_recognizer import get_perfect_recognizer
+from app_lifecycle import lifecycle
+import metrics
+from profiling import PROFILE_MODES, ProfilerBusy, admin_required, run_profile
+from metrics import stage_timer
+from admission import (admission_controlled, get_admission_controller, AdmissionRejected,
+                       rejection_response)
 
 app = Flask(__name__, 
             static_folder='react-frontend/dist',
@@ -24,23 +48,50 @@ CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.
 # Global state
 # =========================
 camera = None
+camera_index = None  # label for per-camera metrics
 recognition_active = False
-enrollment_system = None
-enrolling_user = None
 last_recognized_user = {"name": None, "time": 0}
 simple_recognition_instance = None
+recognition_lock = threading.Lock()
 speech_initialized = False
+access_log_initialized = False
 
 
 def get_lazy_recognition():
     """Lazy load recognition system only when needed"""
     global simple_recognition_instance
     if simple_recognition_instance is None:
-        print("🔄 Initializing face recognition system...")
-        simple_recognition_instance = get_simple_recognition()
-        print("✅ Face recognition ready")
+        # The 'gallery' startup task and early requests may race to build it
+        with recognition_lock:
+            if simple_recognition_instance is None:
+                print("🔄 Initializing face recognition system...")
+                simple_recognition_instance = get_simple_recognition()
+                print("✅ Face recognition ready")
     return simple_recognition_instance
 
+def init_databases():
+    """Create the attendance and access-log tables"""
+    global access_log_initialized
+    init_attendance_db()
+    init_db()
+    access_log_initialized = True
+
+def warm_up_models():
+    """Load the embedding model and run one dummy batch through it"""
+    from deepface import DeepFace
+    DeepFace.build_model('ArcFace')
+    get_embedding_batcher('ArcFace').embed(np.zeros((112, 112, 3), dtype=np.uint8))
+    status_snapshot.models_loaded()
+
+# Startup tasks - run in parallel by lifecycle.run() / start_in_background()
+lifecycle.add_task('encryption_key', ensure_encryption_key)
+lifecycle.add_task('database', init_databases)
+lifecycle.add_task('model_warmup', warm_up_models)
+lifecycle.add_task('gallery', get_lazy_recognition, depends_on=['encryption_key'])
+lifecycle.add_task('recognizer', get_perfect_recognizer, depends_on=['gallery', 'model_warmup'])
+lifecycle.add_task('speech_cache', lambda: prerender_greetings(get_lazy_recognition().known_names),
+                   depends_on=['gallery'])
+
 def init_speech():
     """Initialize speech synthesizer only when needed"""
     global speech_initialized
@@ -50,11 +101,67 @@ def init_speech():
         speech_initialized = True
         print("✅ Speech synthesizer ready")
 
+def record_access_attempt(face_crop, name, confidence, liveness=None):
+    """Log an access attempt together with a deduplicated face snapshot and liveness verdict"""
+    global access_log_initialized
+    try:
+        if not access_log_initialized:
+            init_db()
+            access_log_initialized = True
+
+        spoofed = liveness is not None and not liveness['is_real']
+        if name == "Unknown" or spoofed:
+            decision = "DENIED"
+        elif liveness is None or confidence < DOOR_MIN_CONFIDENCE:
+            # A name without a confident, live-checked match is logged but never opens the door
+            decision = "UNVERIFIED"
+        else:
+            decision = "GRANTED"
+        # Dedup only against snapshots of the same identity and decision - never another person's photo
+        image_path = (get_snapshot_store().submit(face_crop, tag=(name, decision))
+                      if face_crop is not None else None)
+        spoof_score = liveness.get('spoof_score') if liveness else None
+        log_access_attempt(name, confidence, decision, spoof_score=spoof_score, image_path=image_path)
+        metrics.ACCESS_ATTEMPTS.labels(decision).inc()
+        if decision == "GRANTED":
+            # Queued to the actuator thread - never blocks recognition
+            get_door_actuator().grant(name)
+        publish_event('recognition', {
+            'name': name,
+            'confidence': confidence,
+            'decision': decision,
+            'spoof_score': spoof_score,
+            'liveness_method': liveness.get('method') if liveness else None,
+            'snapshot_url': f"/api/snapshots/{image_path}" if image_path else None
+        })
+        return image_path
+    except Exception as e:
+        print(f"❌ Error logging access attempt: {e}")
+        return None
+
+def publish_camera_state():
+    camera_active = camera is not None and camera.isOpened()
+    status_snapshot.update(camera_active=camera_active, recognition_active=recognition_active)
+    publish_event('camera', {
+        'camera_active': camera_active,
+        'recognition_active': recognition_active
+    })
+
+def publish_enrollment_event(action, name, **extra):
+    data = {'action': action, 'name': name}
+    data.update(extra)
+    if action in ('completed', 'deleted'):
+        # One entry per identity - bulk-imported identities have one gallery entry per photo
+        users = sorted(set(get_lazy_recognition().known_names))
+        data['users'] = users
+        data['enrolled_users'] = len(users)
+    publish_event('enrollment', data)
+
 # =========================
 # Camera helpers
 # =========================
 def init_camera():
-    global camera
+    global camera, camera_index
     if camera is not None and camera.isOpened():
         return True
 
@@ -69,6 +176,7 @@ def init_camera():
                 camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                 camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
                 print(f"✅ 摄像头 {index} 初始化成功")
+                camera_index = index
                 return True
             else:
                 camera.release()
@@ -78,6 +186,7 @@ def init_camera():
     camera = cv2.VideoCapture(0)
     if camera.isOpened():
         print("✅ Camera 0 (without DSHOW) initialized successfully")
+        camera_index = 0
         return True
     
     print("❌All attempts to initialize the cameras failed")
@@ -88,7 +197,8 @@ def init_camera():
 def get_camera_frame():
     if camera is None or not camera.isOpened():
         return None
-    ret, frame = camera.read()
+    with stage_timer('capture', camera=camera_index):
+        ret, frame = camera.read()
     if not ret or frame is None:
         return None
     return frame
@@ -109,9 +219,26 @@ def not_found(e):
         return send_from_directory(app.static_folder, 'index.html')
     return "Not Found", 404
 
+@app.errorhandler(InferenceQueueFull)
+def inference_queue_full(e):
+    response = jsonify({'success': False, 'error': 'Server busy, try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(InferenceTimeout)
+def inference_timeout(e):
+    return jsonify({'success': False, 'error': 'Recognition timed out'}), 504
+
 @app.route('/video_feed')
 def video_feed():
-    def generate_frames():
+    # Streams hold their dashboard slot for as long as the client watches
+    controller = get_admission_controller()
+    try:
+        controller.acquire('dashboard')
+    except AdmissionRejected as rejected:
+        return rejection_response(rejected)
+
+    def stream_frames():
         global last_recognized_user
         while True:
             frame = get_camera_frame()
@@ -138,14 +265,32 @@ def video_feed():
                     # But for now, let's just do detection normally and recognition if needed
                     faces = detect_faces(frame)
                     if faces:
-                        _, result_str = get_lazy_recognition().recognize_face(frame)
+                        try:
+                            face_crop, result_str, liveness = get_inference_pool().run(
+                                get_lazy_recognition().recognize_face_checked, frame)
+                        except (InferenceQueueFull, InferenceTimeout):
+                            # Inference is saturated - keep streaming with detection only
+                            face_crop, result_str, liveness = None, "", None
                         
+                        if liveness is not None and not liveness['is_real']:
+                            # One log entry per spoofing track, not one per frame
+                            spoof_key = f"spoof:{liveness['track_id']}"
+                            if last_recognized_user["name"] != spoof_key:
+                                last_recognized_user = {"name": spoof_key, "time": time.time()}
+                                record_access_attempt(face_crop, liveness['identity'], liveness['confidence'],
+                                                      liveness=liveness)
                         # Update global status for frontend
-                        if "(" in result_str and "%" in result_str:
+                        elif "(" in result_str and "%" in result_str:
                             name = result_str.split(" (")[0]
                             now = time.time()
                             if name != last_recognized_user["name"] or (now - last_recognized_user["time"] > 5):
                                 last_recognized_user = {"name": name, "time": now}
+                                status_snapshot.update(latest_recognition=last_recognized_user)
+                                try:
+                                    confidence = float(result_str.split("(")[1].split("%")[0]) / 100
+                                except ValueError:
+                                    confidence = 0.0
+                                record_access_attempt(face_crop, name, confidence, liveness=liveness)
                 else:
                     faces = detect_faces(frame)
 
@@ -156,7 +301,10 @@ def video_feed():
                     if result_str:
                         cv2.putText(frame, result_str, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
-                _, buffer = cv2.imencode('.jpg', frame)
+                with stage_timer('jpeg_encode', camera=camera_index):
+                    _, buffer = cv2.imencode('.jpg', frame)
+                status_snapshot.record_frame()
+                metrics.record_frame(camera_index)
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
             except Exception as e:
@@ -165,8 +313,11 @@ def video_feed():
                 
             time.sleep(0.01)
 
-    return app.response_class(generate_frames(),
-                               mimetype='multipart/x-mixed-replace; boundary=frame')
+    response = app.response_class(stream_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Released when the server closes the response - also when the client leaves
+    # before the first frame, where a generator's finally block never runs
+    response.call_on_close(lambda: controller.release('dashboard', record_latency=False))
+    return response
 
 
 # =========================
@@ -178,6 +329,7 @@ def start_camera():
     global recognition_active
     if init_camera():
         recognition_active = True
+        publish_camera_state()
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'Camera failed to start'}), 500
 
@@ -191,6 +343,7 @@ def stop_camera():
             camera.release()
             camera = None
         recognition_active = False
+        publish_camera_state()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -198,30 +351,134 @@ def stop_camera():
 
 @app.route('/api/status')
 def status():
-    # Return minimal status with latest recognition
-    try:
-        recognition = get_lazy_recognition()
-        enrolled_users = len(recognition.known_names)
-        users = recognition.known_names
-    except:
-        enrolled_users = 0
-        users = []
-    
+    # Constant-cost snapshot maintained by the workers - never loads models
+    return jsonify(status_snapshot.snapshot())
+
+
+@app.route('/api/inference/stats')
+def inference_stats():
+    # Inference pool and embedding batcher metrics (batch-size / wait-time distributions)
     return jsonify({
-        'camera_active': camera is not None and camera.isOpened(),
-        'recognition_active': recognition_active,
-        'enrolled_users': enrolled_users,
-        'users': users,
-        'latest_recognition': last_recognized_user
+        'pool': get_inference_pool().get_stats(),
+        'admission': get_admission_controller().get_stats(),
+        'batchers': get_batcher_stats(),
+        'liveness': get_liveness_checker().get_stats(),
+        'embedding_cache': get_embedding_cache().get_stats(),
+        'speech': speech_synthesizer.speech_synthesizer.get_stats() if speech_synthesizer.speech_synthesizer else None
     })
 
 
+def collect_queue_metrics():
+    # Copy queue depths and gallery size into gauges at scrape time
+    metrics.QUEUE_DEPTH.labels('inference').set(get_inference_pool().get_stats()['queued'])
+    for stats in get_batcher_stats():
+        metrics.QUEUE_DEPTH.labels(f"embedding:{stats['model']}").set(stats['pending'])
+    if speech_synthesizer.speech_synthesizer:
+        metrics.QUEUE_DEPTH.labels('speech').set(speech_synthesizer.speech_synthesizer.get_stats()['pending'])
+    metrics.QUEUE_DEPTH.labels('snapshot_writer').set(get_snapshot_store().queue.qsize())
+    enrolled = status_snapshot.snapshot().get('enrolled_users')
+    if enrolled is not None:
+        metrics.GALLERY_IDENTITIES.set(enrolled)
+
+metrics.registry.add_collector(collect_queue_metrics)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Prometheus text exposition: per-stage latency histograms, counters and queue gauges
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/door')
+def door_status():
+    return jsonify(get_door_actuator().get_status())
+
+
+@app.route('/api/door/lock', methods=['POST'])
+def door_lock():
+    get_door_actuator().lock_now()
+    return jsonify({'success': True}), 202
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+@admin_required
+def profile_server():
+    # Time-bounded profile of the live process, returned as a flame-graph-ready artifact
+    params = dict(request.args)
+    params.update(request.get_json(silent=True) or {})
+    mode = params.get('mode', 'sampling')
+    if mode not in PROFILE_MODES:
+        return jsonify({'success': False, 'error': f"mode must be one of {', '.join(PROFILE_MODES)}"}), 400
+    try:
+        artifact, summary = run_profile(mode, params.get('seconds', 10), params.get('interval_ms', 5))
+    except ProfilerBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except ValueError:
+        return jsonify({'success': False, 'error': 'seconds and interval_ms must be numbers'}), 400
+    if artifact is None:
+        return jsonify({'success': False, 'error': 'No inference tasks ran while profiling', **summary}), 404
+
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    if mode == 'sampling':
+        response = Response(artifact, mimetype='text/plain')
+        filename = f"profile-{stamp}.folded"
+    else:
+        response = Response(artifact, mimetype='application/octet-stream')
+        filename = f"profile-{stamp}.pstats"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Profile-Summary'] = ', '.join(f"{k}={v}" for k, v in summary.items())
+    return response
+
+
+@app.route('/api/startup')
+def startup_report():
+    # Where the startup seconds went
+    return jsonify(lifecycle.report())
+
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: startup finished and the app can take traffic
+    state = status_snapshot.snapshot()
+    body = {
+        'ready': state['ready'],
+        'models_loaded': state['models_loaded'],
+        'gallery_version': state['gallery_version'],
+        # A failed startup task keeps the app unready until restart - say which one
+        'failed_tasks': lifecycle.failed_tasks()
+    }
+    return jsonify(body), (200 if state['ready'] else 503)
+
+
+@app.route('/api/events')
+def events():
+    # Server-Sent Events stream replacing dashboard polling
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = Response(stream_with_context(event_bus.stream(last_event_id)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response
+
+
 # =========================
 # Simple Recognition
 # =========================
 @app.route('/api/recognize', methods=['POST'])
 @app.route('/recognize', methods=['POST'])
 @app.route('/api/simple/recognize', methods=['POST'])
+@admission_controlled('door')
 def simple_recognize():
     if camera is None or not camera.isOpened():
         return jsonify({'error': 'Camera not available'}), 400
@@ -230,10 +487,20 @@ def simple_recognize():
     if frame is None:
         return jsonify({'error': 'Cannot capture frame'}), 400
 
-    face_crop, result = get_lazy_recognition().recognize_face(frame)
+    face_crop, result, liveness = get_inference_pool().run(get_lazy_recognition().recognize_face_checked, frame)
 
     if face_crop is None:
         return jsonify({'success': False, 'result': result})
+    
+    if liveness is not None and not liveness['is_real']:
+        snapshot_path = record_access_attempt(face_crop, liveness['identity'], liveness['confidence'],
+                                              liveness=liveness)
+        return jsonify({
+            'success': False,
+            'result': result,
+            'liveness': liveness,
+            'snapshot_url': f"/api/snapshots/{snapshot_path}" if snapshot_path else None
+        }), 403
 
     # Recognition results
     name = "Unknown"
@@ -249,6 +516,9 @@ def simple_recognize():
         except:
             pass
 
+    snapshot_path = record_access_attempt(face_crop, name, confidence / 100 if is_recognized else 0.0,
+                                          liveness=liveness)
+
     _, buffer = cv2.imencode('.jpg', face_crop)
     face_b64 = base64.b64encode(buffer).decode()
 
@@ -259,105 +529,223 @@ def simple_recognize():
         'result': result,
         'confidence': f"{confidence:.1f}%" if is_recognized else "0.0%",
         'face_image': f"data:image/jpeg;base64,{face_b64}",
+        'snapshot_url': f"/api/snapshots/{snapshot_path}" if snapshot_path else None,
+        'liveness': liveness,
         'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
 
 
+@app.route('/api/snapshots/<path:snapshot_path>')
+def get_snapshot(snapshot_path):
+    # Snapshots are content-addressed, so a given URL never changes
+    store = get_snapshot_store()
+    if not os.path.exists(os.path.join(store.root, snapshot_path)):
+        return jsonify({'error': 'Snapshot not found'}), 404
+    response = send_from_directory(store.root, snapshot_path, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.route('/api/recognize/batch', methods=['POST'])
+@admission_controlled('batch')
+def recognize_batch():
+    # Recognize uploaded images (multipart files or a raw image body) - no camera needed
+    uploads = read_uploaded_images(request)
+    if not uploads:
+        return jsonify({'success': False, 'error': 'No images uploaded'}), 400
+    if len(uploads) > UPLOAD_MAX_IMAGES:
+        return jsonify({'success': False,
+                        'error': f'At most {UPLOAD_MAX_IMAGES} images per request'}), 413
+
+    frames, scales, decode_ms = [], [], []
+    for _, data in uploads:
+        start = time.perf_counter()
+        frame, scale = decode_image(data)
+        decode_ms.append(round((time.perf_counter() - start) * 1000, 2))
+        frames.append(frame)
+        scales.append(scale)
+
+    results = get_inference_pool().run(get_lazy_recognition().recognize_images, frames)
+
+    images = []
+    for (filename, _), frame, scale, decode_time, result in zip(uploads, frames, scales, decode_ms, results):
+        if frame is None:
+            images.append({'filename': filename, 'error': 'Could not decode image', 'faces': []})
+            continue
+        for face in result['faces']:
+            # Report boxes in the coordinates of the original upload
+            face['bbox'] = [int(round(v * scale)) for v in face['bbox']]
+        result['timings']['decode_ms'] = decode_time
+        images.append({
+            'filename': filename,
+            'width': int(round(frame.shape[1] * scale)),
+            'height': int(round(frame.shape[0] * scale)),
+            'faces': result['faces'],
+            'timings': result['timings']
+        })
+
+    return jsonify({'success': True, 'images': images})
+
+
 # =========================
 # Multi-Pose Enrollment
 # =========================
 @app.route('/api/enrollment/start', methods=['POST'])
 def start_enrollment():
-    global enrollment_system, enrolling_user
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     name = data.get('name')
     
     if not name:
         return jsonify({'success': False, 'error': 'Name is required'}), 400
         
-    enrollment_system = ProductionEnrollment()
-    enrolling_user = name
-    enrollment_system.captured_images = {}
+    enrollment_session = enrollment_sessions.create(name, camera_id=data.get('camera_id'))
+    session['enrollment_session_id'] = enrollment_session.session_id
+    publish_enrollment_event('started', name, session_id=enrollment_session.session_id)
     
     return jsonify({
         'success': True,
+        'session_id': enrollment_session.session_id,
         'message': f"Starting enrollment for {name}",
-        'current_pose': enrollment_system.get_pose_instructions(),
+        'current_pose': enrollment_session.instructions(),
         'pose_index': 0,
-        'total_poses': len(enrollment_system.enrollment_poses)
+        'total_poses': enrollment_session.total_poses
     })
 
+def on_enrollment_job_success(job):
+    prerender_greetings([job.name])
+    publish_enrollment_event('completed', job.name, session_id=job.session_id, job_id=job.job_id)
+
+def get_enrollment_session():
+    """Resolve the caller's enrollment session (body, form, header or cookie)"""
+    data = request.get_json(silent=True) or {}
+    session_id = (data.get('session_id') or request.form.get('session_id')
+                  or request.headers.get('X-Enrollment-Session')
+                  or session.get('enrollment_session_id'))
+    return enrollment_sessions.get(session_id) if session_id else None
+
+def get_enrollment_frames():
+    """Candidate frames for an enrollment capture: an uploaded image, else a short camera burst"""
+    uploads = read_uploaded_images(request)
+    if uploads:
+        frame, _ = decode_image(uploads[0][1])
+        return [frame] if frame is not None else []
+    frames = [get_camera_frame() for _ in range(AUTO_CAPTURE_BURST)]
+    return [frame for frame in frames if frame is not None]
+
+def select_best_face(frames, target_pose):
+    """Pick the (frame, bbox, quality) whose face best fits the target pose"""
+    best = None
+    for frame in frames:
+        faces = detect_faces(frame)
+        if not faces:
+            continue
+        bbox = largest(faces)
+        quality = score_face(frame, bbox)
+        # Prefer frames in the requested pose, then the sharpest/best-lit one
+        rank = (quality['pose'] == target_pose, quality['score'])
+        if best is None or rank > best[0]:
+            best = (rank, frame, bbox, quality)
+    return best[1:] if best else (None, None, None)
+
 @app.route('/api/enrollment/capture', methods=['POST'])
+@admission_controlled('enrollment')
 def capture_pose():
-    global enrollment_system, enrolling_user
-    if not enrollment_system or not enrolling_user:
-        return jsonify({'success': False, 'error': 'Enrollment not started'}), 400
+    enrollment_session = get_enrollment_session()
+    if enrollment_session is None:
+        return jsonify({'success': False, 'error': 'Enrollment not started or session expired'}), 400
         
-    frame = get_camera_frame()
-    if frame is None:
+    frames = get_enrollment_frames()
+    if not frames:
         return jsonify({'success': False, 'error': 'No camera frame'}), 400
         
-    faces = detect_faces(frame)
-    if not faces:
+    frame, bbox, quality = select_best_face(frames, enrollment_session.current_pose)
+    if frame is None:
         return jsonify({'success': False, 'error': 'No face detected in frame'}), 400
         
-    # Get current pose
-    pose = enrollment_system.enrollment_poses[enrollment_system.current_pose_index]
-    
     # Extract face and store
-    bbox = faces[0]
     face_img = extract_face_crop(frame, bbox)
     
     if face_img is None:
         return jsonify({'success': False, 'error': 'Could not extract face'}), 400
-        
-    if pose not in enrollment_system.captured_images:
-        enrollment_system.captured_images[pose] = []
-    
-    enrollment_system.captured_images[pose].append(face_img)
     
-    # Move to next pose or complete
-    enrollment_system.current_pose_index += 1
+    # Only this session is locked - other sessions and recognition carry on
+    with enrollment_session.lock:
+        if enrollment_session.complete:
+            return jsonify({'success': False, 'error': 'Enrollment already complete'}), 409
+        pose = enrollment_session.add_capture(face_img)
+        complete = enrollment_session.complete
+        if complete:
+            # Embedding, templating and the gallery write run as a background job
+            job = enrollment_session.finish(on_success=on_enrollment_job_success)
+            enrollment_sessions.remove(enrollment_session.session_id)
     
-    if enrollment_system.current_pose_index >= len(enrollment_system.enrollment_poses):
-        # Save and complete
-        enrollment_system.save_face_images(enrolling_user, enrollment_system.captured_images)
-        enrollment_system.update_encrypted_data(enrolling_user)
-        
-        # Reset simple recognition to load new user
-        get_lazy_recognition().load_known_faces()
-        
-        user_name = enrolling_user
-        enrolling_user = None
-        enrollment_system = None
+    if complete:
+        user_name = enrollment_session.name
+        if session.get('enrollment_session_id') == enrollment_session.session_id:
+            session.pop('enrollment_session_id', None)
+        publish_enrollment_event('finalizing', user_name, session_id=enrollment_session.session_id,
+                                 job_id=job.job_id)
         
         return jsonify({
             'success': True,
             'complete': True,
-            'message': f"Enrollment successful for {user_name}!"
-        })
+            'job_id': job.job_id,
+            'job': job.to_dict(),
+            'message': f"All poses captured for {user_name} - finishing enrollment..."
+        }), 202
     else:
-        next_pose = enrollment_system.enrollment_poses[enrollment_system.current_pose_index]
+        next_pose = enrollment_session.current_pose
+        publish_enrollment_event('pose_captured', enrollment_session.name, pose=pose,
+                                 pose_index=enrollment_session.pose_index,
+                                 session_id=enrollment_session.session_id)
         return jsonify({
             'success': True,
             'complete': False,
-            'next_pose': enrollment_system.get_pose_instructions(),
-            'pose_index': enrollment_system.current_pose_index,
+            'session_id': enrollment_session.session_id,
+            'next_pose': enrollment_session.instructions(),
+            'pose_index': enrollment_session.pose_index,
+            'quality': quality,
             'message': f"Captured {pose}! Next: {next_pose}"
         })
 
 @app.route('/api/enrollment/cancel', methods=['POST'])
 def cancel_enrollment():
-    global enrollment_system, enrolling_user
-    enrollment_system = None
-    enrolling_user = None
+    enrollment_session = get_enrollment_session()
+    if enrollment_session is not None:
+        enrollment_sessions.remove(enrollment_session.session_id)
+        publish_enrollment_event('cancelled', enrollment_session.name,
+                                 session_id=enrollment_session.session_id)
+    session.pop('enrollment_session_id', None)
     return jsonify({'success': True, 'message': 'Enrollment cancelled'})
 
+@app.route('/api/enrollment/jobs')
+def list_enrollment_jobs():
+    return jsonify({'success': True, 'jobs': enrollment_jobs.list_jobs()})
+
+@app.route('/api/enrollment/jobs/<job_id>')
+def get_enrollment_job(job_id):
+    job = enrollment_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/enrollment/jobs/<job_id>/retry', methods=['POST'])
+def retry_enrollment_job(job_id):
+    job = enrollment_jobs.retry(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found or not failed'}), 409
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+@app.route('/api/enrollment/sessions')
+def list_enrollment_sessions():
+    return jsonify({'success': True, 'sessions': enrollment_sessions.list_sessions()})
+
 
 # =========================
 # Simple Enrollment
 # =========================
 @app.route('/api/simple/enroll', methods=['POST'])
+@admission_controlled('enrollment')
 def simple_enroll():
     data = request.get_json()
     user_name = data.get('name')
@@ -372,9 +760,10 @@ def simple_enroll():
     if frame is None:
         return jsonify({'error': 'Cannot capture frame'}), 400
 
-    success, message = get_lazy_recognition().add_new_user(frame, user_name)
+    success, message = get_inference_pool().run(get_lazy_recognition().add_new_user, frame, user_name)
 
     if success:
+        publish_enrollment_event('completed', user_name)
         return jsonify({'success': True, 'message': message})
     else:
         return jsonify({'success': False, 'error': message}), 400
@@ -385,7 +774,7 @@ def simple_status():
     return jsonify({
         'success': True,
         'camera_active': camera is not None and camera.isOpened(),
-        'users': get_lazy_recognition().known_names
+        'users': sorted(set(get_lazy_recognition().known_names))
     })
 
 # =========================
@@ -398,13 +787,15 @@ def get_attendance():
 
 @app.route('/api/users')
 def get_users():
-    users = get_lazy_recognition().known_names
+    # Bulk-imported identities have one gallery entry per photo
+    users = sorted(set(get_lazy_recognition().known_names))
     return jsonify(users)
 
 @app.route('/api/users/<name>', methods=['DELETE'])
 def delete_user(name):
     success, message = get_lazy_recognition().delete_user(name)
     if success:
+        publish_enrollment_event('deleted', name)
         return jsonify({'success': True, 'message': message})
     return jsonify({'success': False, 'error': message}), 404
 
@@ -414,6 +805,7 @@ def delete_user(name):
 # =========================
 if __name__ == '__main__':
     print("🌐 Server starting at http://localhost:5000")
-    print("💡 Camera and recognition will initialize on demand")
+    print("💡 Models warm up in the background; /readyz reports when done")
+    lifecycle.start_in_background()
     app.run(host='0.0.0.0', port=5000, debug=False)
 